@@ -5,7 +5,6 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from pydantic import BaseModel, EmailStr, field_validator
 import re
-import bcrypt
 import os
 from dotenv import load_dotenv
 
@@ -14,6 +13,13 @@ load_dotenv()
 
 from app.database import get_db
 from app.models.user import User
+from app.services.password_hashing import (
+    PasswordHashingBusy,
+    hash_password_sync,
+    needs_rehash,
+    password_hasher,
+    verify_password_sync,
+)
 
 router = APIRouter()
 
@@ -87,18 +93,30 @@ class UserResponse(BaseModel):
 
 #Functions
 def get_password_hash(password: str) -> str:
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    return hash_password_sync(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'),
-        hashed_password.encode('utf-8')
-    )
+    return verify_password_sync(plain_password, hashed_password)
+
+# Async variants for the handlers: bcrypt runs in the password hashing
+# thread pool, a full pool answers 503 instead of queueing without bound
+PASSWORD_HASHING_BUSY = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many authentication requests, try again shortly",
+    headers={"Retry-After": "1"}
+)
+
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashingBusy:
+        raise PASSWORD_HASHING_BUSY
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHashingBusy:
+        raise PASSWORD_HASHING_BUSY
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -165,7 +183,7 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     new_user = User(
         username=user_data.username,
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await hash_password(user_data.password),
         nombre=user_data.nombre,
         apellidos=user_data.apellidos,       
         activo=True
@@ -183,7 +201,7 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     
     user = db.query(User).filter(User.username == user_credentials.username).first()
     
-    if not user or not verify_password(user_credentials.password, user.password_hash):
+    if not user or not await check_password(user_credentials.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -202,6 +220,10 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         expires_delta=access_token_expires
     )
     
+    # Rehash with the current cost factor while the plain password is at hand
+    if needs_rehash(user.password_hash):
+        user.password_hash = await hash_password(user_credentials.password)
+    
     user.ultimo_acceso = datetime.utcnow()
     db.commit()
     
@@ -1,39 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 from datetime import datetime, timedelta, timezone
+import asyncio
 import json
 import os
 import base64
 from pathlib import Path
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.user import User
 from app.models.visualizacion import Visualizacion
 from app.models.exportacion import Exportacion, FormatoExportacion
+from app.models.trabajo_exportacion import TrabajoExportacion, EstadoTrabajo, ESTADOS_ACTIVOS
 from app.api.auth import get_current_user
-from app.schemas.exportacion import ExportacionCreate, ExportacionResponse
+from app.schemas.exportacion import ExportacionCreate, ExportacionResponse, TrabajoExportacionResponse
+from app.services.export_cache import export_cache_key, find_cached_export, is_expired
+from app.services.export_storage import get_export_storage
+from app.services.file_download import RangeFileResponse
+from app.services.export_jobs import export_queue, ExportQueueFull, EXPORT_MAX_JOBS_PER_USER
+from app.services.pagination import MAX_PAGE_SIZE, InvalidCursor, keyset_page, total_count
 
 router = APIRouter()
 
-# Create exports directory if it doesn't exist
-EXPORTS_DIR = Path("exports")
-EXPORTS_DIR.mkdir(exist_ok=True)
+# Seconds between two status checks of the SSE stream
+JOB_EVENTS_POLL_INTERVAL = 0.5
 
-@router.post("", response_model=ExportacionResponse, status_code=status.HTTP_201_CREATED)
+@router.post("", response_model=TrabajoExportacionResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_export(
     export_data: ExportacionCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new export"""
+    """
+    Queue a new export, poll /jobs/{job_id} until it completes.
+    If an identical export already exists the job is returned completed.
+    """
     # Verify visualization exists and belongs to user's project
     visualizacion = db.query(Visualizacion).filter(
         Visualizacion.id == export_data.visualizacion_id
     ).first()
     
-    if not visualizacion:
+    # Projects being deleted are gone for their users
+    if not visualizacion or visualizacion.proyecto.eliminado_en is not None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Visualization not found"
@@ -46,67 +57,159 @@ async def create_export(
             detail="You don't have permission to export this visualization"
         )
     
-    # Generate filename
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    filename = f"export_{visualizacion.id}_{timestamp}.{export_data.formato.value}"
-    filepath = EXPORTS_DIR / filename
+    # Reuse an export rendered from the same inputs
+    if export_data.usar_cache:
+        clave_cache = export_cache_key(visualizacion, export_data.formato)
+        cached = find_cached_export(db, visualizacion.id, clave_cache)
+        if cached:
+            cached.ultimo_acceso = datetime.now(timezone.utc)
+            trabajo = TrabajoExportacion(
+                visualizacion_id=visualizacion.id,
+                usuario_id=current_user.id,
+                formato=export_data.formato,
+                estado=EstadoTrabajo.COMPLETADO,
+                exportacion_id=cached.id
+            )
+            db.add(trabajo)
+            db.commit()
+            db.refresh(trabajo)
+            return trabajo
     
-    # Generate export content based on format
-    content = await generate_export_content(visualizacion, export_data.formato)
+    # Per-user concurrency limit. The user row lock serializes concurrent
+    # requests of the same user between the count and the insert
+    db.query(User.id).filter(User.id == current_user.id).with_for_update().first()
+    active_jobs = db.query(TrabajoExportacion).filter(
+        TrabajoExportacion.usuario_id == current_user.id,
+        TrabajoExportacion.estado.in_(ESTADOS_ACTIVOS)
+    ).count()
     
-    # Save file
-    if export_data.formato in [FormatoExportacion.PDF, FormatoExportacion.PNG]:
-        # For binary formats
-        with open(filepath, 'wb') as f:
-            if isinstance(content, bytes):
-                f.write(content)
-            else:
-                f.write(content.encode('utf-8'))
-    else:
-        # For text formats (SVG, JSON, HTML)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content if isinstance(content, str) else str(content))
+    if active_jobs >= EXPORT_MAX_JOBS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"You already have {active_jobs} exports in progress"
+        )
     
-    # Get file size
-    file_size = filepath.stat().st_size
+    trabajo = TrabajoExportacion(
+        visualizacion_id=visualizacion.id,
+        usuario_id=current_user.id,
+        formato=export_data.formato,
+        estado=EstadoTrabajo.PENDIENTE
+    )
     
-    # Determine content type
-    content_type_map = {
-        FormatoExportacion.PDF: "application/pdf",
-        FormatoExportacion.PNG: "image/png",
-        FormatoExportacion.SVG: "image/svg+xml",
-        FormatoExportacion.JSON: "application/json",
-        FormatoExportacion.HTML: "text/html"
-    }
-    tipo_contenido = content_type_map.get(export_data.formato, "application/octet-stream")
+    db.add(trabajo)
+    db.commit()
+    db.refresh(trabajo)
     
-    # Set expiration (30 days from now)
-    expira_en = datetime.now(timezone.utc) + timedelta(days=30)
+    try:
+        export_queue.submit(trabajo.id)
+    except ExportQueueFull:
+        trabajo.estado = EstadoTrabajo.FALLIDO
+        trabajo.error = "Export queue is full"
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Export queue is full, try again later",
+            headers={"Retry-After": "10"}
+        )
     
-    # Create export record
-    nueva_exportacion = Exportacion(
-        visualizacion_id=export_data.visualizacion_id,
-        usuario_id=current_user.id,
-        tipo_contenido=tipo_contenido,
-        formato=export_data.formato,
-        archivo=str(filepath),
-        tamaño=file_size,
-        expira_en=expira_en
+    return trabajo
+
+def get_user_job(job_id: int, current_user: User, db: Session) -> TrabajoExportacion:
+    trabajo = db.query(TrabajoExportacion).filter(
+        TrabajoExportacion.id == job_id,
+        TrabajoExportacion.usuario_id == current_user.id
+    ).first()
+    
+    if not trabajo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found"
+        )
+    
+    return trabajo
+
+@router.get("/jobs/{job_id}", response_model=TrabajoExportacionResponse)
+async def get_export_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the status of an export job"""
+    return get_user_job(job_id, current_user, db)
+
+@router.get("/jobs/{job_id}/events")
+async def export_job_events(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Server-sent events with the job status, closed when the job finishes"""
+    get_user_job(job_id, current_user, db)
+    
+    def load_status() -> Optional[dict]:
+        session = SessionLocal()
+        try:
+            trabajo = session.query(TrabajoExportacion).filter(TrabajoExportacion.id == job_id).first()
+            if trabajo is None:
+                return None
+            return TrabajoExportacionResponse.model_validate(trabajo).model_dump(mode="json")
+        finally:
+            session.close()
+    
+    async def event_stream():
+        last_payload = None
+        while True:
+            payload = await run_in_threadpool(load_status)
+            if payload is None:
+                # Job deleted while streaming
+                yield f"event: not_found\ndata: {json.dumps({'id': job_id, 'detail': 'Export job not found'})}\n\n"
+                return
+            if payload != last_payload:
+                yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+                last_payload = payload
+            if payload["estado"] not in [estado.value for estado in ESTADOS_ACTIVOS]:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+@router.delete("/jobs/{job_id}", response_model=TrabajoExportacionResponse)
+async def cancel_export_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cancel a pending or running export job"""
+    trabajo = get_user_job(job_id, current_user, db)
     
-    db.add(nueva_exportacion)
+    if trabajo.estado not in ESTADOS_ACTIVOS:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export job is already {trabajo.estado.value}"
+        )
+    
+    trabajo.estado = EstadoTrabajo.CANCELADO
     db.commit()
-    db.refresh(nueva_exportacion)
+    db.refresh(trabajo)
+    export_queue.cancel(trabajo.id)
     
-    return nueva_exportacion
+    return trabajo
 
 @router.get("/{export_id}/download")
 async def download_export(
     export_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Download an export file"""
+    """
+    Download an export file.
+    Supports Range, If-None-Match and precompressed variants via Accept-Encoding.
+    """
     exportacion = db.query(Exportacion).filter(
         Exportacion.id == export_id,
         Exportacion.usuario_id == current_user.id
@@ -119,39 +222,87 @@ async def download_export(
         )
     
     # Check if file exists
-    filepath = Path(exportacion.archivo)
-    if not filepath.exists():
+    storage = get_export_storage()
+    if not storage.exists(exportacion.archivo):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Export file not found"
         )
     
     # Check expiration
-    if exportacion.expira_en and exportacion.expira_en < datetime.now(timezone.utc):
+    if is_expired(exportacion):
         raise HTTPException(
             status_code=status.HTTP_410_GONE,
             detail="Export has expired"
         )
     
-    return FileResponse(
-        path=filepath,
-        filename=filepath.name,
-        media_type=exportacion.tipo_contenido
+    exportacion.ultimo_acceso = datetime.now(timezone.utc)
+    db.commit()
+    
+    filename = Path(exportacion.archivo).name
+    filepath = storage.local_path(exportacion.archivo)
+    if filepath is not None:
+        return RangeFileResponse(
+            path=filepath,
+            request_headers=request.headers,
+            media_type=exportacion.tipo_contenido,
+            filename=filename
+        )
+    
+    # Remote storage: hand the download off to the storage service when possible
+    url = storage.presigned_url(exportacion.archivo, filename, exportacion.tipo_contenido)
+    if url:
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    
+    return StreamingResponse(
+        storage.open_stream(exportacion.archivo),
+        media_type=exportacion.tipo_contenido,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 @router.get("", response_model=List[ExportacionResponse])
 async def get_exports(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    visualizacion_id: int = None
+    visualizacion_id: int = None,
+    formato: Optional[FormatoExportacion] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    incluir_total: bool = False
 ):
-    """Get all exports for the current user"""
+    """
+    Get the exports of the current user, newest first.
+    Every row unless limit or cursor is given; pages (DEFAULT_PAGE_SIZE
+    rows without limit) return the cursor of the next page in
+    X-Next-Cursor. With incluir_total, the number of matching exports is
+    returned in X-Total-Count.
+    """
     query = db.query(Exportacion).filter(Exportacion.usuario_id == current_user.id)
     
     if visualizacion_id:
         query = query.filter(Exportacion.visualizacion_id == visualizacion_id)
+    if formato:
+        query = query.filter(Exportacion.formato == formato)
+    if desde:
+        query = query.filter(Exportacion.fecha_creacion >= desde)
+    if hasta:
+        query = query.filter(Exportacion.fecha_creacion < hasta)
+    
+    if incluir_total:
+        response.headers["X-Total-Count"] = str(total_count(query))
     
-    exports = query.order_by(Exportacion.fecha_creacion.desc()).all()
+    try:
+        exports, next_cursor = keyset_page(query, Exportacion.fecha_creacion, Exportacion.id, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return exports
 
 @router.delete("/{export_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -172,106 +323,10 @@ async def delete_export(
             detail="Export not found"
         )
     
-    # Delete file if exists
-    filepath = Path(exportacion.archivo)
-    if filepath.exists():
-        filepath.unlink()
+    # Delete file and its precompressed variants if they exist
+    get_export_storage().delete(exportacion.archivo)
     
     db.delete(exportacion)
     db.commit()
     
     return None
-
-async def generate_export_content(visualizacion: Visualizacion, formato: FormatoExportacion) -> str | bytes:
-    """Generate export content based on format"""
-    layout_config = visualizacion.layout_config or {}
-    
-    if formato == FormatoExportacion.JSON:
-        return json.dumps({
-            "visualizacion_id": visualizacion.id,
-            "proyecto_id": visualizacion.proyecto_id,
-            "layout_config": layout_config,
-            "fecha_creacion": visualizacion.fecha_creacion.isoformat(),
-            "activo": visualizacion.activo
-        }, indent=2, default=str)
-    
-    elif formato == FormatoExportacion.HTML:
-        return f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Visualization Export - {visualizacion.id}</title>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            margin: 20px;
-            background: #f5f5f5;
-        }}
-        .container {{
-            background: white;
-            padding: 30px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{
-            color: #333;
-            border-bottom: 2px solid #4CAF50;
-            padding-bottom: 10px;
-        }}
-        .info {{
-            margin: 20px 0;
-            padding: 15px;
-            background: #f9f9f9;
-            border-left: 4px solid #4CAF50;
-        }}
-        .config {{
-            background: #f0f0f0;
-            padding: 15px;
-            border-radius: 5px;
-            font-family: monospace;
-            white-space: pre-wrap;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Neural Network Visualization Export</h1>
-        <div class="info">
-            <p><strong>Visualization ID:</strong> {visualizacion.id}</p>
-            <p><strong>Project ID:</strong> {visualizacion.proyecto_id}</p>
-            <p><strong>Created:</strong> {visualizacion.fecha_creacion}</p>
-            <p><strong>Active:</strong> {visualizacion.activo}</p>
-        </div>
-        <h2>Layout Configuration</h2>
-        <div class="config">{json.dumps(layout_config, indent=2)}</div>
-    </div>
-</body>
-</html>"""
-    
-    elif formato == FormatoExportacion.SVG:
-        return f"""<?xml version="1.0" encoding="UTF-8"?>
-<svg width="800" height="600" xmlns="http://www.w3.org/2000/svg">
-    <rect width="800" height="600" fill="#f5f5f5"/>
-    <text x="400" y="50" text-anchor="middle" font-size="24" font-weight="bold" fill="#333">
-        Neural Network Visualization
-    </text>
-    <text x="400" y="80" text-anchor="middle" font-size="16" fill="#666">
-        Visualization ID: {visualizacion.id}
-    </text>
-    <text x="400" y="110" text-anchor="middle" font-size="14" fill="#888">
-        Project ID: {visualizacion.proyecto_id}
-    </text>
-    <text x="400" y="300" text-anchor="middle" font-size="12" fill="#999">
-        SVG Export - Layout configuration available in JSON format
-    </text>
-</svg>"""
-    
-    elif formato == FormatoExportacion.PNG:
-        return b"PNG placeholder - implement with PIL/Pillow"
-    
-    elif formato == FormatoExportacion.PDF:
-        return b"PDF placeholder - implement with reportlab"
-    
-    return ""
-
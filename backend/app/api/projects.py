@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload, undefer_group
 from typing import List, Optional
 from datetime import datetime
+import hashlib
 
 from app.database import get_db
 from app.models.user import User
 from app.models.project import Proyecto, EstadoProyecto
-from app.models.archivo_entrada import ArchivoEntrada
+from app.models.archivo_entrada import ArchivoEntrada, FormatoPesos
 from app.models.visualizacion import Visualizacion
 from app.api.auth import get_current_user
-from app.schemas.project import ProyectoCreate, ProyectoUpdate, ProyectoResponse, ProyectoWithFiles
-from app.schemas.archivo_entrada import ArchivoEntradaResponse
+from app.schemas.project import ProyectoCreate, ProyectoUpdate, ProyectoResponse, ProyectoBusquedaResponse, ProyectoWithFiles, ResumenProyectoResponse
+from app.schemas.archivo_entrada import ArchivoEntradaResponse, PesosEmpaquetadosResponse
 from app.services.neural_network_parser import NeuralNetworkParser
+from app.services.metrics import PARSE_DURATION, UPLOAD_BYTES
+from app.services.export_bundle import bundle_entries, stream_bundle
+from app.services.project_search import search_projects
+from app.services.project_deletion import (
+    delete_export_files,
+    delete_project_in_background,
+    delete_project_rows,
+    mark_project_deleted,
+    prepare_project_deletion,
+)
+from app.services.project_summary import project_summaries, refresh_project_summary
+from app.services.cold_storage import archive_project_payloads, load_payloads
+from app.services.matrix_cache import invalidate_matrices
+from app.services.weight_quantization import WEIGHT_STORAGE_FORMAT, packed_weights, store_weights
+from app.services.pagination import MAX_PAGE_SIZE, InvalidCursor, keyset_page, total_count
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 
@@ -39,19 +56,68 @@ async def create_proyecto(
 
 @router.get("", response_model=List[ProyectoResponse])
 async def get_proyectos(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    estado: Optional[EstadoProyecto] = None
+    estado: Optional[EstadoProyecto] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    incluir_total: bool = False
 ):
-    """Get all projects for the current user"""
-    query = db.query(Proyecto).filter(Proyecto.usuario_id == current_user.id)
+    """
+    Get the projects of the current user, most recently modified first.
+    Every row unless limit or cursor is given; pages (DEFAULT_PAGE_SIZE
+    rows without limit) return the cursor of the next page in
+    X-Next-Cursor. With incluir_total, the number of matching projects is
+    returned in X-Total-Count.
+    """
+    query = db.query(Proyecto).filter(Proyecto.usuario_id == current_user.id, Proyecto.eliminado_en.is_(None))
     
     if estado:
         query = query.filter(Proyecto.estado == estado)
+    if desde:
+        query = query.filter(Proyecto.fecha_modificacion >= desde)
+    if hasta:
+        query = query.filter(Proyecto.fecha_modificacion < hasta)
     
-    proyectos = query.order_by(Proyecto.fecha_modificacion.desc()).all()
+    if incluir_total:
+        response.headers["X-Total-Count"] = str(total_count(query))
+    
+    try:
+        proyectos, next_cursor = keyset_page(query, Proyecto.fecha_modificacion, Proyecto.id, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return proyectos
 
+@router.get("/search", response_model=List[ProyectoBusquedaResponse])
+async def search_proyectos(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Search the current user's projects by name, description and input file names"""
+    resultados = search_projects(db, current_user.id, q, limit)
+    return [
+        {**ProyectoResponse.model_validate(proyecto).model_dump(), "puntuacion": puntuacion}
+        for proyecto, puntuacion in resultados
+    ]
+
+@router.get("/summary", response_model=List[ResumenProyectoResponse])
+async def get_proyectos_summary(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """File counts, adversarial counts, total neurons and storage of every project of the current user"""
+    return project_summaries(db, current_user.id)
+
 @router.get("/{proyecto_id}", response_model=ProyectoWithFiles)
 async def get_proyecto(
     proyecto_id: int,
@@ -59,9 +125,12 @@ async def get_proyecto(
     db: Session = Depends(get_db)
 ):
     """Get a project by ID with its input files"""
-    proyecto = db.query(Proyecto).filter(
+    proyecto = db.query(Proyecto).options(
+        selectinload(Proyecto.archivos_entrada).undefer_group("pesos")
+    ).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -70,19 +139,22 @@ async def get_proyecto(
             detail="Project not found"
         )
     
+    load_payloads(db, proyecto.archivos_entrada)
     return proyecto
 
 @router.put("/{proyecto_id}", response_model=ProyectoResponse)
 async def update_proyecto(
     proyecto_id: int,
     proyecto_data: ProyectoUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Update a project"""
+    """Update a project. Archiving it moves the weights of its files to cold storage"""
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -95,7 +167,9 @@ async def update_proyecto(
         proyecto.nombre = proyecto_data.nombre
     if proyecto_data.descripcion is not None:
         proyecto.descripcion = proyecto_data.descripcion
+    archived = False
     if proyecto_data.estado is not None:
+        archived = proyecto_data.estado == EstadoProyecto.ARCHIVADO and proyecto.estado != EstadoProyecto.ARCHIVADO
         proyecto.estado = proyecto_data.estado
     
     proyecto.fecha_modificacion = datetime.utcnow()
@@ -103,18 +177,63 @@ async def update_proyecto(
     db.commit()
     db.refresh(proyecto)
     
+    if archived:
+        background_tasks.add_task(archive_project_payloads, proyecto_id)
     return proyecto
 
-@router.delete("/{proyecto_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{proyecto_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={202: {"description": "Deletion continues in the background, the project is already hidden"}},
+)
 async def delete_proyecto(
     proyecto_id: int,
+    background_tasks: BackgroundTasks,
+    background: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Delete a project"""
+    """
+    Delete a project. Its rows are removed by the database (ON DELETE
+    CASCADE) and its export files after the response. With background
+    the project is hidden right away and the deletion itself runs after
+    the response (202 Accepted), resumed later if it is interrupted.
+    """
+    exists = db.query(Proyecto.id).filter(
+        Proyecto.id == proyecto_id,
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
+    ).first()
+    
+    if not exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    keys = prepare_project_deletion(db, proyecto_id)
+    
+    if background:
+        mark_project_deleted(db, proyecto_id)
+        background_tasks.add_task(delete_project_in_background, proyecto_id, keys)
+        return Response(status_code=status.HTTP_202_ACCEPTED)
+    
+    delete_project_rows(db, proyecto_id)
+    background_tasks.add_task(delete_export_files, keys)
+    
+    return None
+
+@router.get("/{proyecto_id}/export-bundle")
+async def export_bundle(
+    proyecto_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download a zip with the project's exports and its original input files"""
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -123,24 +242,39 @@ async def delete_proyecto(
             detail="Project not found"
         )
     
-    db.delete(proyecto)
-    db.commit()
+    entries = bundle_entries(db, proyecto_id)
+    manifest = {
+        "proyecto_id": proyecto.id,
+        "nombre": proyecto.nombre,
+        "descripcion": proyecto.descripcion,
+        "fecha_exportacion": datetime.utcnow().isoformat()
+    }
     
-    return None
+    return StreamingResponse(
+        stream_bundle(entries, manifest),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="proyecto_{proyecto.id}.zip"'}
+    )
 
 @router.post("/{proyecto_id}/archivos-entrada", response_model=ArchivoEntradaResponse, status_code=status.HTTP_201_CREATED)
 async def upload_archivo_entrada(
     proyecto_id: int,
     file: UploadFile = File(...),
     ataque: str = "False",
+    formato_pesos: Optional[FormatoPesos] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Upload an input file (.txt) to a project"""
+    """
+    Upload an input file (.txt) to a project. formato_pesos stores the
+    weights packed (float32, float16 or int8) instead of as JSON floats,
+    WEIGHT_STORAGE_FORMAT by default.
+    """
     # Verify project exists and belongs to user
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -161,12 +295,14 @@ async def upload_archivo_entrada(
     
     # Read file content
     content = await file.read()
+    UPLOAD_BYTES.observe(len(content))
     file_content = content.decode('utf-8')
     
     # Parse the neural network file
     try:
         parser = NeuralNetworkParser()
-        parsed_data = parser.parse(file_content)
+        with PARSE_DURATION.time():
+            parsed_data = parser.parse(file_content)
         parser.validate_parsed_data(parsed_data)
     except Exception as e:
         raise HTTPException(
@@ -179,17 +315,27 @@ async def upload_archivo_entrada(
         proyecto_id=proyecto_id,
         nombre_archivo=file.filename,
         fichero=file_content,
+        hash_contenido=hashlib.sha256(content).hexdigest(),
+        tamaño=len(content),
         ataque=ataque_bool,
         num_neuronas=parsed_data["num_neuronas"],
-        capas=parsed_data["capas"],
-        matriz_pesos=parsed_data["matriz_pesos"]
+        capas=parsed_data["capas"]
     )
+    try:
+        store_weights(nuevo_archivo, parsed_data["matriz_pesos"], formato_pesos or WEIGHT_STORAGE_FORMAT)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     db.add(nuevo_archivo)
     proyecto.fecha_modificacion = datetime.utcnow()
     db.commit()
+    refresh_project_summary(db, current_user.id, proyecto_id)
     db.refresh(nuevo_archivo)
     
+    load_payloads(db, [nuevo_archivo])
     return nuevo_archivo
 
 @router.get("/{proyecto_id}/archivos-entrada", response_model=List[ArchivoEntradaResponse])
@@ -201,7 +347,8 @@ async def get_archivos_entrada(
     """Get all input files for a project"""
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -210,7 +357,11 @@ async def get_archivos_entrada(
             detail="Project not found"
         )
     
-    return proyecto.archivos_entrada
+    archivos = db.query(ArchivoEntrada).options(undefer_group("pesos")).filter(
+        ArchivoEntrada.proyecto_id == proyecto_id
+    ).order_by(ArchivoEntrada.id).all()
+    load_payloads(db, archivos)
+    return archivos
 
 @router.get("/{proyecto_id}/archivos-entrada/{archivo_id}", response_model=ArchivoEntradaResponse)
 async def get_archivo_entrada(
@@ -222,7 +373,8 @@ async def get_archivo_entrada(
     """Get a specific input file"""
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -231,7 +383,7 @@ async def get_archivo_entrada(
             detail="Project not found"
         )
     
-    archivo = db.query(ArchivoEntrada).filter(
+    archivo = db.query(ArchivoEntrada).options(undefer_group("pesos")).filter(
         ArchivoEntrada.id == archivo_id,
         ArchivoEntrada.proyecto_id == proyecto_id
     ).first()
@@ -242,8 +394,51 @@ async def get_archivo_entrada(
             detail="Input file not found"
         )
     
+    load_payloads(db, [archivo])
     return archivo
 
+@router.get("/{proyecto_id}/archivos-entrada/{archivo_id}/pesos", response_model=PesosEmpaquetadosResponse)
+async def get_pesos_empaquetados(
+    proyecto_id: int,
+    archivo_id: int,
+    formato: Optional[FormatoPesos] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Weights of an input file packed (base64), for clients that decode them
+    themselves. In the stored format by default, float32 for files stored
+    as JSON.
+    """
+    if formato == FormatoPesos.JSON:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="formato must be float32, float16 or int8"
+        )
+
+    archivo = db.query(ArchivoEntrada).join(Proyecto).filter(
+        ArchivoEntrada.id == archivo_id,
+        ArchivoEntrada.proyecto_id == proyecto_id,
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
+    ).first()
+
+    if not archivo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Input file not found"
+        )
+
+    # The stored packing is returned as is, other formats are encoded from the decoded weights
+    load_payloads(db, [archivo], weights=formato not in (None, archivo.formato_pesos))
+    try:
+        return packed_weights(archivo, formato)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.delete("/{proyecto_id}/archivos-entrada/{archivo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_archivo_entrada(
     proyecto_id: int,
@@ -254,7 +449,8 @@ async def delete_archivo_entrada(
     """Delete an input file"""
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
@@ -263,20 +459,24 @@ async def delete_archivo_entrada(
             detail="Project not found"
         )
     
-    archivo = db.query(ArchivoEntrada).filter(
+    # Deleted without loading the file content and weights
+    archivo_query = db.query(ArchivoEntrada).filter(
         ArchivoEntrada.id == archivo_id,
         ArchivoEntrada.proyecto_id == proyecto_id
-    ).first()
+    )
+    hash_contenido = archivo_query.with_entities(ArchivoEntrada.hash_contenido).scalar()
+    deleted = archivo_query.delete(synchronize_session=False)
     
-    if not archivo:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Input file not found"
         )
     
-    db.delete(archivo)
     proyecto.fecha_modificacion = datetime.utcnow()
     db.commit()
+    invalidate_matrices([hash_contenido])
+    refresh_project_summary(db, current_user.id, proyecto_id)
     
     return None
 
@@ -293,7 +493,8 @@ async def create_visualizacion(
     """Create a new visualization for a project"""
     proyecto = db.query(Proyecto).filter(
         Proyecto.id == proyecto_id,
-        Proyecto.usuario_id == current_user.id
+        Proyecto.usuario_id == current_user.id,
+        Proyecto.eliminado_en.is_(None)
     ).first()
     
     if not proyecto:
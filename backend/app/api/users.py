@@ -2,29 +2,24 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+import hmac
 import random
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
 
 from app.database import get_db
 from app.models.user import User
-from app.api.auth import get_current_user, get_password_hash, verify_password
+from app.api.auth import get_current_user, hash_password, check_password
+from app.services.mail_outbox import mail_outbox
+from app.services.ttl_store import get_ttl_store
 
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+router = APIRouter()
 
-# Gmail credentials
-GMAIL_USER = os.getenv("GMAIL_USER")
-GMAIL_PASSWORD = os.getenv("GMAIL_PASSWORD")
+RESET_CODE_TTL_SECONDS = 10 * 60
+# Wrong guesses before a reset code is invalidated
+RESET_CODE_MAX_ATTEMPTS = 5
 
-router = APIRouter()
 
-reset_codes = {}
+def _reset_code_key(email: str) -> str:
+    return f"reset_code:{email}"
 
 class UserUpdate(BaseModel):
     nombre: Optional[str] = None
@@ -45,24 +40,8 @@ class ResetPasswordWithCode(BaseModel):
 
 #Funtions
 def send_email(to_email: str, subject: str, body: str):
-
-    try:
-        message = MIMEMultipart()
-        message["From"] = GMAIL_USER
-        message["To"] = to_email
-        message["Subject"] = subject
-        
-        message.attach(MIMEText(body, "plain"))
-        
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(GMAIL_USER, GMAIL_PASSWORD)
-            server.send_message(message)
-        
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
+    # Delivered in the background, the request does not wait for SMTP
+    return mail_outbox.send(to_email, subject, body)
 
 #Routes
 @router.get("/me")
@@ -113,13 +92,13 @@ async def change_password(
 ):
     """Change user password"""
     
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    if not await check_password(password_data.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    current_user.password_hash = get_password_hash(password_data.new_password)
+    current_user.password_hash = await hash_password(password_data.new_password)
     db.commit()
     
     # Send confirmation email
@@ -147,11 +126,8 @@ async def request_reset_code(
     # Random 6-digit code
     code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
     
-    # Store code with expiration (10 minutes)
-    reset_codes[reset_request.email] = {
-        "code": code,
-        "expires_at": datetime.utcnow() + timedelta(minutes=10)
-    }
+    # Store code with expiration (10 minutes), replaces a previous code
+    get_ttl_store().set(_reset_code_key(reset_request.email), code, RESET_CODE_TTL_SECONDS)
     
     # Send email with code
     email_body = f"""Hello {user.nombre},
@@ -181,30 +157,26 @@ async def reset_password_with_code(
 ):
     """Reset password using code from email"""
     
-    # Check if code exists and is valid
-    if reset_data.email not in reset_codes:
+    store = get_ttl_store()
+    key = _reset_code_key(reset_data.email)
+    stored_code = store.get(key)
+    if stored_code is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset code"
         )
-    
-    stored_data = reset_codes[reset_data.email]
-    
-    # Check if code matches
-    if stored_data["code"] != reset_data.code:
+    if not hmac.compare_digest(stored_code.encode("utf-8"), reset_data.code.encode("utf-8")):
+        # Too many wrong guesses invalidate the code
+        if store.fail_attempt(key, RESET_CODE_MAX_ATTEMPTS):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Too many invalid attempts, request a new reset code"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid reset code"
         )
     
-    # Check if code expired
-    if datetime.utcnow() > stored_data["expires_at"]:
-        del reset_codes[reset_data.email]
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Reset code has expired"
-        )
-    
     # Find user
     user = db.query(User).filter(User.email == reset_data.email).first()
     if not user:
@@ -213,12 +185,17 @@ async def reset_password_with_code(
             detail="User not found"
         )
     
-    # Update password
-    user.password_hash = get_password_hash(reset_data.new_password)
-    db.commit()
+    # Hash first: if hashing is refused (busy) the code stays valid
+    password_hash = await hash_password(reset_data.new_password)
     
-    # Remove used code
-    del reset_codes[reset_data.email]
+    # Check and invalidate the code in one step right before committing, so it works only once
+    if not store.consume(key, reset_data.code):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired reset code"
+        )
+    user.password_hash = password_hash
+    db.commit()
     
     # Send confirmation
     send_email(
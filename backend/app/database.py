@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -11,7 +11,16 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 # Create engine (Neon requires SSL)
-engine = create_engine(DATABASE_URL)
+# SQLite is only used as a local stand-in (benchmarks); its connections are
+# shared with the threadpool that runs the sync dependencies.
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless enabled
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
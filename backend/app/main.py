@@ -1,16 +1,46 @@
-from fastapi import FastAPI
+import time
+
+# Measured before anything else is imported, reported at startup
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import asyncio
 import logging
+import os
 
 # Import database
-from app.database import engine, Base
+from app.database import engine
+from app.schema import SCHEMA_VERSION, check_schema, ensure_schema
+from app.services.query_stats import SQL_INSTRUMENTATION, QueryStatsMiddleware, install_query_instrumentation
+from app.services.metrics import (
+    METRICS_ENABLED,
+    STARTUP_DURATION,
+    MetricsMiddleware,
+    mark_worker_dead,
+    render_metrics,
+    update_db_pool_metrics,
+)
+from app.services.profiling import PROFILING_ENABLED
 
 # Import routers
 from app.api.auth import router as auth_router
 from app.api.users import router as users_router
 from app.api.projects import router as projects_router
 from app.api.exports import router as exports_router
+from app.services.export_jobs import export_queue
+from app.services.export_gc import EXPORT_GC_INTERVAL_SECONDS, run_export_gc
+from app.services.password_hashing import password_hasher
+from app.services.mail_outbox import mail_outbox
+from app.services.ttl_store import AUTH_STATE_SWEEP_SECONDS, run_ttl_sweeper
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+# STARTUP_MODE:
+# - full: create missing tables, apply migrations and stamp the schema version
+# - fast: only check the schema version (one cheap query), for worker cold starts
+STARTUP_MODE = os.getenv("STARTUP_MODE", "full").lower()
 
 # Configure logging
 logging.basicConfig(
@@ -24,37 +54,73 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """
     Startup and shutdown events
-    Tests database connection on startup
+    Tests database connection and schema on startup
     """
     logger.info(" Starting Neural Network Visualization API...")
+    startup_started = time.perf_counter()
     
-    # Test database connection
-    try:
-        # Try to connect to database
-        with engine.connect() as connection:
-            logger.info(" Database connection successful!")
-            logger.info(f" Connected to: {engine.url.database}")
-            logger.info(f" Host: {engine.url.host}")
-    except Exception as e:
-        logger.error(" Database connection failed!")
-        logger.error(f"Error: {str(e)}")
-        raise
-    
-    # Create tables if they don't exist
-    try:
-        Base.metadata.create_all(bind=engine)
-        logger.info(" Database tables ensured (create_all)")
-    except Exception as e:
-        logger.error(f" Failed to create tables: {str(e)}")
-        raise
+    if STARTUP_MODE == "fast":
+        # Schema version lookup doubles as the connection test
+        try:
+            check_schema(engine)
+            logger.info(f" Database schema version {SCHEMA_VERSION} verified (fast startup)")
+        except Exception as e:
+            logger.error(f" Schema check failed: {str(e)}")
+            raise
+    else:
+        # Test database connection
+        try:
+            # Try to connect to database
+            with engine.connect() as connection:
+                logger.info(" Database connection successful!")
+                logger.info(f" Connected to: {engine.url.database}")
+                logger.info(f" Host: {engine.url.host}")
+        except Exception as e:
+            logger.error(" Database connection failed!")
+            logger.error(f"Error: {str(e)}")
+            raise
+        
+        # Create tables if they don't exist and apply migrations
+        try:
+            ensure_schema(engine)
+            logger.info(f" Database tables ensured (schema version {SCHEMA_VERSION})")
+        except Exception as e:
+            logger.error(f" Failed to create tables: {str(e)}")
+            raise
+
+    # Periodic deletion of expired exports and quota enforcement
+    export_gc_task = None
+    if EXPORT_GC_INTERVAL_SECONDS > 0:
+        export_gc_task = asyncio.create_task(run_export_gc(EXPORT_GC_INTERVAL_SECONDS))
+
+    # Periodic deletion of expired reset codes
+    ttl_sweeper_task = None
+    if AUTH_STATE_SWEEP_SECONDS > 0:
+        ttl_sweeper_task = asyncio.create_task(run_ttl_sweeper(AUTH_STATE_SWEEP_SECONDS))
 
-    logger.info(" Application startup complete!")
+    lifespan_seconds = time.perf_counter() - startup_started
+    STARTUP_DURATION.labels(phase="imports").set(IMPORT_SECONDS)
+    STARTUP_DURATION.labels(phase="lifespan").set(lifespan_seconds)
+    logger.info(
+        f" Application startup complete! (imports {IMPORT_SECONDS * 1000:.0f} ms, "
+        f"startup {lifespan_seconds * 1000:.0f} ms, mode {STARTUP_MODE})"
+    )
     
     yield  # Application runs here
     
     # Shutdown
     logger.info(" Shutting down application...")
+    for task in (export_gc_task, ttl_sweeper_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    export_queue.shutdown()
+    password_hasher.shutdown()
+    # Waits for the queue to drain, off the event loop
+    await asyncio.to_thread(mail_outbox.shutdown)
     engine.dispose()
+    mark_worker_dead()
     logger.info(" Cleanup complete!")
 
 
@@ -75,8 +141,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Next-Cursor", "X-Total-Count"],
 )
 
+# SQL query instrumentation (per-request query count and DB time)
+if SQL_INSTRUMENTATION:
+    install_query_instrumentation(engine)
+    app.add_middleware(QueryStatsMiddleware)
+
+# Prometheus metrics (per-route latency, response sizes, DB pool)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, engine=engine)
+
+# On-demand request profiling (admin token or global sample rate)
+if PROFILING_ENABLED:
+    from app.services.profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -108,6 +189,14 @@ async def health_check():
             "error": str(e)
         }
 
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics endpoint"""
+        update_db_pool_metrics(engine)
+        content, content_type = render_metrics()
+        return Response(content=content, media_type=content_type)
+
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users_router, prefix="/api/users", tags=["Users"])
@@ -1,8 +1,12 @@
 from app.models.user import User
 from app.models.project import Proyecto, EstadoProyecto
-from app.models.archivo_entrada import ArchivoEntrada
+from app.models.archivo_entrada import ArchivoEntrada, FormatoPesos
 from app.models.visualizacion import Visualizacion
 from app.models.exportacion import Exportacion, FormatoExportacion
+from app.models.trabajo_exportacion import TrabajoExportacion, EstadoTrabajo
+from app.models.estado_temporal import EstadoTemporal
+from app.models.resumen_proyecto import ResumenProyecto
+from app.models.archivo_frio import ArchivoFrio
 
-__all__ = ["User", "Proyecto", "EstadoProyecto", "ArchivoEntrada", "Visualizacion", "Exportacion", "FormatoExportacion"]
+__all__ = ["User", "Proyecto", "EstadoProyecto", "ArchivoEntrada", "FormatoPesos", "Visualizacion", "Exportacion", "FormatoExportacion", "TrabajoExportacion", "EstadoTrabajo", "EstadoTemporal", "ResumenProyecto", "ArchivoFrio"]
 
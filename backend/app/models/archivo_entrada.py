@@ -1,20 +1,44 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, Float, JSON, LargeBinary, Enum as SQLEnum
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from app.database import Base
+import enum
+
+class FormatoPesos(str, enum.Enum):
+    """How the weight matrix is stored, see app.services.weight_quantization"""
+    JSON = "json"
+    FLOAT32 = "float32"
+    FLOAT16 = "float16"
+    INT8 = "int8"
 
 class ArchivoEntrada(Base):
     __tablename__ = "archivos_entrada"
     
     id = Column(Integer, primary_key=True, index=True)
-    proyecto_id = Column(Integer, ForeignKey("proyectos.id"), nullable=False, index=True)
+    proyecto_id = Column(Integer, ForeignKey("proyectos.id", ondelete="CASCADE"), nullable=False, index=True)
     nombre_archivo = Column(String(255), nullable=False)
-    fichero = Column(Text, nullable=False) 
+    # fichero and matriz_pesos are NULL while the payload is in cold storage (en_frio).
+    # The large columns are deferred: loaded on first access, or with
+    # undefer / undefer_group("pesos") where a listing needs them
+    fichero = deferred(Column(Text, nullable=True))
+    # SHA-256 of fichero
+    hash_contenido = Column(String(64), nullable=True)
+    # Bytes of fichero (UTF-8), so aggregates never read the content
+    tamaño = Column(BigInteger, nullable=True)
     ataque = Column(Boolean, default=False, nullable=False)
     num_neuronas = Column(Integer, nullable=False)
-    capas = Column(ARRAY(Integer), nullable=False)
-    matriz_pesos = Column(JSONB, nullable=False)
+    # JSON variants let the models run on SQLite (local benchmarks)
+    capas = Column(ARRAY(Integer).with_variant(JSON(), "sqlite"), nullable=False)
+    # NULL as well when the weights are stored in pesos (formato_pesos other than json)
+    matriz_pesos = deferred(Column(JSONB().with_variant(JSON(), "sqlite"), nullable=True), group="pesos")
+    formato_pesos = Column(SQLEnum(FormatoPesos, name="formato_pesos"), default=FormatoPesos.JSON, nullable=False)
+    # Packed matrix and its layout (shape, row lengths, per-layer scale and zero-point)
+    pesos = deferred(Column(LargeBinary, nullable=True), group="pesos")
+    cuantizacion = Column(JSONB().with_variant(JSON(), "sqlite"), nullable=True)
+    # Max absolute difference between the stored and the uploaded weights
+    error_cuantizacion = Column(Float, nullable=True)
+    en_frio = Column(Boolean, default=False, nullable=False)
     fecha_carga = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationship
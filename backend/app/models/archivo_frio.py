@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ArchivoFrio(Base):
+    """Compressed payload of an archived input file, see app.services.cold_storage"""
+    __tablename__ = "archivos_frios"
+    
+    archivo_id = Column(Integer, ForeignKey("archivos_entrada.id", ondelete="CASCADE"), primary_key=True)
+    # zstd-compressed JSON with fichero and matriz_pesos
+    contenido = Column(LargeBinary, nullable=False)
+    tamaño_original = Column(BigInteger, nullable=False)
+    fecha_archivado = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<ArchivoFrio(archivo_id={self.archivo_id}, bytes={len(self.contenido or b'')})>"
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from app.database import Base
+
+class EstadoTemporal(Base):
+    """Short-lived auth state (reset codes) of the database TTL store"""
+    __tablename__ = "estados_temporales"
+    
+    clave = Column(String(255), primary_key=True)
+    valor = Column(Text, nullable=False)
+    expira_en = Column(DateTime(timezone=True), nullable=False, index=True)
+    # Failed attempts against valor, see TTLStore.fail_attempt
+    intentos = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<EstadoTemporal(clave='{self.clave}', expira_en='{self.expira_en}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -9,10 +9,15 @@ class FormatoExportacion(str, enum.Enum):
     PNG = "png"
     SVG = "svg"
     JSON = "json"
+    NDJSON = "ndjson"
     HTML = "html"
 
 class Exportacion(Base):
     __tablename__ = "exportaciones"
+    __table_args__ = (
+        # Keyset pagination of a user's exports (newest first)
+        Index("ix_exportaciones_usuario_creacion", "usuario_id", "fecha_creacion", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     visualizacion_id = Column(Integer, ForeignKey("visualizaciones.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -23,6 +28,10 @@ class Exportacion(Base):
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     tamaño = Column(BigInteger, nullable=False)
     expira_en = Column(DateTime(timezone=True), nullable=True)
+    # Last download or cache hit, used for LRU eviction
+    ultimo_acceso = Column(DateTime(timezone=True), nullable=True)
+    # Hash of the rendering inputs, see app.services.export_cache
+    clave_cache = Column(String(64), nullable=True, index=True)
     
     # Relationships
     visualizacion = relationship("Visualizacion", back_populates="exportaciones")
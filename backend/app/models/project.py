@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -10,6 +10,10 @@ class EstadoProyecto(str, enum.Enum):
 
 class Proyecto(Base):
     __tablename__ = "proyectos"
+    __table_args__ = (
+        # Keyset pagination of a user's projects (newest modification first)
+        Index("ix_proyectos_usuario_modificacion", "usuario_id", "fecha_modificacion", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String(200), nullable=False)
@@ -22,11 +26,17 @@ class Proyecto(Base):
         default=EstadoProyecto.ACTIVO,
         nullable=False
     )
+    # Set when a background deletion is requested; the project is hidden
+    # from then on and the deletion resumed if it was interrupted
+    eliminado_en = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
     usuario = relationship("User", back_populates="proyectos")
-    archivos_entrada = relationship("ArchivoEntrada", back_populates="proyecto", cascade="all, delete-orphan")
-    visualizaciones = relationship("Visualizacion", back_populates="proyecto", cascade="all, delete-orphan")
+    # passive_deletes: the ON DELETE CASCADE foreign keys remove the
+    # children, the ORM never loads them (weights included) to delete them
+    archivos_entrada = relationship("ArchivoEntrada", back_populates="proyecto", cascade="all, delete-orphan", passive_deletes=True)
+    visualizaciones = relationship("Visualizacion", back_populates="proyecto", cascade="all, delete-orphan", passive_deletes=True)
+    resumen = relationship("ResumenProyecto", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Proyecto(id={self.id}, nombre='{self.nombre}')>"
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ResumenProyecto(Base):
+    """Maintained aggregates of a project's input files, see app.services.project_summary"""
+    __tablename__ = "resumenes_proyecto"
+    
+    proyecto_id = Column(Integer, ForeignKey("proyectos.id", ondelete="CASCADE"), primary_key=True)
+    num_archivos = Column(Integer, default=0, nullable=False)
+    num_ataques = Column(Integer, default=0, nullable=False)
+    total_neuronas = Column(BigInteger, default=0, nullable=False)
+    tamaño_archivos = Column(BigInteger, default=0, nullable=False)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<ResumenProyecto(proyecto_id={self.proyecto_id}, num_archivos={self.num_archivos})>"
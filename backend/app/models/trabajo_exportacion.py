@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.database import Base
+from app.models.exportacion import FormatoExportacion
+import enum
+
+class EstadoTrabajo(str, enum.Enum):
+    PENDIENTE = "pendiente"
+    EN_PROCESO = "en_proceso"
+    COMPLETADO = "completado"
+    FALLIDO = "fallido"
+    CANCELADO = "cancelado"
+
+ESTADOS_ACTIVOS = (EstadoTrabajo.PENDIENTE, EstadoTrabajo.EN_PROCESO)
+
+class TrabajoExportacion(Base):
+    __tablename__ = "trabajos_exportacion"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    visualizacion_id = Column(Integer, ForeignKey("visualizaciones.id", ondelete="CASCADE"), nullable=False, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
+    formato = Column(SQLEnum(FormatoExportacion, name="formato_exportacion"), nullable=False)
+    estado = Column(
+        SQLEnum(EstadoTrabajo, name="estado_trabajo"),
+        default=EstadoTrabajo.PENDIENTE,
+        nullable=False,
+        index=True
+    )
+    intentos = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    exportacion_id = Column(Integer, ForeignKey("exportaciones.id", ondelete="SET NULL"), nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Relationships
+    exportacion = relationship("Exportacion")
+    
+    def __repr__(self):
+        return f"<TrabajoExportacion(id={self.id}, formato='{self.formato}', estado='{self.estado}')>"
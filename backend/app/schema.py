@@ -0,0 +1,211 @@
+import logging
+
+from sqlalchemy import Column, Integer, MetaData, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Bump SCHEMA_VERSION whenever the models change and add the statements that
+# bring an existing database from the previous version to MIGRATIONS.
+# Fresh databases are created with create_all and stamped directly.
+SCHEMA_VERSION = 14
+
+MIGRATIONS: dict[int, list[str]] = {
+    # 2: trabajos_exportacion (new table, created by create_all)
+    2: [],
+    # 3: export deduplication
+    3: [
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS hash_contenido VARCHAR(64)",
+        "ALTER TABLE exportaciones ADD COLUMN IF NOT EXISTS clave_cache VARCHAR(64)",
+        "CREATE INDEX IF NOT EXISTS ix_exportaciones_clave_cache ON exportaciones (clave_cache)",
+    ],
+    # 4: export garbage collection (LRU)
+    4: [
+        "ALTER TABLE exportaciones ADD COLUMN IF NOT EXISTS ultimo_acceso TIMESTAMP WITH TIME ZONE",
+    ],
+    # 5: NDJSON exports (AUTOCOMMIT_MIGRATIONS)
+    5: [],
+    # 6: estados_temporales (new table, created by create_all)
+    6: [],
+    # 7: keyset pagination of the project and export listings
+    7: [
+        "CREATE INDEX IF NOT EXISTS ix_proyectos_usuario_modificacion ON proyectos (usuario_id, fecha_modificacion, id)",
+        "CREATE INDEX IF NOT EXISTS ix_exportaciones_usuario_creacion ON exportaciones (usuario_id, fecha_creacion, id)",
+    ],
+    # 8: project search (SEARCH_DDL)
+    8: [],
+    # 9: project summaries (resumenes_proyecto is created by create_all)
+    9: [
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS tamaño BIGINT",
+        "UPDATE archivos_entrada SET tamaño = octet_length(fichero) WHERE tamaño IS NULL",
+    ],
+    # 10: database-side cascade from projects to their input files
+    10: [
+        "ALTER TABLE archivos_entrada DROP CONSTRAINT IF EXISTS archivos_entrada_proyecto_id_fkey",
+        "ALTER TABLE archivos_entrada ADD CONSTRAINT archivos_entrada_proyecto_id_fkey "
+        "FOREIGN KEY (proyecto_id) REFERENCES proyectos (id) ON DELETE CASCADE",
+    ],
+    # 11: cold storage of archived projects (archivos_frios is created by create_all)
+    11: [
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS en_frio BOOLEAN NOT NULL DEFAULT false",
+        "ALTER TABLE archivos_entrada ALTER COLUMN fichero DROP NOT NULL",
+        "ALTER TABLE archivos_entrada ALTER COLUMN matriz_pesos DROP NOT NULL",
+    ],
+    # 12: quantized weight storage (enum labels are the member names)
+    12: [
+        "DO $$ BEGIN CREATE TYPE formato_pesos AS ENUM ('JSON', 'FLOAT32', 'FLOAT16', 'INT8'); "
+        "EXCEPTION WHEN duplicate_object THEN NULL; END $$",
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS formato_pesos formato_pesos NOT NULL DEFAULT 'JSON'",
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS pesos BYTEA",
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS cuantizacion JSONB",
+        "ALTER TABLE archivos_entrada ADD COLUMN IF NOT EXISTS error_cuantizacion DOUBLE PRECISION",
+    ],
+    # 13: failed attempts of short-lived auth state
+    13: [
+        "ALTER TABLE estados_temporales ADD COLUMN IF NOT EXISTS intentos INTEGER NOT NULL DEFAULT 0",
+    ],
+    # 14: resumable background deletion of projects
+    14: [
+        "ALTER TABLE proyectos ADD COLUMN IF NOT EXISTS eliminado_en TIMESTAMP WITH TIME ZONE",
+    ],
+}
+
+# Statements that can not run inside the migration transaction: a value
+# added with ALTER TYPE ... ADD VALUE is unusable until committed (and
+# before PostgreSQL 12 the statement is refused in a transaction block).
+# Applied one by one in autocommit mode before MIGRATIONS, so they must be
+# idempotent. Enum labels are the member names.
+AUTOCOMMIT_MIGRATIONS: dict[int, list[str]] = {
+    5: [
+        "ALTER TYPE formato_exportacion ADD VALUE IF NOT EXISTS 'NDJSON'",
+    ],
+}
+
+# Search indexes create_all cannot express (extensions, expression and
+# trigram indexes, FTS5 tables). Idempotent, applied on every full startup
+# so fresh and migrated databases get them alike. See app.services.project_search
+#
+# pg_trgm is only created when pg_extension does not list it. Roles that
+# may not create extensions need an operator to run CREATE EXTENSION
+# pg_trgm once; startup fails with that hint until then.
+SEARCH_DDL: dict[str, list[str]] = {
+    "postgresql": [
+        "DO $$ BEGIN "
+        "IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN CREATE EXTENSION pg_trgm; END IF; "
+        "EXCEPTION WHEN insufficient_privilege THEN RAISE EXCEPTION "
+        "'pg_trgm is not installed and this role cannot create it, run CREATE EXTENSION pg_trgm as a superuser'; "
+        "END $$",
+        "CREATE INDEX IF NOT EXISTS ix_proyectos_busqueda ON proyectos "
+        "USING gin (to_tsvector('simple', nombre || ' ' || coalesce(descripcion, '')))",
+        "CREATE INDEX IF NOT EXISTS ix_proyectos_nombre_trgm ON proyectos USING gin (nombre gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_archivos_entrada_nombre_trgm ON archivos_entrada "
+        "USING gin (nombre_archivo gin_trgm_ops)",
+    ],
+    # External content FTS5 tables kept in sync by triggers
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS proyectos_fts USING fts5("
+        "nombre, descripcion, content='proyectos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS proyectos_fts_ai AFTER INSERT ON proyectos BEGIN "
+        "INSERT INTO proyectos_fts(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion); END",
+        "CREATE TRIGGER IF NOT EXISTS proyectos_fts_ad AFTER DELETE ON proyectos BEGIN "
+        "INSERT INTO proyectos_fts(proyectos_fts, rowid, nombre, descripcion) "
+        "VALUES ('delete', old.id, old.nombre, old.descripcion); END",
+        "CREATE TRIGGER IF NOT EXISTS proyectos_fts_au AFTER UPDATE OF nombre, descripcion ON proyectos BEGIN "
+        "INSERT INTO proyectos_fts(proyectos_fts, rowid, nombre, descripcion) "
+        "VALUES ('delete', old.id, old.nombre, old.descripcion); "
+        "INSERT INTO proyectos_fts(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion); END",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS archivos_entrada_fts USING fts5("
+        "nombre_archivo, content='archivos_entrada', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS archivos_entrada_fts_ai AFTER INSERT ON archivos_entrada BEGIN "
+        "INSERT INTO archivos_entrada_fts(rowid, nombre_archivo) VALUES (new.id, new.nombre_archivo); END",
+        "CREATE TRIGGER IF NOT EXISTS archivos_entrada_fts_ad AFTER DELETE ON archivos_entrada BEGIN "
+        "INSERT INTO archivos_entrada_fts(archivos_entrada_fts, rowid, nombre_archivo) "
+        "VALUES ('delete', old.id, old.nombre_archivo); END",
+        "CREATE TRIGGER IF NOT EXISTS archivos_entrada_fts_au AFTER UPDATE OF nombre_archivo ON archivos_entrada BEGIN "
+        "INSERT INTO archivos_entrada_fts(archivos_entrada_fts, rowid, nombre_archivo) "
+        "VALUES ('delete', old.id, old.nombre_archivo); "
+        "INSERT INTO archivos_entrada_fts(rowid, nombre_archivo) VALUES (new.id, new.nombre_archivo); END",
+    ],
+}
+
+# Index tables filled from the rows that already exist when they are created
+SEARCH_REBUILD: dict[str, dict[str, str]] = {
+    "sqlite": {
+        "proyectos_fts": "INSERT INTO proyectos_fts(proyectos_fts) VALUES ('rebuild')",
+        "archivos_entrada_fts": "INSERT INTO archivos_entrada_fts(archivos_entrada_fts) VALUES ('rebuild')",
+    },
+}
+
+# Kept outside Base.metadata so create_all of the models never touches it
+_version_metadata = MetaData()
+schema_version_table = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, nullable=False),
+)
+
+
+def get_schema_version(engine: Engine) -> int | None:
+    """Stored schema version, None if the database was never stamped"""
+    with engine.connect() as connection:
+        try:
+            return connection.execute(select(schema_version_table.c.version)).scalar()
+        except Exception:
+            return None
+
+
+def check_schema(engine: Engine):
+    """
+    Cheap startup check: a single lookup in the version table.
+    Raises RuntimeError if the database is not at SCHEMA_VERSION.
+    """
+    version = get_schema_version(engine)
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version is {version}, expected {SCHEMA_VERSION}. "
+            "Start once with STARTUP_MODE=full to create or migrate the schema."
+        )
+
+
+def ensure_schema(engine: Engine):
+    """Create missing tables, apply pending migrations and stamp the version"""
+    # Register every model on Base.metadata
+    import app.models  # noqa: F401
+
+    is_new = not inspect(engine).has_table("usuarios")
+    version = None if is_new else get_schema_version(engine)
+
+    # MIGRATIONS are PostgreSQL statements; local SQLite databases are
+    # disposable and simply recreated
+    if not is_new and version != SCHEMA_VERSION and engine.dialect.name != "postgresql":
+        raise RuntimeError(
+            f"Database schema version is {version}, expected {SCHEMA_VERSION} and migrations "
+            f"only run on PostgreSQL. Delete the {engine.dialect.name} database to recreate it."
+        )
+
+    Base.metadata.create_all(bind=engine)
+    _version_metadata.create_all(bind=engine)
+
+    pending = [] if is_new else range((version or 0) + 1, SCHEMA_VERSION + 1)
+    if any(target in AUTOCOMMIT_MIGRATIONS for target in pending):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            for target in pending:
+                for statement in AUTOCOMMIT_MIGRATIONS.get(target, []):
+                    connection.execute(text(statement))
+
+    with engine.begin() as connection:
+        for target in pending:
+            for statement in MIGRATIONS.get(target, []):
+                connection.execute(text(statement))
+            if target in MIGRATIONS:
+                logger.info(f" Applied schema migration {target}")
+        rebuild = SEARCH_REBUILD.get(engine.dialect.name, {})
+        created = [table for table in rebuild if not inspect(connection).has_table(table)]
+        for statement in SEARCH_DDL.get(engine.dialect.name, []):
+            connection.execute(text(statement))
+        for table in created:
+            connection.execute(text(rebuild[table]))
+        connection.execute(schema_version_table.delete())
+        connection.execute(schema_version_table.insert().values(version=SCHEMA_VERSION))
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+from app.models.archivo_entrada import FormatoPesos
 
 class ArchivoEntradaUpload(BaseModel):
     # This will be handled via FormData in the endpoint
@@ -14,6 +15,9 @@ class ArchivoEntradaResponse(BaseModel):
     num_neuronas: int
     capas: List[int]
     matriz_pesos: List[List[float]]
+    formato_pesos: FormatoPesos = FormatoPesos.JSON
+    # Max absolute error of the stored weights, None when stored as JSON
+    error_cuantizacion: Optional[float] = None
     fecha_carga: datetime
     
     class Config:
@@ -25,3 +29,19 @@ class ArchivoEntradaDetail(ArchivoEntradaResponse):
     class Config:
         from_attributes = True
 
+
+class PesosEmpaquetadosResponse(BaseModel):
+    """Packed weight matrix, decoded as described in app.services.weight_quantization"""
+    archivo_id: int
+    formato: FormatoPesos
+    error_maximo: Optional[float] = None
+    # Base64 of the little-endian rows x cols matrix
+    datos: str
+    forma: List[int]
+    # Length of each row, None when every row has cols values
+    longitudes: Optional[List[int]] = None
+    # First row of each layer, with its int8 scale and zero-point
+    filas: List[int]
+    escalas: Optional[List[float]] = None
+    ceros: Optional[List[int]] = None
+    decimales: int
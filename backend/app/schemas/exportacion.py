@@ -2,11 +2,14 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional
 from app.models.exportacion import FormatoExportacion
+from app.models.trabajo_exportacion import EstadoTrabajo
 
 class ExportacionCreate(BaseModel):
     visualizacion_id: int
     formato: FormatoExportacion
     tipo_contenido: str = "visualization"
+    # Reuse an identical existing export instead of generating a new one
+    usar_cache: bool = True
 
 class ExportacionResponse(BaseModel):
     id: int
@@ -22,3 +25,16 @@ class ExportacionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TrabajoExportacionResponse(BaseModel):
+    id: int
+    visualizacion_id: int
+    formato: FormatoExportacion
+    estado: EstadoTrabajo
+    intentos: int
+    error: Optional[str] = None
+    exportacion_id: Optional[int] = None
+    fecha_creacion: datetime
+    fecha_actualizacion: datetime
+
+    class Config:
+        from_attributes = True
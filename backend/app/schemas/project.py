@@ -24,6 +24,21 @@ class ProyectoResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ProyectoBusquedaResponse(ProyectoResponse):
+    # Relevance, higher is better; only comparable within one search
+    puntuacion: float
+
+class ResumenProyectoResponse(BaseModel):
+    proyecto_id: int
+    nombre: str
+    estado: EstadoProyecto
+    fecha_modificacion: datetime
+    num_archivos: int
+    num_ataques: int
+    total_neuronas: int
+    # Bytes of the input files
+    tamaño_archivos: int
+
 class ProyectoWithFiles(ProyectoResponse):
     archivos_entrada: List['ArchivoEntradaResponse'] = []
     
@@ -0,0 +1,168 @@
+"""
+Cold storage of archived projects.
+
+When a project is archived, the payload of each of its input files
+(fichero and matriz_pesos, by far the largest columns) is compressed
+with zstd into archivos_frios and cleared from archivos_entrada, which
+keeps only the metadata and statistics (name, capas, num_neuronas,
+tamaño, hash). The files are moved one at a time, each in its own
+transaction, after the response.
+
+Nothing is restored when the project is reactivated: load_payloads,
+called wherever the content is needed, rehydrates the cold files of
+active projects on first access (hot columns written back, cold row
+deleted). Files of a project that is still archived are decompressed in
+memory only. Packed weights (app.services.weight_quantization) are
+already compact and stay in archivos_entrada.
+"""
+import json
+import logging
+import os
+from typing import Iterable, List
+
+from dotenv import load_dotenv
+from sqlalchemy import null
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.database import SessionLocal
+from app.models.archivo_entrada import ArchivoEntrada
+from app.models.archivo_frio import ArchivoFrio
+from app.models.project import EstadoProyecto, Proyecto
+from app.services.weight_quantization import load_weights
+
+# Load environment variables
+load_dotenv()
+
+# COLD_STORAGE_ENABLED: move payloads out when a project is archived
+COLD_STORAGE_ENABLED = os.getenv("COLD_STORAGE_ENABLED", "true").lower() == "true"
+# zstd level, 1 (fastest) to 22 (smallest)
+COLD_STORAGE_ZSTD_LEVEL = int(os.getenv("COLD_STORAGE_ZSTD_LEVEL", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+def _compress(fichero: str, matriz_pesos) -> bytes:
+    # Deferred: only needed when archiving
+    import zstandard
+
+    payload = json.dumps({"fichero": fichero, "matriz_pesos": matriz_pesos}, separators=(",", ":"))
+    return zstandard.ZstdCompressor(level=COLD_STORAGE_ZSTD_LEVEL).compress(payload.encode("utf-8"))
+
+
+def _decompress(contenido: bytes) -> dict:
+    import zstandard
+
+    return json.loads(zstandard.ZstdDecompressor().decompress(contenido))
+
+
+def _is_archived(db: Session, proyecto_id: int) -> bool:
+    return db.query(Proyecto.estado).filter(Proyecto.id == proyecto_id).scalar() == EstadoProyecto.ARCHIVADO
+
+
+def archive_project_payloads(proyecto_id: int):
+    """Move the payloads of an archived project to cold storage, runs after the response"""
+    if not COLD_STORAGE_ENABLED:
+        return
+    db = SessionLocal()
+    try:
+        archivo_ids = [archivo_id for (archivo_id,) in db.query(ArchivoEntrada.id).filter(
+            ArchivoEntrada.proyecto_id == proyecto_id,
+            ArchivoEntrada.en_frio.is_(False)
+        ).order_by(ArchivoEntrada.id).all()]
+
+        moved = original = compressed = 0
+        for archivo_id in archivo_ids:
+            # Reactivated meanwhile: leave the remaining files hot
+            if not _is_archived(db, proyecto_id):
+                break
+            fichero, matriz_pesos = db.query(ArchivoEntrada.fichero, ArchivoEntrada.matriz_pesos).filter(
+                ArchivoEntrada.id == archivo_id,
+                ArchivoEntrada.en_frio.is_(False)
+            ).one_or_none() or (None, None)
+            if fichero is None:
+                continue
+
+            contenido = _compress(fichero, matriz_pesos)
+            tamaño_original = len(fichero.encode("utf-8"))
+            db.add(ArchivoFrio(archivo_id=archivo_id, contenido=contenido, tamaño_original=tamaño_original))
+            db.query(ArchivoEntrada).filter(ArchivoEntrada.id == archivo_id).update(
+                {"fichero": null(), "matriz_pesos": null(), "en_frio": True}, synchronize_session=False
+            )
+            db.commit()
+            moved += 1
+            original += tamaño_original
+            compressed += len(contenido)
+
+        if moved:
+            logger.info(f" Archived {moved} files of project {proyecto_id} ({original} -> {compressed} bytes)")
+    except Exception:
+        db.rollback()
+        logger.exception(f" Cold storage of project {proyecto_id} failed")
+    finally:
+        db.close()
+
+
+def load_payloads(db: Session, archivos: Iterable[ArchivoEntrada], weights: bool = True):
+    """
+    Make fichero and matriz_pesos of archivos available. Cold files of
+    active projects are also rehydrated (committed apart, db is left
+    untouched), those of archived projects only decompressed.
+    Packed weights are decoded into matriz_pesos unless weights is False.
+    """
+    archivos = list(archivos)
+    _load_cold(db, archivos)
+    if weights:
+        load_weights(archivos)
+
+
+def _load_cold(db: Session, archivos: List[ArchivoEntrada]):
+    cold = {archivo.id: archivo for archivo in archivos if archivo.en_frio}
+    if not cold:
+        return
+
+    archived = {}
+    rehydrate = []
+    filas = db.query(ArchivoFrio.archivo_id, ArchivoFrio.contenido).filter(
+        ArchivoFrio.archivo_id.in_(list(cold))
+    ).all()
+    for archivo_id, contenido in filas:
+        archivo = cold[archivo_id]
+        payload = _decompress(contenido)
+        if archivo.proyecto_id not in archived:
+            archived[archivo.proyecto_id] = _is_archived(db, archivo.proyecto_id)
+        # Loaded as if read from the database, the caller's session is never flushed
+        set_committed_value(archivo, "fichero", payload["fichero"])
+        set_committed_value(archivo, "matriz_pesos", payload["matriz_pesos"])
+        if not archived[archivo.proyecto_id]:
+            set_committed_value(archivo, "en_frio", False)
+            rehydrate.append((archivo_id, payload))
+
+    if rehydrate:
+        _write_back(rehydrate)
+
+
+def _write_back(rehydrate: List[tuple]):
+    """Hot columns back and cold rows deleted, in a session of its own"""
+    db = SessionLocal()
+    try:
+        for archivo_id, payload in rehydrate:
+            matriz_pesos = payload["matriz_pesos"]
+            db.query(ArchivoEntrada).filter(
+                ArchivoEntrada.id == archivo_id,
+                ArchivoEntrada.en_frio.is_(True)
+            ).update({
+                "fichero": payload["fichero"],
+                "matriz_pesos": null() if matriz_pesos is None else matriz_pesos,
+                "en_frio": False,
+            }, synchronize_session=False)
+            # A concurrent rehydration may have removed it already
+            db.query(ArchivoFrio).filter(ArchivoFrio.archivo_id == archivo_id).delete(synchronize_session=False)
+        db.commit()
+        logger.info(f" Rehydrated {len(rehydrate)} files from cold storage")
+    except Exception:
+        db.rollback()
+        # Served from the cold copy this time, retried on the next access
+        logger.exception(" Rehydration from cold storage failed")
+    finally:
+        db.close()
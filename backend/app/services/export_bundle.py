@@ -0,0 +1,195 @@
+"""
+Zip bundle of a project: its exports and the original input files.
+
+The archive is produced as a stream of chunks: zipfile writes to a sink
+that never seeks (entries use data descriptors), and every chunk is
+yielded as soon as it is written. Sources are read ahead in parallel by a
+small thread pool, at most BUNDLE_PREFETCH entries at a time, so slow
+storage (S3) does not serialize the bundle. Entries above
+BUNDLE_PREFETCH_MAX_BYTES are not read ahead but streamed in chunks when
+their turn comes, keeping memory bounded.
+
+Entries deleted since they were listed (FileNotFoundError from every
+storage backend) are left out of the archive and of its manifest. A
+streamed entry is opened and its first chunk read before its header is
+written, so a missing one never leaves a truncated member behind.
+"""
+import itertools
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session, load_only
+
+from app.database import SessionLocal
+from app.models.archivo_entrada import ArchivoEntrada
+from app.models.exportacion import Exportacion, FormatoExportacion
+from app.models.visualizacion import Visualizacion
+from app.services.cold_storage import load_payloads
+from app.services.export_cache import is_expired
+from app.services.export_storage import get_export_storage
+
+# Load environment variables
+load_dotenv()
+
+BUNDLE_READ_THREADS = int(os.getenv("BUNDLE_READ_THREADS", "4"))
+BUNDLE_PREFETCH = int(os.getenv("BUNDLE_PREFETCH", "8"))
+BUNDLE_PREFETCH_MAX_BYTES = int(os.getenv("BUNDLE_PREFETCH_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Already compressed formats are stored as is
+STORED_FORMATS = [FormatoExportacion.PNG, FormatoExportacion.PDF]
+
+
+@dataclass
+class BundleEntry:
+    arcname: str
+    size: int
+    compress: bool
+    # Chunks of the entry, called from a worker thread
+    read: Callable[[], Iterable[bytes]]
+
+
+class _StreamSink:
+    """Write-only, non-seekable file object collecting what zipfile writes"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _read_archivo(archivo_id: int) -> List[bytes]:
+    # Own session: runs in a worker thread after the request session is gone
+    db = SessionLocal()
+    try:
+        archivo = db.query(ArchivoEntrada).options(
+            load_only(ArchivoEntrada.proyecto_id, ArchivoEntrada.fichero, ArchivoEntrada.en_frio)
+        ).filter(ArchivoEntrada.id == archivo_id).first()
+        if archivo is None:
+            raise FileNotFoundError(archivo_id)
+        # Archived projects keep the content in cold storage
+        load_payloads(db, [archivo], weights=False)
+        fichero = archivo.fichero
+    finally:
+        db.close()
+    return [(fichero or "").encode("utf-8")]
+
+
+def bundle_entries(db: Session, proyecto_id: int) -> List[BundleEntry]:
+    """Entries of the bundle, only metadata is loaded here"""
+    storage = get_export_storage()
+    entries = []
+
+    exportaciones = db.query(Exportacion).join(Visualizacion).filter(
+        Visualizacion.proyecto_id == proyecto_id
+    ).order_by(Exportacion.id).all()
+    for exportacion in exportaciones:
+        if is_expired(exportacion):
+            continue
+        key = exportacion.archivo
+        entries.append(BundleEntry(
+            arcname=f"exports/{exportacion.id}_{Path(key).name}",
+            size=exportacion.tamaño,
+            compress=exportacion.formato not in STORED_FORMATS,
+            read=lambda key=key: storage.open_stream(key),
+        ))
+
+    archivos = db.query(ArchivoEntrada.id, ArchivoEntrada.nombre_archivo).filter(
+        ArchivoEntrada.proyecto_id == proyecto_id
+    ).order_by(ArchivoEntrada.id).all()
+    for archivo_id, nombre_archivo in archivos:
+        entries.append(BundleEntry(
+            arcname=f"archivos_entrada/{archivo_id}_{Path(nombre_archivo).name}",
+            # Unknown without loading the content, small text files
+            size=0,
+            compress=True,
+            read=lambda archivo_id=archivo_id: _read_archivo(archivo_id),
+        ))
+    return entries
+
+
+def _prefetch(entry: BundleEntry):
+    """Read a small entry completely, large ones are streamed later"""
+    if entry.size > BUNDLE_PREFETCH_MAX_BYTES:
+        return None
+    try:
+        return list(entry.read())
+    except FileNotFoundError:
+        # Deleted since the entries were listed
+        return FileNotFoundError
+
+
+def _open_lazy(entry: BundleEntry) -> Optional[Iterable[bytes]]:
+    """Chunks of a large entry with the first one already read, None if it is gone"""
+    chunks = iter(entry.read())
+    try:
+        first = next(chunks, b"")
+    except FileNotFoundError:
+        return None
+    return itertools.chain([first], chunks)
+
+
+def stream_bundle(entries: List[BundleEntry], manifest: dict) -> Iterator[bytes]:
+    """Generate the zip archive chunk by chunk"""
+    sink = _StreamSink()
+    written = []
+    now = datetime.now().timetuple()[:6]
+
+    with ThreadPoolExecutor(max_workers=BUNDLE_READ_THREADS, thread_name_prefix="bundle") as executor:
+        pending = deque()
+        remaining = iter(entries)
+
+        def fill():
+            while len(pending) < BUNDLE_PREFETCH:
+                entry = next(remaining, None)
+                if entry is None:
+                    return
+                pending.append((entry, executor.submit(_prefetch, entry)))
+
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+            fill()
+            while pending:
+                entry, future = pending.popleft()
+                fill()
+                chunks = future.result()
+                if chunks is FileNotFoundError:
+                    continue
+                if chunks is None:
+                    chunks = _open_lazy(entry)
+                    if chunks is None:
+                        continue
+
+                info = zipfile.ZipInfo(entry.arcname, date_time=now)
+                info.compress_type = zipfile.ZIP_DEFLATED if entry.compress else zipfile.ZIP_STORED
+                with archive.open(info, "w", force_zip64=entry.size > 2 ** 31) as target:
+                    for chunk in chunks:
+                        target.write(chunk)
+                        yield sink.drain()
+                written.append(entry.arcname)
+                yield sink.drain()
+
+            manifest = {**manifest, "archivos": written}
+            archive.writestr("manifest.json", json.dumps(manifest, indent=2, default=str))
+        yield sink.drain()
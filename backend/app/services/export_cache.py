@@ -0,0 +1,103 @@
+"""
+Deduplication of exports.
+
+An export is identified by a cache key: the SHA-256 of the visualization's
+layout_config, the content hashes of the input files it shows, the format,
+the version of the renderer of that format and the environment settings
+that change its output (_renderer_settings). A request whose key
+matches a live export of the same visualization reuses that export
+instead of generating a new file.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session, object_session
+
+from app.models.archivo_entrada import ArchivoEntrada, FormatoPesos
+from app.models.exportacion import Exportacion, FormatoExportacion
+from app.models.visualizacion import Visualizacion
+from app.services.export_storage import get_export_storage
+
+# Bump the version of a format whenever its renderer output changes so
+# that exports produced by the previous renderer are no longer reused
+RENDERER_VERSIONS = {
+    FormatoExportacion.PDF: 1,
+    FormatoExportacion.PNG: 1,
+    FormatoExportacion.SVG: 1,
+    FormatoExportacion.JSON: 2,
+    FormatoExportacion.NDJSON: 1,
+    FormatoExportacion.HTML: 1,
+}
+
+
+def content_hash(archivo: ArchivoEntrada) -> str:
+    """SHA-256 of the file content, computed and stored for rows uploaded before it existed"""
+    if archivo.hash_contenido is None:
+        if archivo.en_frio:
+            from app.services.cold_storage import load_payloads
+            load_payloads(object_session(archivo), [archivo], weights=False)
+        archivo.hash_contenido = hashlib.sha256(archivo.fichero.encode("utf-8")).hexdigest()
+    return archivo.hash_contenido
+
+
+def _file_key(archivo: ArchivoEntrada) -> str:
+    # Packed weights render differently from the same content stored as JSON
+    if archivo.formato_pesos in (None, FormatoPesos.JSON):
+        return content_hash(archivo)
+    return f"{content_hash(archivo)}:{archivo.formato_pesos.value}"
+
+
+def _renderer_settings(formato: FormatoExportacion) -> dict:
+    """Effective settings of the renderer of formato that change its output"""
+    # Deferred: the renderers import numpy, the export job loads them anyway
+    if formato == FormatoExportacion.SVG:
+        from app.services.svg_exporter import SVG_COLOR_BUCKETS, SVG_EDGE_THRESHOLD
+        return {"edge_threshold": SVG_EDGE_THRESHOLD, "color_buckets": SVG_COLOR_BUCKETS}
+    if formato == FormatoExportacion.PDF:
+        from app.services.pdf_exporter import PDF_LAYER_SPACING, PDF_MIN_NEURON_SPACING
+        return {"min_neuron_spacing": PDF_MIN_NEURON_SPACING, "layer_spacing": PDF_LAYER_SPACING}
+    if formato == FormatoExportacion.PNG:
+        from app.services.png_renderer import PNG_MAX_DIMENSION
+        return {"max_dimension": PNG_MAX_DIMENSION}
+    return {}
+
+
+def export_cache_key(visualizacion: Visualizacion, formato: FormatoExportacion) -> str:
+    # Deferred: network_layout imports numpy
+    from app.services.network_layout import visualization_files
+
+    payload = {
+        "layout_config": visualizacion.layout_config or {},
+        "archivos": [_file_key(archivo) for archivo in visualization_files(visualizacion, with_payload=False)],
+        "formato": formato.value,
+        "renderer": RENDERER_VERSIONS[formato],
+        "settings": _renderer_settings(formato),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_expired(exportacion: Exportacion) -> bool:
+    expira_en = exportacion.expira_en
+    if expira_en is None:
+        return False
+    if expira_en.tzinfo is None:
+        # SQLite returns naive datetimes
+        expira_en = expira_en.replace(tzinfo=timezone.utc)
+    return expira_en < datetime.now(timezone.utc)
+
+
+def find_cached_export(db: Session, visualizacion_id: int, clave_cache: str) -> Optional[Exportacion]:
+    """Latest export of the visualization with this key that is still downloadable"""
+    storage = get_export_storage()
+    candidates = db.query(Exportacion).filter(
+        Exportacion.visualizacion_id == visualizacion_id,
+        Exportacion.clave_cache == clave_cache
+    ).order_by(Exportacion.fecha_creacion.desc(), Exportacion.id.desc()).all()
+
+    for exportacion in candidates:
+        if not is_expired(exportacion) and storage.exists(exportacion.archivo):
+            return exportacion
+    return None
@@ -0,0 +1,181 @@
+"""
+Garbage collection of export files.
+
+A sweep deletes, file and row, in batches of EXPORT_GC_BATCH_SIZE:
+
+1. expired exports,
+2. the least recently used exports of every user above
+   EXPORT_QUOTA_PER_USER_BYTES,
+3. the least recently used exports overall while the total is above
+   EXPORT_QUOTA_TOTAL_BYTES.
+
+Exports younger than EXPORT_GC_MIN_AGE_SECONDS are never evicted by the
+quotas so a fresh export can always be downloaded. Every sweep also
+fails the export jobs left active by a worker that died (see
+app.services.export_jobs.fail_stale_jobs) and resumes interrupted project
+deletions (app.services.project_deletion.resume_project_deletions).
+
+Every worker runs the sweeper. On PostgreSQL a session advisory lock
+lets one sweep run at a time, the others skip their turn. Elsewhere the
+quota passes recompute the usage before every batch, so concurrent
+sweeps do not evict more than the quotas require.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from dotenv import load_dotenv
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal, engine
+from app.models.exportacion import Exportacion
+from app.services.export_storage import get_export_storage
+from app.services.metrics import EXPORT_GC_DELETED, EXPORT_GC_RECLAIMED_BYTES
+
+# Load environment variables
+load_dotenv()
+
+# EXPORT_GC_INTERVAL_SECONDS: time between sweeps, 0 disables the sweeper
+# EXPORT_QUOTA_*_BYTES: 0 disables the quota
+EXPORT_GC_INTERVAL_SECONDS = float(os.getenv("EXPORT_GC_INTERVAL_SECONDS", "900"))
+EXPORT_GC_BATCH_SIZE = int(os.getenv("EXPORT_GC_BATCH_SIZE", "200"))
+EXPORT_GC_MIN_AGE_SECONDS = float(os.getenv("EXPORT_GC_MIN_AGE_SECONDS", "3600"))
+EXPORT_QUOTA_PER_USER_BYTES = int(os.getenv("EXPORT_QUOTA_PER_USER_BYTES", str(1024 ** 3)))
+EXPORT_QUOTA_TOTAL_BYTES = int(os.getenv("EXPORT_QUOTA_TOTAL_BYTES", str(50 * 1024 ** 3)))
+
+logger = logging.getLogger(__name__)
+
+# Least recently used first; never downloaded exports by creation date
+LRU_ORDER = (func.coalesce(Exportacion.ultimo_acceso, Exportacion.fecha_creacion), Exportacion.id)
+# pg_try_advisory_lock key of the sweeper
+SWEEP_LOCK_KEY = 0x6578706f7274  # "export"
+
+
+def _delete_batch(db: Session, exportaciones: List[Exportacion], reason: str) -> int:
+    """Delete the files and rows of a batch, returns the bytes reclaimed"""
+    # Files already deleted by another worker or by hand count as 0 bytes
+    storage = get_export_storage()
+    reclaimed = sum(storage.delete(exportacion.archivo) for exportacion in exportaciones)
+
+    ids = [exportacion.id for exportacion in exportaciones]
+    db.query(Exportacion).filter(Exportacion.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+
+    EXPORT_GC_DELETED.labels(reason=reason).inc(len(ids))
+    EXPORT_GC_RECLAIMED_BYTES.labels(reason=reason).inc(reclaimed)
+    return reclaimed
+
+
+def sweep_expired(db: Session) -> int:
+    reclaimed = 0
+    now = datetime.now(timezone.utc)
+    while True:
+        batch = db.query(Exportacion).filter(
+            Exportacion.expira_en < now
+        ).order_by(Exportacion.id).limit(EXPORT_GC_BATCH_SIZE).all()
+        if not batch:
+            return reclaimed
+        reclaimed += _delete_batch(db, batch, "expired")
+
+
+def _evict_lru(db: Session, query, quota: int, reason: str) -> int:
+    """Delete exports of query in LRU order until their total fits quota"""
+    reclaimed = 0
+    min_created = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_GC_MIN_AGE_SECONDS)
+    usage = query.with_entities(func.coalesce(func.sum(Exportacion.tamaño), 0))
+    query = query.filter(Exportacion.fecha_creacion < min_created).order_by(*LRU_ORDER)
+    while True:
+        # Recomputed every batch, another sweep may have evicted meanwhile
+        excess = int(usage.scalar()) - quota
+        if excess <= 0:
+            break
+        batch = []
+        for exportacion in query.limit(EXPORT_GC_BATCH_SIZE).all():
+            if excess <= 0:
+                break
+            batch.append(exportacion)
+            excess -= exportacion.tamaño
+        if not batch:
+            break
+        reclaimed += _delete_batch(db, batch, reason)
+    return reclaimed
+
+
+def enforce_user_quotas(db: Session) -> int:
+    if EXPORT_QUOTA_PER_USER_BYTES <= 0:
+        return 0
+    usage = db.query(Exportacion.usuario_id, func.sum(Exportacion.tamaño)).group_by(
+        Exportacion.usuario_id
+    ).having(func.sum(Exportacion.tamaño) > EXPORT_QUOTA_PER_USER_BYTES).all()
+
+    reclaimed = 0
+    for usuario_id, _ in usage:
+        query = db.query(Exportacion).filter(Exportacion.usuario_id == usuario_id)
+        reclaimed += _evict_lru(db, query, EXPORT_QUOTA_PER_USER_BYTES, "user_quota")
+    return reclaimed
+
+
+def enforce_global_quota(db: Session) -> int:
+    if EXPORT_QUOTA_TOTAL_BYTES <= 0:
+        return 0
+    return _evict_lru(db, db.query(Exportacion), EXPORT_QUOTA_TOTAL_BYTES, "global_quota")
+
+
+def sweep_exports() -> int:
+    """Run one full sweep, returns the bytes reclaimed"""
+    # Deferred: export_jobs imports the renderers
+    from app.services.export_jobs import export_queue
+
+    # Every worker touches its own jobs, whichever of them sweeps
+    export_queue.heartbeat()
+    if engine.dialect.name != "postgresql":
+        return _sweep()
+
+    # The lock lives on this connection, the sweep commits on its own
+    with engine.connect() as lock_connection:
+        if not lock_connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SWEEP_LOCK_KEY}).scalar():
+            logger.info(" Export sweep skipped, another worker is sweeping")
+            return 0
+        try:
+            return _sweep()
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SWEEP_LOCK_KEY})
+            lock_connection.commit()
+
+
+def _sweep() -> int:
+    # Deferred: export_jobs imports the renderers
+    from app.services.export_jobs import fail_stale_jobs
+    from app.services.project_deletion import resume_project_deletions
+
+    resume_project_deletions()
+    db = SessionLocal()
+    try:
+        fail_stale_jobs(db)
+        expired = sweep_expired(db)
+        user_quota = enforce_user_quotas(db)
+        global_quota = enforce_global_quota(db)
+    finally:
+        db.close()
+
+    reclaimed = expired + user_quota + global_quota
+    if reclaimed:
+        logger.info(
+            f" Export sweep reclaimed {reclaimed} bytes (expired {expired}, "
+            f"user quota {user_quota}, global quota {global_quota})"
+        )
+    return reclaimed
+
+
+async def run_export_gc(interval: float):
+    """Sweep every interval seconds until cancelled"""
+    while True:
+        try:
+            await run_in_threadpool(sweep_exports)
+        except Exception:
+            logger.exception(" Export sweep failed")
+        await asyncio.sleep(interval)
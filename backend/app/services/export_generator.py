@@ -0,0 +1,157 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import gzip
+import json
+import os
+import shutil
+
+from app.models.visualizacion import Visualizacion
+from app.models.exportacion import FormatoExportacion
+from app.services.metrics import EXPORT_GENERATION_DURATION
+
+# Working directory of the renderers (default backend/exports, whatever
+# the current directory), created on the first export
+EXPORTS_DIR = Path(os.getenv("EXPORTS_DIR", str(Path(__file__).resolve().parents[2] / "exports"))).resolve()
+
+CONTENT_TYPES = {
+    FormatoExportacion.PDF: "application/pdf",
+    FormatoExportacion.PNG: "image/png",
+    FormatoExportacion.SVG: "image/svg+xml",
+    FormatoExportacion.JSON: "application/json",
+    FormatoExportacion.NDJSON: "application/x-ndjson",
+    FormatoExportacion.HTML: "text/html"
+}
+
+# Text formats are also stored precompressed next to the export so that
+# downloads can pick a variant from Accept-Encoding without compressing
+EXPORT_PRECOMPRESS = os.getenv("EXPORT_PRECOMPRESS", "true").lower() == "true"
+PRECOMPRESSED_FORMATS = [FormatoExportacion.SVG, FormatoExportacion.JSON, FormatoExportacion.NDJSON, FormatoExportacion.HTML]
+# Preferred encoding first
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+def write_export_file(visualizacion: Visualizacion, formato: FormatoExportacion) -> Path:
+    """Generate the export of a visualization and write it to EXPORTS_DIR"""
+    # Generate filename
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
+    filename = f"export_{visualizacion.id}_{timestamp}.{formato.value}"
+    EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    filepath = EXPORTS_DIR / filename
+    
+    with EXPORT_GENERATION_DURATION.labels(formato=formato.value).time():
+        _render_export_file(visualizacion, formato, filepath)
+        if EXPORT_PRECOMPRESS and formato in PRECOMPRESSED_FORMATS:
+            precompress_export(filepath)
+    
+    return filepath
+
+def precompress_export(filepath: Path):
+    """Write the gzip (and brotli, if installed) siblings of an export"""
+    with open(filepath, 'rb') as source, gzip.open(filepath.with_name(filepath.name + ".gz"), 'wb', compresslevel=9) as target:
+        shutil.copyfileobj(source, target)
+    
+    try:
+        import brotli
+    except ImportError:
+        return
+    compressor = brotli.Compressor(quality=11)
+    with open(filepath, 'rb') as source, open(filepath.with_name(filepath.name + ".br"), 'wb') as target:
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            target.write(compressor.process(chunk))
+        target.write(compressor.finish())
+
+def _render_export_file(visualizacion: Visualizacion, formato: FormatoExportacion, filepath: Path):
+    if formato == FormatoExportacion.PNG:
+        # numpy/Pillow are only imported when a raster export is requested
+        from app.services.network_layout import build_geometry, visualization_files
+        from app.services.png_renderer import write_png
+        write_png(build_geometry(visualization_files(visualizacion, with_payload=False)), filepath)
+        return
+
+    if formato == FormatoExportacion.PDF:
+        # Pages are streamed to filepath as they are generated
+        from app.services.network_layout import build_geometry, visualization_files
+        from app.services.pdf_exporter import write_pdf
+        write_pdf(build_geometry(visualization_files(visualizacion, with_payload=False)), visualizacion, filepath)
+        return
+
+    if formato == FormatoExportacion.SVG:
+        from app.services.network_layout import build_geometry, visualization_files
+        from app.services.svg_exporter import write_svg
+        write_svg(build_geometry(visualization_files(visualizacion, with_payload=False)), visualizacion, filepath)
+        return
+
+    if formato in [FormatoExportacion.JSON, FormatoExportacion.NDJSON]:
+        # Encoded and written one weight row at a time
+        from app.services.network_layout import visualization_files
+        from app.services.json_exporter import write_json
+        write_json(visualizacion, visualization_files(visualizacion, with_payload=False), filepath,
+                   ndjson=formato == FormatoExportacion.NDJSON)
+        return
+
+    # Generate export content based on format
+    content = generate_export_content(visualizacion, formato)
+    
+    # Save file (HTML)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(content if isinstance(content, str) else str(content))
+
+def generate_export_content(visualizacion: Visualizacion, formato: FormatoExportacion) -> str:
+    """Generate export content based on format"""
+    layout_config = visualizacion.layout_config or {}
+    
+    if formato == FormatoExportacion.HTML:
+        return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Visualization Export - {visualizacion.id}</title>
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            margin: 20px;
+            background: #f5f5f5;
+        }}
+        .container {{
+            background: white;
+            padding: 30px;
+            border-radius: 10px;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
+        }}
+        h1 {{
+            color: #333;
+            border-bottom: 2px solid #4CAF50;
+            padding-bottom: 10px;
+        }}
+        .info {{
+            margin: 20px 0;
+            padding: 15px;
+            background: #f9f9f9;
+            border-left: 4px solid #4CAF50;
+        }}
+        .config {{
+            background: #f0f0f0;
+            padding: 15px;
+            border-radius: 5px;
+            font-family: monospace;
+            white-space: pre-wrap;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Neural Network Visualization Export</h1>
+        <div class="info">
+            <p><strong>Visualization ID:</strong> {visualizacion.id}</p>
+            <p><strong>Project ID:</strong> {visualizacion.proyecto_id}</p>
+            <p><strong>Created:</strong> {visualizacion.fecha_creacion}</p>
+            <p><strong>Active:</strong> {visualizacion.activo}</p>
+        </div>
+        <h2>Layout Configuration</h2>
+        <div class="config">{json.dumps(layout_config, indent=2)}</div>
+    </div>
+</body>
+</html>"""
+    
+    return ""
+
@@ -0,0 +1,231 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.exportacion import Exportacion
+from app.models.trabajo_exportacion import ESTADOS_ACTIVOS, TrabajoExportacion, EstadoTrabajo
+from app.models.visualizacion import Visualizacion
+from app.services.export_cache import export_cache_key
+from app.services.export_generator import CONTENT_TYPES, write_export_file
+from app.services.export_storage import delete_working_file, get_export_storage
+
+# Load environment variables
+load_dotenv()
+
+# EXPORT_WORKERS: exports generated at the same time by this process
+# EXPORT_QUEUE_SIZE: jobs waiting for a worker before new ones are rejected
+# EXPORT_MAX_JOBS_PER_USER: pending or running jobs allowed per user
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_QUEUE_SIZE = int(os.getenv("EXPORT_QUEUE_SIZE", "50"))
+EXPORT_MAX_JOBS_PER_USER = int(os.getenv("EXPORT_MAX_JOBS_PER_USER", "3"))
+EXPORT_MAX_ATTEMPTS = int(os.getenv("EXPORT_MAX_ATTEMPTS", "3"))
+EXPORT_RETRY_BACKOFF_SECONDS = float(os.getenv("EXPORT_RETRY_BACKOFF_SECONDS", "1"))
+# Active jobs not touched for this long belong to a dead worker (killed,
+# out of memory) and are failed by the export sweeper. Live jobs are
+# touched on every sweep, so keep it well above EXPORT_GC_INTERVAL_SECONDS
+EXPORT_JOB_TIMEOUT_SECONDS = float(os.getenv("EXPORT_JOB_TIMEOUT_SECONDS", "3600"))
+EXPORT_EXPIRATION_DAYS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class ExportQueueFull(Exception):
+    """No room left in the export queue"""
+
+
+class ExportJobCancelled(Exception):
+    """The job was cancelled while it was being processed"""
+
+
+class ExportJobQueue:
+    """
+    Bounded worker pool that generates exports outside the request.
+
+    Job state lives in the trabajos_exportacion table so any worker can
+    report it; cancellation of a job running in this process is signalled
+    through an in-memory event.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._cancel_events: dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, trabajo_id: int):
+        """Queue a job, raises ExportQueueFull if the queue is at capacity"""
+        if not self._slots.acquire(blocking=False):
+            raise ExportQueueFull()
+        with self._lock:
+            self._cancel_events[trabajo_id] = threading.Event()
+        self._executor.submit(self._run, trabajo_id)
+
+    def cancel(self, trabajo_id: int):
+        """Signal a job of this process to stop at the next checkpoint"""
+        with self._lock:
+            event = self._cancel_events.get(trabajo_id)
+        if event is not None:
+            event.set()
+
+    def heartbeat(self):
+        """Touch the jobs queued or running in this process so they are not taken for stale"""
+        with self._lock:
+            trabajo_ids = list(self._cancel_events)
+        if not trabajo_ids:
+            return
+        db = SessionLocal()
+        try:
+            db.query(TrabajoExportacion).filter(
+                TrabajoExportacion.id.in_(trabajo_ids),
+                TrabajoExportacion.estado.in_(ESTADOS_ACTIVOS)
+            ).update({"fecha_actualizacion": func.now()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def shutdown(self):
+        """Stop the running jobs and fail the ones that never started"""
+        with self._lock:
+            events = list(self._cancel_events.values())
+        for event in events:
+            event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+        with self._lock:
+            never_started = list(self._cancel_events)
+            self._cancel_events.clear()
+        if never_started:
+            db = SessionLocal()
+            try:
+                db.query(TrabajoExportacion).filter(
+                    TrabajoExportacion.id.in_(never_started),
+                    TrabajoExportacion.estado == EstadoTrabajo.PENDIENTE
+                ).update({"estado": EstadoTrabajo.FALLIDO, "error": "Server shut down"}, synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+    def _run(self, trabajo_id: int):
+        try:
+            self._process(trabajo_id)
+        except Exception:
+            logger.exception(f" Export job {trabajo_id} crashed")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(trabajo_id, None)
+            self._slots.release()
+
+    def _process(self, trabajo_id: int):
+        cancel_event = self._cancel_events[trabajo_id]
+        db = SessionLocal()
+        try:
+            trabajo = db.query(TrabajoExportacion).filter(TrabajoExportacion.id == trabajo_id).first()
+            if trabajo is None or trabajo.estado != EstadoTrabajo.PENDIENTE:
+                return
+
+            trabajo.estado = EstadoTrabajo.EN_PROCESO
+            db.commit()
+
+            while True:
+                trabajo.intentos += 1
+                db.commit()
+                try:
+                    exportacion = self._generate(db, trabajo, cancel_event)
+                except ExportJobCancelled:
+                    self._finish(db, trabajo, EstadoTrabajo.CANCELADO)
+                    return
+                except Exception as e:
+                    db.rollback()
+                    logger.warning(f" Export job {trabajo_id} attempt {trabajo.intentos} failed: {str(e)}")
+                    if trabajo.intentos >= EXPORT_MAX_ATTEMPTS:
+                        self._finish(db, trabajo, EstadoTrabajo.FALLIDO, error=str(e))
+                        return
+                    trabajo.error = str(e)
+                    db.commit()
+                    # Exponential backoff, interrupted by cancellation
+                    backoff = EXPORT_RETRY_BACKOFF_SECONDS * 2 ** (trabajo.intentos - 1)
+                    if cancel_event.wait(backoff):
+                        self._finish(db, trabajo, EstadoTrabajo.CANCELADO)
+                        return
+                    continue
+
+                trabajo.exportacion_id = exportacion.id
+                if not self._finish(db, trabajo, EstadoTrabajo.COMPLETADO):
+                    get_export_storage().delete(exportacion.archivo)
+                return
+        finally:
+            db.close()
+
+    def _generate(self, db, trabajo: TrabajoExportacion, cancel_event: threading.Event) -> Exportacion:
+        if cancel_event.is_set():
+            raise ExportJobCancelled()
+
+        visualizacion = db.query(Visualizacion).filter(Visualizacion.id == trabajo.visualizacion_id).first()
+        if visualizacion is None:
+            raise ValueError("Visualization not found")
+
+        # Key of the inputs the file is rendered from
+        clave_cache = export_cache_key(visualizacion, trabajo.formato)
+        filepath = write_export_file(visualizacion, trabajo.formato)
+
+        if cancel_event.is_set():
+            delete_working_file(filepath)
+            raise ExportJobCancelled()
+
+        tamaño = filepath.stat().st_size
+        # Move (or upload) the working file to the configured storage
+        archivo = get_export_storage().store(filepath)
+
+        exportacion = Exportacion(
+            visualizacion_id=trabajo.visualizacion_id,
+            usuario_id=trabajo.usuario_id,
+            tipo_contenido=CONTENT_TYPES.get(trabajo.formato, "application/octet-stream"),
+            formato=trabajo.formato,
+            archivo=archivo,
+            tamaño=tamaño,
+            expira_en=datetime.now(timezone.utc) + timedelta(days=EXPORT_EXPIRATION_DAYS),
+            clave_cache=clave_cache
+        )
+        db.add(exportacion)
+        db.flush()
+        return exportacion
+
+    def _finish(self, db, trabajo: TrabajoExportacion, estado: EstadoTrabajo, error: str | None = None) -> bool:
+        """Record the final state, returns False if the job was cancelled meanwhile"""
+        # A cancellation recorded by the API wins over the worker's result
+        db.refresh(trabajo, attribute_names=["estado"])
+        if trabajo.estado == EstadoTrabajo.CANCELADO and estado != EstadoTrabajo.CANCELADO:
+            db.rollback()
+            return False
+        trabajo.estado = estado
+        if error is not None or estado == EstadoTrabajo.COMPLETADO:
+            trabajo.error = error
+        db.commit()
+        return True
+
+
+def fail_stale_jobs(db: Session) -> int:
+    """
+    Fail the active jobs of workers that died without finishing them, so
+    they stop counting against EXPORT_MAX_JOBS_PER_USER. Returns how many.
+    """
+    limit = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_JOB_TIMEOUT_SECONDS)
+    failed = db.query(TrabajoExportacion).filter(
+        TrabajoExportacion.estado.in_(ESTADOS_ACTIVOS),
+        TrabajoExportacion.fecha_actualizacion < limit
+    ).update({"estado": EstadoTrabajo.FALLIDO, "error": "Export worker stopped"}, synchronize_session=False)
+    db.commit()
+    if failed:
+        logger.warning(f" Failed {failed} export jobs left by a stopped worker")
+    return failed
+
+
+export_queue = ExportJobQueue(EXPORT_WORKERS, EXPORT_QUEUE_SIZE)
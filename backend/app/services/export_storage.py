@@ -0,0 +1,218 @@
+"""
+Storage backends for export files.
+
+Exports are generated into a local working file and then handed to the
+configured backend, which returns the key stored in Exportacion.archivo.
+Precompressed siblings (key + ".gz" / ".br") travel with the export.
+
+EXPORT_STORAGE selects the backend:
+
+- local: files under EXPORT_STORAGE_DIR, sharded in two directory levels
+  by the hash of the name so no directory grows too large,
+- s3: any S3-compatible service (AWS, MinIO, ...). Uploads stream from
+  disk in multipart chunks and downloads are handed off to the client
+  with a pre-signed URL, or streamed through the API if
+  S3_PRESIGNED_DOWNLOADS is false.
+"""
+import hashlib
+import logging
+import os
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+from app.services.export_generator import EXPORTS_DIR, PRECOMPRESSED_SUFFIXES
+
+# Load environment variables
+load_dotenv()
+
+EXPORT_STORAGE = os.getenv("EXPORT_STORAGE", "local").lower()
+EXPORT_STORAGE_DIR = Path(os.getenv("EXPORT_STORAGE_DIR", str(EXPORTS_DIR)))
+
+S3_BUCKET = os.getenv("S3_BUCKET", "exports")
+S3_PREFIX = os.getenv("S3_PREFIX", "exports/")
+# e.g. http://localhost:9000 for a local MinIO, unset for AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION")
+S3_PRESIGNED_DOWNLOADS = os.getenv("S3_PRESIGNED_DOWNLOADS", "true").lower() == "true"
+S3_PRESIGNED_URL_EXPIRES = int(os.getenv("S3_PRESIGNED_URL_EXPIRES", "300"))
+
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _variants(key: str) -> list[str]:
+    return [key] + [key + suffix for suffix in PRECOMPRESSED_SUFFIXES.values()]
+
+
+class ExportStorage(ABC):
+    """Interface of the export storage backends"""
+
+    @abstractmethod
+    def store(self, filepath: Path) -> str:
+        """Take over a generated file and its siblings, returns the storage key"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether the export is still stored"""
+
+    @abstractmethod
+    def delete(self, key: str) -> int:
+        """Delete an export and its siblings, returns the bytes freed"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path on this machine, None for remote backends"""
+        return None
+
+    @abstractmethod
+    def open_stream(self, key: str) -> Iterator[bytes]:
+        """Content of the export in chunks, FileNotFoundError (on the first chunk) if it is gone"""
+
+    def presigned_url(self, key: str, filename: str, content_type: str) -> Optional[str]:
+        """URL the client can download from directly, None if not supported"""
+        return None
+
+
+class LocalExportStorage(ExportStorage):
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def store(self, filepath: Path) -> str:
+        digest = hashlib.sha256(filepath.name.encode("utf-8")).hexdigest()
+        key = f"{digest[:2]}/{digest[2:4]}/{filepath.name}"
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        for source, destination in zip(_variants(str(filepath)), _variants(str(target))):
+            if Path(source).exists():
+                # A rename when the working directory is on the same filesystem
+                shutil.move(source, destination)
+        return key
+
+    def local_path(self, key: str) -> Path:
+        path = self.root / key
+        if not path.exists() and Path(key).exists():
+            # Rows created before the storage backends stored the file path
+            return Path(key)
+        return path
+
+    def exists(self, key: str) -> bool:
+        return self.local_path(key).exists()
+
+    def delete(self, key: str) -> int:
+        freed = 0
+        for variant in _variants(str(self.local_path(key))):
+            path = Path(variant)
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return freed
+
+    def open_stream(self, key: str) -> Iterator[bytes]:
+        with open(self.local_path(key), "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+
+class S3ExportStorage(ExportStorage):
+
+    def __init__(self, bucket: str, prefix: str, endpoint_url: Optional[str], region: Optional[str]):
+        # boto3 is only needed (and imported) when the S3 backend is selected
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.transfer_config = TransferConfig(multipart_chunksize=8 * CHUNK_SIZE, max_concurrency=4)
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def store(self, filepath: Path) -> str:
+        key = filepath.name
+        for source, variant in zip(_variants(str(filepath)), _variants(key)):
+            path = Path(source)
+            if not path.exists():
+                continue
+            # Multipart upload streamed from disk
+            self.client.upload_file(str(path), self.bucket, self._object_key(variant), Config=self.transfer_config)
+            path.unlink()
+        return key
+
+    def _size(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))["ContentLength"]
+        except ClientError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return self._size(key) is not None
+
+    def delete(self, key: str) -> int:
+        freed = 0
+        for variant in _variants(key):
+            size = self._size(variant)
+            if size is not None:
+                self.client.delete_object(Bucket=self.bucket, Key=self._object_key(variant))
+                freed += size
+        return freed
+
+    def open_stream(self, key: str) -> Iterator[bytes]:
+        from botocore.exceptions import ClientError
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            # Same as the local backend for a missing object
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise FileNotFoundError(key) from e
+            raise
+        yield from response["Body"].iter_chunks(CHUNK_SIZE)
+
+    def presigned_url(self, key: str, filename: str, content_type: str) -> Optional[str]:
+        if not S3_PRESIGNED_DOWNLOADS:
+            return None
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+                "ResponseContentDisposition": f'attachment; filename="{filename}"',
+                "ResponseContentType": content_type,
+            },
+            ExpiresIn=S3_PRESIGNED_URL_EXPIRES,
+        )
+
+
+def delete_working_file(filepath: Path) -> int:
+    """Delete a generated file that was never stored, and its siblings. Returns the bytes freed"""
+    # The working directory is laid out like local storage, keys are the file names
+    return LocalExportStorage(filepath.parent).delete(filepath.name)
+
+
+def _create_storage() -> ExportStorage:
+    if EXPORT_STORAGE == "s3":
+        logger.info(f" Export storage: s3://{S3_BUCKET}/{S3_PREFIX} ({S3_ENDPOINT_URL or 'AWS'})")
+        return S3ExportStorage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    if EXPORT_STORAGE != "local":
+        raise ValueError(f"Unknown EXPORT_STORAGE '{EXPORT_STORAGE}', expected 'local' or 's3'")
+    return LocalExportStorage(EXPORT_STORAGE_DIR)
+
+
+_storage: Optional[ExportStorage] = None
+
+
+def get_export_storage() -> ExportStorage:
+    """Configured storage backend, created on first use"""
+    global _storage
+    if _storage is None:
+        _storage = _create_storage()
+    return _storage
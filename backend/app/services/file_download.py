@@ -0,0 +1,197 @@
+"""
+File responses for export downloads.
+
+On top of a plain FileResponse this supports:
+
+- ETag / If-None-Match (304 Not Modified),
+- single byte ranges with Range / If-Range (206 Partial Content, 416),
+- precompressed siblings (file.br, file.gz) chosen from Accept-Encoding.
+
+The file is read in CHUNK_SIZE chunks off the event loop. ASGI gives no
+access to the socket, so there is no sendfile; uvicorn does not offer
+the zero-copy extension either.
+"""
+import hashlib
+import os
+import re
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.services.export_generator import PRECOMPRESSED_SUFFIXES
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Encodings of an Accept-Encoding header with their q-values"""
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        encodings[name.strip().lower()] = q
+    return encodings
+
+
+def negotiate_encoding(path: Path, accept_encoding: str) -> tuple[Path, Optional[str]]:
+    """
+    Best precompressed sibling of path the client accepts, in the order of
+    PRECOMPRESSED_SUFFIXES (brotli before gzip). Returns (path, None) when
+    the file has to be sent as is.
+    """
+    accepted = _accepted_encodings(accept_encoding)
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            candidate = path.with_name(path.name + suffix)
+            if candidate.exists():
+                return candidate, encoding
+    return path, None
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single range header.
+    Raises ValueError if the range can not be satisfied, returns None if
+    the header is not a single byte range (the full file is sent).
+    """
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError()
+    return start, end
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+
+class RangeFileResponse(Response):
+    """Response serving a file, see the module docstring"""
+
+    def __init__(self, path: Path, request_headers: Headers, media_type: str, filename: str,
+                 background: Optional[BackgroundTask] = None):
+        self.status_code = 200
+        self.background = background
+        self.request_headers = request_headers
+        self.media_type = media_type
+        self.filename = filename
+        self.path, self.encoding = negotiate_encoding(
+            Path(path), request_headers.get("accept-encoding", "")
+        )
+
+    def _etag(self, stat_result: os.stat_result) -> str:
+        base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}-{self.encoding or 'identity'}"
+        return '"' + hashlib.md5(base.encode(), usedforsecurity=False).hexdigest() + '"'
+
+    def _headers(self, stat_result: os.stat_result, etag: str) -> dict[str, str]:
+        quoted = quote(self.filename)
+        if quoted != self.filename:
+            disposition = f"attachment; filename*=utf-8''{quoted}"
+        else:
+            disposition = f'attachment; filename="{self.filename}"'
+        headers = {
+            "content-type": self.media_type,
+            "content-disposition": disposition,
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "vary": "Accept-Encoding",
+        }
+        if self.encoding:
+            headers["content-encoding"] = self.encoding
+        return headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        size = stat_result.st_size
+        etag = self._etag(stat_result)
+        headers = self._headers(stat_result, etag)
+
+        if_none_match = self.request_headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            await self._send_empty(send, 304, headers)
+        else:
+            await self._send_file(send, headers, size, etag)
+
+        if self.background is not None:
+            await self.background()
+
+    async def _send_file(self, send: Send, headers: dict[str, str], size: int, etag: str):
+        status, start, end = 200, 0, size - 1
+        range_header = self.request_headers.get("range")
+        if_range = self.request_headers.get("if-range")
+        # If-Range: only honour the range if the client still has this version
+        if range_header and size and (if_range is None or if_range.strip() == etag):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                headers.pop("content-encoding", None)
+                headers["content-range"] = f"bytes */{size}"
+                await self._send_empty(send, 416, headers)
+                return
+            if byte_range is not None:
+                status, (start, end) = 206, byte_range
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        count = end - start + 1 if size else 0
+        headers["content-length"] = str(count)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        })
+
+        with open(self.path, "rb") as file:
+            await anyio.to_thread.run_sync(file.seek, start)
+            remaining = count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0 or count == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def _send_empty(send: Send, status: int, headers: dict[str, str]):
+        headers["content-length"] = "0"
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,130 @@
+"""
+JSON and NDJSON exporters.
+
+Both embed the layers (capas) and the weight matrix of every network the
+visualization shows. The documents are encoded incrementally, one weight
+row at a time, and written straight to the export file so the output is
+never held in memory as a whole.
+
+JSON: a single object, one weight row per line::
+
+    {"visualizacion_id": ..., "layout_config": {...}, ...,
+     "redes": [{"id": ..., "capas": [...], "matriz_pesos": [
+       [...],
+       ...
+     ]}]}
+
+NDJSON: one record per line, tagged with "tipo": a "visualizacion"
+record, then for every network a "red" record followed by one "fila"
+record per neuron with its outgoing weights.
+
+The weight rows are read one at a time as well: stored JSON matrices
+through a server-side cursor over their elements, packed matrices
+decoded row by row. Only payloads in cold storage, compressed as a
+whole, are loaded entirely.
+"""
+import json
+from pathlib import Path
+from typing import Iterator, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import object_session
+
+from app.models.archivo_entrada import ArchivoEntrada, FormatoPesos
+from app.models.visualizacion import Visualizacion
+from app.services.cold_storage import load_payloads
+from app.services.weight_quantization import decode_rows
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+# One row per element of matriz_pesos, in order
+_ROWS_SQL = {
+    "postgresql": text(
+        "SELECT t.fila FROM archivos_entrada "
+        "CROSS JOIN LATERAL jsonb_array_elements(archivos_entrada.matriz_pesos) WITH ORDINALITY AS t(fila, n) "
+        "WHERE archivos_entrada.id = :archivo_id ORDER BY t.n"
+    ),
+    "sqlite": text(
+        "SELECT json_each.value FROM archivos_entrada, json_each(archivos_entrada.matriz_pesos) "
+        "WHERE archivos_entrada.id = :archivo_id ORDER BY json_each.key"
+    ),
+}
+
+
+def _visualizacion_fields(visualizacion: Visualizacion) -> dict:
+    return {
+        "visualizacion_id": visualizacion.id,
+        "proyecto_id": visualizacion.proyecto_id,
+        "layout_config": visualizacion.layout_config or {},
+        "fecha_creacion": visualizacion.fecha_creacion.isoformat(),
+        "activo": visualizacion.activo,
+    }
+
+
+def _red_fields(archivo: ArchivoEntrada) -> dict:
+    return {
+        "id": archivo.id,
+        "nombre_archivo": archivo.nombre_archivo,
+        "ataque": archivo.ataque,
+        "num_neuronas": archivo.num_neuronas,
+        "capas": list(archivo.capas),
+    }
+
+
+def _layer_of_rows(capas: List[int]) -> Iterator[int]:
+    for layer, size in enumerate(capas):
+        for _ in range(size):
+            yield layer
+
+
+def _weight_rows(archivo: ArchivoEntrada) -> Iterator[List[float]]:
+    """Rows of the weight matrix of archivo, without loading it as a whole"""
+    db = object_session(archivo)
+    if archivo.en_frio:
+        load_payloads(db, [archivo], weights=False)
+    if archivo.formato_pesos not in (None, FormatoPesos.JSON) and archivo.pesos is not None:
+        yield from decode_rows(archivo)
+        return
+    dialect = db.get_bind().dialect.name
+    if archivo.en_frio or "matriz_pesos" in archivo.__dict__ or dialect not in _ROWS_SQL:
+        # Already in memory (or decompressed from cold storage)
+        yield from archivo.matriz_pesos or []
+        return
+
+    result = db.execute(_ROWS_SQL[dialect].execution_options(stream_results=True), {"archivo_id": archivo.id})
+    for (fila,) in result:
+        # SQLite returns the JSON text of the element
+        yield json.loads(fila) if isinstance(fila, str) else fila
+
+
+def json_chunks(visualizacion: Visualizacion, archivos: List[ArchivoEntrada]) -> Iterator[str]:
+    """Generate the JSON document chunk by chunk"""
+    header = _encode(_visualizacion_fields(visualizacion))
+    # Reopen the object to append the networks
+    yield header[:-1] + ',\n"redes":['
+    for index, archivo in enumerate(archivos):
+        red = _encode(_red_fields(archivo))
+        yield ("," if index else "") + "\n" + red[:-1] + ',"matriz_pesos":['
+        for row_index, row in enumerate(_weight_rows(archivo)):
+            yield ("," if row_index else "") + "\n" + _encode(row)
+        yield "\n]}"
+    yield "\n]}\n"
+
+
+def ndjson_chunks(visualizacion: Visualizacion, archivos: List[ArchivoEntrada]) -> Iterator[str]:
+    """Generate the NDJSON records line by line"""
+    yield _encode({"tipo": "visualizacion", **_visualizacion_fields(visualizacion)}) + "\n"
+    for archivo in archivos:
+        yield _encode({"tipo": "red", **_red_fields(archivo)}) + "\n"
+        layers = _layer_of_rows(list(archivo.capas))
+        for neurona, row in enumerate(_weight_rows(archivo)):
+            capa = next(layers, None)
+            yield _encode({"tipo": "fila", "red_id": archivo.id, "neurona": neurona, "capa": capa, "pesos": row}) + "\n"
+
+
+def write_json(visualizacion: Visualizacion, archivos: List[ArchivoEntrada], filepath: Path, ndjson: bool = False):
+    """Write the JSON (or NDJSON) export of a visualization to filepath"""
+    chunks = ndjson_chunks if ndjson else json_chunks
+    with open(filepath, "w", encoding="utf-8") as f:
+        for chunk in chunks(visualizacion, archivos):
+            f.write(chunk)
@@ -0,0 +1,211 @@
+"""
+Outbound mail queue.
+
+Request handlers only enqueue messages; a single background thread owns
+one SMTP connection, kept open between messages and closed after
+SMTP_IDLE_SECONDS without mail, and delivers them in order. Transient
+failures (connection lost, 4xx replies) are retried up to
+MAIL_MAX_ATTEMPTS times with exponential backoff, permanent ones (5xx
+replies) are dropped and logged.
+
+The server is configurable (SMTP_HOST, SMTP_PORT, SMTP_SECURITY) so a
+local stand-in such as `python -m aiosmtpd -n -l localhost:1025` with
+SMTP_SECURITY=none can be used in development.
+"""
+import logging
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from dataclasses import dataclass, field
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from dotenv import load_dotenv
+
+from app.services.metrics import MAIL_DELIVERY_DURATION, MAIL_MESSAGES, MAIL_QUEUE_DEPTH
+
+# Load environment variables
+load_dotenv()
+
+# SMTP_SECURITY: starttls (port 587), ssl (port 465) or none (local stand-in)
+# SMTP_USER / SMTP_PASSWORD: defaults to the Gmail credentials, no login when empty
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "starttls").lower()
+SMTP_USER = os.getenv("SMTP_USER", os.getenv("GMAIL_USER"))
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", os.getenv("GMAIL_PASSWORD"))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+MAIL_FROM = os.getenv("MAIL_FROM", SMTP_USER or "")
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("MAIL_RETRY_BACKOFF_SECONDS", "2"))
+# Time given to the queue to drain on shutdown
+MAIL_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("MAIL_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutgoingMail:
+    to_email: str
+    subject: str
+    body: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies will not succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class MailOutbox:
+    """Queue of outgoing messages delivered by one thread over a reused SMTP connection"""
+
+    def __init__(self, queue_size: int):
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._connection = None
+
+    def send(self, to_email: str, subject: str, body: str) -> bool:
+        """Queue a message, returns False if the outbox is full or shutting down"""
+        if self._stopping.is_set():
+            MAIL_MESSAGES.labels(result="dropped").inc()
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait(OutgoingMail(to_email, subject, body))
+        except queue.Full:
+            logger.warning(f" Mail outbox full, dropping message to {to_email}")
+            MAIL_MESSAGES.labels(result="dropped").inc()
+            return False
+        MAIL_QUEUE_DEPTH.inc()
+        return True
+
+    def shutdown(self):
+        """
+        Deliver what is queued (bounded by MAIL_SHUTDOWN_TIMEOUT_SECONDS) and
+        stop. Blocks while waiting, call it from a thread in async code.
+        """
+        self._stopping.set()
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        # Wakes the worker if it is idle. A full queue means it is busy, it
+        # checks the stop event once the queue is drained
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        thread.join(MAIL_SHUTDOWN_TIMEOUT_SECONDS)
+        if thread.is_alive():
+            logger.warning(f" Mail outbox stopped with {self._queue.qsize()} messages undelivered")
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mail-outbox", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if self._stopping.is_set() and self._queue.empty():
+                break
+            try:
+                mail = self._queue.get(timeout=SMTP_IDLE_SECONDS)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if mail is None:
+                if self._queue.empty():
+                    break
+                continue
+            MAIL_QUEUE_DEPTH.dec()
+            self._deliver(mail)
+        self._disconnect()
+
+    def _deliver(self, mail: OutgoingMail):
+        while True:
+            mail.attempts += 1
+            try:
+                self._send_message(mail)
+            except Exception as e:
+                # The connection may be unusable after any error
+                self._disconnect()
+                if _is_permanent(e) or mail.attempts >= MAIL_MAX_ATTEMPTS:
+                    logger.error(f" Mail to {mail.to_email} failed after {mail.attempts} attempts: {str(e)}")
+                    MAIL_MESSAGES.labels(result="failed").inc()
+                    return
+                logger.warning(f" Mail to {mail.to_email} attempt {mail.attempts} failed: {str(e)}")
+                MAIL_MESSAGES.labels(result="retried").inc()
+                # Exponential backoff, cut short on shutdown
+                backoff = MAIL_RETRY_BACKOFF_SECONDS * 2 ** (mail.attempts - 1)
+                if self._stopping.wait(backoff):
+                    logger.error(f" Mail to {mail.to_email} abandoned on shutdown")
+                    MAIL_MESSAGES.labels(result="failed").inc()
+                    return
+                continue
+            MAIL_MESSAGES.labels(result="sent").inc()
+            MAIL_DELIVERY_DURATION.observe(time.monotonic() - mail.enqueued_at)
+            return
+
+    def _send_message(self, mail: OutgoingMail):
+        message = MIMEMultipart()
+        message["From"] = MAIL_FROM
+        message["To"] = mail.to_email
+        message["Subject"] = mail.subject
+        message.attach(MIMEText(mail.body, "plain"))
+
+        reused = self._connection is not None
+        try:
+            self._connect().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            if not reused:
+                raise
+            # The server closed the idle connection, reconnect right away
+            self._disconnect()
+            self._connect().send_message(message)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._connection is not None:
+            return self._connection
+
+        if SMTP_SECURITY == "ssl":
+            connection = smtplib.SMTP_SSL(
+                SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS, context=ssl.create_default_context()
+            )
+        else:
+            connection = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if SMTP_SECURITY == "starttls":
+                connection.starttls(context=ssl.create_default_context())
+            if SMTP_USER and SMTP_PASSWORD:
+                connection.login(SMTP_USER, SMTP_PASSWORD)
+        except Exception:
+            connection.close()
+            raise
+        self._connection = connection
+        return connection
+
+    def _disconnect(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+
+mail_outbox = MailOutbox(MAIL_QUEUE_SIZE)
@@ -0,0 +1,160 @@
+"""
+On-disk cache of decoded weight matrices.
+
+Decoding matriz_pesos (JSON lists, or packed weights) into a dense array
+is done once per file content: the float32 matrix is saved as
+MATRIX_CACHE_DIR/<content hash>-<formato_pesos>.npy, written to a
+temporary file and renamed, so readers never see a partial file. Every
+worker maps the same file read-only with np.memmap, the rows are paged in
+on demand and shared through the OS page cache instead of each worker
+holding its own copy.
+
+The directory is bounded by MATRIX_CACHE_MAX_BYTES, least recently used
+files (by mtime, touched on every hit) are evicted first. Unlinking a
+file another worker still maps is safe, the mapping stays valid until
+it is dropped. Files of deleted input files are removed with
+invalidate_matrices. numpy is only imported when a matrix is read, the
+API imports this module for invalidate_matrices.
+"""
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import object_session
+
+from app.models.archivo_entrada import ArchivoEntrada
+from app.services.cold_storage import load_payloads
+from app.services.export_cache import content_hash
+from app.services.metrics import MATRIX_CACHE_EVICTIONS, MATRIX_CACHE_LOOKUPS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Load environment variables
+load_dotenv()
+
+MATRIX_CACHE_ENABLED = os.getenv("MATRIX_CACHE_ENABLED", "true").lower() == "true"
+# Local directory, shared by the workers of one machine (backend/matrix_cache by default)
+MATRIX_CACHE_DIR = Path(os.getenv("MATRIX_CACHE_DIR", str(Path(__file__).resolve().parents[2] / "matrix_cache"))).resolve()
+MATRIX_CACHE_MAX_BYTES = int(os.getenv("MATRIX_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Temporary files left behind by a crashed writer
+STALE_TEMP_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def _dense(archivo: ArchivoEntrada) -> "np.ndarray":
+    # Deferred: network_layout imports this module
+    from app.services.network_layout import dense_matrix
+
+    load_payloads(object_session(archivo), [archivo])
+    return dense_matrix(archivo.matriz_pesos)
+
+
+def _path(archivo: ArchivoEntrada) -> Path:
+    formato = archivo.formato_pesos.value if archivo.formato_pesos is not None else "json"
+    return MATRIX_CACHE_DIR / f"{content_hash(archivo)}-{formato}.npy"
+
+
+def _open(path: Path) -> Optional["np.ndarray"]:
+    import numpy as np
+
+    try:
+        matrix = np.load(path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    except (ValueError, OSError):
+        # Truncated or foreign file, rebuilt by the caller
+        path.unlink(missing_ok=True)
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return matrix
+
+
+def _write(path: Path, matrix: "np.ndarray"):
+    import numpy as np
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=path.stem, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            np.save(temp_file, matrix)
+        os.replace(temp_name, path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+
+
+def _evict(keep: Path):
+    """Delete least recently used matrices until the directory fits MATRIX_CACHE_MAX_BYTES"""
+    entries, total = [], 0
+    now = time.time()
+    with os.scandir(MATRIX_CACHE_DIR) as scan:
+        for entry in scan:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".tmp"):
+                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                    Path(entry.path).unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    if total <= MATRIX_CACHE_MAX_BYTES:
+        return
+    entries.sort()
+    for _, size, entry_path in entries:
+        if total <= MATRIX_CACHE_MAX_BYTES:
+            break
+        if entry_path == str(keep):
+            continue
+        Path(entry_path).unlink(missing_ok=True)
+        total -= size
+        MATRIX_CACHE_EVICTIONS.inc()
+
+
+def weight_matrix(archivo: ArchivoEntrada) -> "np.ndarray":
+    """
+    Dense float32 weight matrix of archivo, short rows padded with zeros.
+    Read-only, memory-mapped from the cache when enabled.
+    """
+    if not MATRIX_CACHE_ENABLED:
+        return _dense(archivo)
+
+    path = _path(archivo)
+    matrix = _open(path)
+    if matrix is not None:
+        MATRIX_CACHE_LOOKUPS.labels(result="hit").inc()
+        return matrix
+
+    MATRIX_CACHE_LOOKUPS.labels(result="miss").inc()
+    dense = _dense(archivo)
+    try:
+        _write(path, dense)
+        _evict(keep=path)
+    except OSError as e:
+        logger.warning(f" Could not cache weight matrix {path.name}: {str(e)}")
+        return dense
+    # Mapped like a hit, so this worker shares the pages too
+    mapped = _open(path)
+    return mapped if mapped is not None else dense
+
+
+def invalidate_matrices(hashes: Iterable[Optional[str]]):
+    """Remove the cached matrices of these content hashes (deleted input files)"""
+    if not MATRIX_CACHE_ENABLED or not MATRIX_CACHE_DIR.exists():
+        return
+    for hash_contenido in set(hashes):
+        if hash_contenido is None:
+            continue
+        for path in MATRIX_CACHE_DIR.glob(f"{hash_contenido}-*.npy"):
+            path.unlink(missing_ok=True)
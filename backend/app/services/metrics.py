@@ -0,0 +1,185 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from starlette.routing import Match
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# METRICS_ENABLED: records request metrics and serves /metrics.
+# PROMETHEUS_MULTIPROC_DIR: when set (one directory shared by all uvicorn
+# workers), every worker writes its samples there and /metrics aggregates them.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# HTTP
+REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "HTTP requests processed",
+    ["method", "route", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route"],
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "HTTP response body size",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+
+# Application
+UPLOAD_BYTES = Histogram(
+    "archivo_entrada_upload_bytes",
+    "Size of uploaded neural network files",
+    buckets=SIZE_BUCKETS,
+)
+PARSE_DURATION = Histogram(
+    "neural_network_parse_duration_seconds",
+    "Time spent in NeuralNetworkParser.parse",
+)
+EXPORT_GENERATION_DURATION = Histogram(
+    "export_generation_duration_seconds",
+    "Time spent generating and writing an export file",
+    ["formato"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+EXPORT_GC_RECLAIMED_BYTES = Counter(
+    "export_gc_reclaimed_bytes",
+    "Disk space freed by the export sweeper",
+    ["reason"],
+)
+EXPORT_GC_DELETED = Counter(
+    "export_gc_deleted_exports",
+    "Exports deleted by the export sweeper",
+    ["reason"],
+)
+MAIL_MESSAGES = Counter(
+    "mail_messages",
+    "Outgoing mail by outcome (sent, retried, failed, dropped)",
+    ["result"],
+)
+MAIL_DELIVERY_DURATION = Histogram(
+    "mail_delivery_duration_seconds",
+    "Time from queueing a message to its delivery",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+MAIL_QUEUE_DEPTH = Gauge(
+    "mail_queue_depth",
+    "Messages waiting in the mail outbox",
+    multiprocess_mode="livesum",
+)
+MATRIX_CACHE_LOOKUPS = Counter(
+    "matrix_cache_lookups",
+    "Weight matrix cache lookups (hit, miss)",
+    ["result"],
+)
+MATRIX_CACHE_EVICTIONS = Counter(
+    "matrix_cache_evictions",
+    "Weight matrices evicted from the on-disk cache",
+)
+
+# Worker startup (slowest live worker)
+STARTUP_DURATION = Gauge(
+    "app_startup_duration_seconds",
+    "Time spent importing the application and running the lifespan startup",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+# Database pool (summed over live workers)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connections in the SQLAlchemy pool",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+
+def route_template(scope) -> str:
+    """Path template of the route that handles the request, e.g. /api/projects/{proyecto_id}"""
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    if router is not None:
+        for route in router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope.get("path", ""))
+    # Avoid one time series per unknown URL
+    return "unmatched"
+
+
+def update_db_pool_metrics(engine):
+    """Copy the current pool counters into the gauges"""
+    pool = engine.pool
+    for state, method in (("checked_out", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+        counter = getattr(pool, method, None)
+        if counter is not None:
+            DB_POOL_CONNECTIONS.labels(state=state).set(max(counter(), 0))
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Metrics in Prometheus text format, aggregated over workers if needed"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead():
+    """Drop the live gauges of this worker on shutdown"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording count, latency and response size per route template"""
+
+    def __init__(self, app, engine=None):
+        self.app = app
+        self.engine = engine
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            method = scope["method"]
+            REQUESTS_TOTAL.labels(method=method, route=route, status=str(status_code)).inc()
+            REQUEST_DURATION.labels(method=method, route=route).observe(time.perf_counter() - start)
+            RESPONSE_SIZE.labels(method=method, route=route).observe(response_size)
+            if self.engine is not None:
+                update_db_pool_metrics(self.engine)
@@ -0,0 +1,183 @@
+"""
+Geometry shared by the server-side exporters: which networks a
+visualization shows, where every neuron sits and the color of every
+connection. Coordinates are normalized to [0, 1] so each renderer can
+scale them to its own canvas.
+"""
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy.orm import object_session
+
+from app.models.archivo_entrada import ArchivoEntrada
+from app.models.visualizacion import Visualizacion
+from app.services.cold_storage import load_payloads
+from app.services.matrix_cache import weight_matrix
+
+
+@dataclass
+class NetworkGeometry:
+    capas: List[int]
+    # Normalized neuron centers, shape (num_neuronas,)
+    x: np.ndarray
+    y: np.ndarray
+    # Connections with a non-zero weight (or difference)
+    src: np.ndarray
+    dst: np.ndarray
+    values: np.ndarray
+    # RGBA in [0, 1], shape (num_edges, 4)
+    colors: np.ndarray
+    # "weights" for a single network, "difference" when comparing two files
+    mode: str
+    archivos: List[ArchivoEntrada] = field(default_factory=list)
+    # Full weight matrix of each file (read-only, possibly memory-mapped)
+    matrices: List[np.ndarray] = field(default_factory=list)
+
+    @property
+    def num_neuronas(self) -> int:
+        return int(sum(self.capas))
+
+    @property
+    def num_edges(self) -> int:
+        return int(self.src.size)
+
+    def colors_for(self, values: np.ndarray) -> np.ndarray:
+        """RGBA of arbitrary values on the same scale as self.values"""
+        if self.mode == "difference":
+            return difference_colors(values, float(self.values.max()) if self.values.size else 0.0)
+        return weight_colors(values)
+
+    def layer_of_neurons(self) -> np.ndarray:
+        """Layer index of every neuron"""
+        return np.repeat(np.arange(len(self.capas)), self.capas)
+
+
+def visualization_files(visualizacion: Visualizacion, with_payload: bool = True) -> List[ArchivoEntrada]:
+    """
+    Input files shown by a visualization: the selected network and, when
+    comparing, the selected adversarial file. Falls back to the first file
+    of the project when nothing was selected. with_payload makes sure the
+    weights are loaded (files of archived projects may be in cold storage).
+    """
+    layout_config = visualizacion.layout_config or {}
+    archivos = {archivo.id: archivo for archivo in visualizacion.proyecto.archivos_entrada}
+
+    selected = []
+    for key in ("selectedNetwork", "selectedAdversarial"):
+        archivo = archivos.get(layout_config.get(key))
+        if archivo is not None:
+            selected.append(archivo)
+
+    if not selected and archivos:
+        selected.append(archivos[min(archivos)])
+    if with_payload:
+        load_payloads(object_session(visualizacion), selected)
+    return selected
+
+
+def dense_matrix(matriz_pesos: List[List[float]], size: Optional[int] = None) -> np.ndarray:
+    """Weight matrix as a float32 array, short rows padded with zeros"""
+    rows = len(matriz_pesos)
+    cols = max((len(row) for row in matriz_pesos), default=0)
+    if size is not None:
+        rows, cols = max(rows, size), max(cols, size)
+    matrix = np.zeros((rows, cols), dtype=np.float32)
+    for i, row in enumerate(matriz_pesos):
+        if row:
+            matrix[i, :len(row)] = row
+    return matrix
+
+
+def _square(matrix: np.ndarray, size: int) -> np.ndarray:
+    """size x size corner of matrix, a view unless it has to be padded with zeros"""
+    if matrix.shape[0] >= size and matrix.shape[1] >= size:
+        return matrix[:size, :size]
+    padded = np.zeros((size, size), dtype=np.float32)
+    rows, cols = min(matrix.shape[0], size), min(matrix.shape[1], size)
+    padded[:rows, :cols] = matrix[:rows, :cols]
+    return padded
+
+
+def neuron_positions(capas: List[int]) -> tuple[np.ndarray, np.ndarray]:
+    """Layers as columns, neurons evenly spaced and centered in each column"""
+    num_capas = len(capas)
+    max_neurons = max(capas)
+    layer_index = np.repeat(np.arange(num_capas), capas)
+    index_in_layer = np.concatenate([np.arange(size) for size in capas])
+    sizes = np.repeat(np.asarray(capas), capas)
+
+    x = (layer_index + 0.5) / num_capas
+    y = (index_in_layer + 0.5 + (max_neurons - sizes) / 2) / max_neurons
+    return x.astype(np.float32), y.astype(np.float32)
+
+
+def hsl_to_rgb(h: np.ndarray, s: np.ndarray, l: np.ndarray) -> np.ndarray:
+    """Vectorized HSL to RGB, all components in [0, 1]"""
+    h, s, l = np.broadcast_arrays(h, s, l)
+    c = (1 - np.abs(2 * l - 1)) * s
+    hp = (h % 1.0) * 6
+    x = c * (1 - np.abs(hp % 2 - 1))
+    zeros = np.zeros_like(c)
+    sector = np.floor(hp).astype(int) % 6
+    r = np.choose(sector, [c, x, zeros, zeros, x, c])
+    g = np.choose(sector, [x, c, c, x, zeros, zeros])
+    b = np.choose(sector, [zeros, zeros, x, c, c, x])
+    m = l - c / 2
+    return np.stack([r + m, g + m, b + m], axis=-1)
+
+
+def weight_colors(weights: np.ndarray) -> np.ndarray:
+    """Same palette as the frontend: green for positive, red for negative weights"""
+    clamped = np.clip(np.abs(weights), 0, 1)
+    positive = weights >= 0
+    hue = np.where(positive, 0.3 + clamped * 0.2, 0.0)
+    lightness = np.where(positive, 0.5, 0.3 + clamped * 0.2)
+    rgb = hsl_to_rgb(hue, np.ones_like(hue), lightness)
+    alpha = 0.5 + clamped * 0.3
+    return np.concatenate([rgb, alpha[:, None]], axis=1).astype(np.float32)
+
+
+def difference_colors(differences: np.ndarray, max_difference: Optional[float] = None) -> np.ndarray:
+    """Green for similar weights, red for the largest difference"""
+    if max_difference is None:
+        max_difference = float(differences.max()) if differences.size else 0.0
+    normalized = differences / max_difference if max_difference > 0 else np.zeros_like(differences)
+    rgb = hsl_to_rgb((1 - normalized) * 0.33, np.ones_like(normalized), np.full_like(normalized, 0.5))
+    alpha = 0.5 + normalized * 0.3
+    return np.concatenate([rgb, alpha[:, None]], axis=1).astype(np.float32)
+
+
+def build_geometry(archivos: List[ArchivoEntrada]) -> NetworkGeometry:
+    """Geometry of one network, or of the difference between the first two"""
+    if not archivos:
+        raise ValueError("The visualization has no input files to render")
+
+    base = archivos[0]
+    capas = list(base.capas)
+    size = int(sum(capas))
+    matrices = [weight_matrix(archivo) for archivo in archivos[:2]]
+    matrix = _square(matrices[0], size)
+    mode = "weights"
+
+    if len(archivos) > 1:
+        other = _square(matrices[1], size)
+        values_matrix = np.abs(matrix - other)
+        # Connections present in either network
+        mask = (matrix != 0) | (other != 0)
+        mode = "difference"
+    else:
+        values_matrix = matrix
+        mask = matrix != 0
+
+    src, dst = np.nonzero(mask)
+    values = values_matrix[src, dst]
+    colors = difference_colors(values) if mode == "difference" else weight_colors(values)
+    x, y = neuron_positions(capas)
+
+    return NetworkGeometry(
+        capas=capas, x=x, y=y,
+        src=src.astype(np.int32), dst=dst.astype(np.int32),
+        values=values.astype(np.float32), colors=colors,
+        mode=mode, archivos=list(archivos[:2]), matrices=matrices,
+    )
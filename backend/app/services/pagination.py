@@ -0,0 +1,75 @@
+"""
+Keyset (cursor) pagination.
+
+Listings are ordered by (timestamp, id) descending and a page continues
+strictly after the last row of the previous one, so the database walks
+the composite index from that point instead of skipping OFFSET rows, and
+rows inserted meanwhile never shift a page. The cursor is the opaque,
+URL-safe encoding of that last (timestamp, id) pair.
+
+Paging is opt-in: a request without limit or cursor gets every row, as
+the listings returned before they were paginated.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import String, literal, tuple_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor"""
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    payload = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def keyset_page(query: Query, timestamp_column, id_column, cursor: Optional[str], limit: Optional[int]) -> Tuple[List, Optional[str]]:
+    """
+    One page of query, newest first, and the cursor of the next page
+    (None on the last page). Without limit and cursor every row is
+    returned. Raises InvalidCursor.
+    """
+    if limit is None:
+        if not cursor:
+            return query.order_by(timestamp_column.desc(), id_column.desc()).all(), None
+        limit = DEFAULT_PAGE_SIZE
+
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        bound = timestamp
+        if query.session.get_bind().dialect.name == "sqlite":
+            # SQLite compares the stored text; func.now() stores whole
+            # seconds while a bound datetime always gets microseconds
+            bound = literal(timestamp.strftime("%Y-%m-%d %H:%M:%S.%f").removesuffix(".000000"), String)
+        # Row value comparison, matched by the (..., timestamp, id) index
+        query = query.filter(tuple_(timestamp_column, id_column) < tuple_(bound, row_id))
+
+    # One extra row tells whether there is a next page
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+
+
+def total_count(query: Query) -> int:
+    """Rows matching the filters, without loading them"""
+    return query.order_by(None).count()
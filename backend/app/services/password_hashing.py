@@ -0,0 +1,101 @@
+"""
+Password hashing off the event loop.
+
+bcrypt takes hundreds of milliseconds per hash and releases the GIL, so
+hashes run in a dedicated thread pool of PASSWORD_HASH_WORKERS threads
+instead of inside the async handlers. At most PASSWORD_HASH_MAX_PENDING
+hashes are handed to the pool at a time; other requests wait for a slot
+up to PASSWORD_HASH_WAIT_SECONDS, after which PasswordHashingBusy is
+raised so a login storm is shed (503) instead of piling up unbounded.
+
+BCRYPT_ROUNDS sets the cost of new hashes. needs_rehash tells whether a
+stored hash uses another cost, so the login can transparently rehash
+the password while it has the plain text.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 2)))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "10"))
+
+# bcrypt only uses the first 72 bytes of the password
+BCRYPT_MAX_BYTES = 72
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password hashes pending"""
+
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+
+def hash_password_sync(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(_password_bytes(plain_password), hashed_password.encode("utf-8"))
+
+
+def hash_rounds(hashed_password: str) -> int | None:
+    """Cost factor of a bcrypt hash ($2b$12$...)"""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+class PasswordHasher:
+    """Bounded executor for bcrypt calls"""
+
+    def __init__(self, workers: int, max_pending: int, wait_seconds: float):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._max_pending = max_pending
+        self._wait_seconds = wait_seconds
+        # asyncio primitives belong to one event loop, created on first use
+        self._loop = None
+        self._slots = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self._max_pending)
+        return self._slots
+
+    async def _run(self, function, *args):
+        slots = self._semaphore()
+        try:
+            await asyncio.wait_for(slots.acquire(), self._wait_seconds)
+        except asyncio.TimeoutError:
+            raise PasswordHashingBusy()
+        try:
+            return await self._loop.run_in_executor(self._executor, function, *args)
+        finally:
+            slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password_sync, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password_sync, plain_password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WAIT_SECONDS)
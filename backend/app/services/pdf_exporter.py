@@ -0,0 +1,324 @@
+"""
+PDF exporter for visualizations.
+
+The document is written straight to disk object by object: every page
+content stream is deflated chunk by chunk as it is generated and only the
+byte offsets needed for the cross-reference table are kept in memory.
+Networks too large for one page are split into a grid of diagram tiles,
+one page each, and each tile only draws the connections crossing it.
+
+Contents: diagram tile(s), per-layer statistics and, when the
+visualization compares two files, a difference summary.
+"""
+import os
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterable, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.models.visualizacion import Visualizacion
+from app.services.network_layout import NetworkGeometry
+
+# Load environment variables
+load_dotenv()
+
+# Diagram scale: below PDF_MIN_NEURON_SPACING points between neurons the
+# diagram no longer fits on one page and is tiled
+PDF_MIN_NEURON_SPACING = float(os.getenv("PDF_MIN_NEURON_SPACING", "6"))
+PDF_LAYER_SPACING = float(os.getenv("PDF_LAYER_SPACING", "160"))
+
+PAGE_WIDTH, PAGE_HEIGHT = 842.0, 595.0  # A4 landscape, points
+MARGIN = 36.0
+HEADER_HEIGHT = 40.0
+# Edges formatted and deflated per chunk
+EDGES_PER_CHUNK = 5000
+# Alpha levels available as ExtGState resources
+ALPHA_LEVELS = 8
+TOP_DIFFERENCES = 20
+# Stroke color and line of one connection
+EDGE_OPERATORS = "%.3f %.3f %.3f RG %.2f %.2f m %.2f %.2f l S\n"
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("latin-1", errors="replace") + b")"
+
+
+class StreamingPdfWriter:
+    """
+    Minimal PDF 1.4 writer that appends objects to a binary file.
+
+    Object 1 is the catalog and object 2 the page tree, both written by
+    close() once all page ids are known.
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+    FONT_ID = 3
+    BOLD_FONT_ID = 4
+
+    def __init__(self, fileobj: BinaryIO):
+        self._file = fileobj
+        self._offsets: dict[int, int] = {}
+        self._next_id = 5
+        self._page_ids: List[int] = []
+        self._position = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        self._write_object(self.FONT_ID, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                         b"/Encoding /WinAnsiEncoding >>")
+        self._write_object(self.BOLD_FONT_ID, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold "
+                                              b"/Encoding /WinAnsiEncoding >>")
+        self._alpha_ids = []
+        for level in range(ALPHA_LEVELS):
+            alpha = (level + 1) / ALPHA_LEVELS
+            object_id = self._new_id()
+            self._write_object(object_id, f"<< /Type /ExtGState /CA {alpha:.3f} /ca {alpha:.3f} >>".encode())
+            self._alpha_ids.append(object_id)
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._position += len(data)
+
+    def _new_id(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write_object(self, object_id: int, body: bytes):
+        self._offsets[object_id] = self._position
+        self._write(f"{object_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def add_page(self, content: Iterable[bytes]):
+        """
+        Append a page whose content stream is produced by an iterable of
+        operator chunks; the chunks are deflated and written as they come.
+        """
+        content_id = self._new_id()
+        length_id = self._new_id()
+        page_id = self._new_id()
+
+        self._offsets[content_id] = self._position
+        self._write(f"{content_id} 0 obj\n<< /Length {length_id} 0 R /Filter /FlateDecode >>\nstream\n".encode())
+        compressor = zlib.compressobj(6)
+        length = 0
+        for chunk in content:
+            data = compressor.compress(chunk)
+            length += len(data)
+            self._write(data)
+        data = compressor.flush()
+        length += len(data)
+        self._write(data)
+        self._write(b"\nendstream\nendobj\n")
+        self._write_object(length_id, str(length).encode())
+
+        alpha_resources = " ".join(f"/GA{level} {object_id} 0 R" for level, object_id in enumerate(self._alpha_ids))
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES_ID} 0 R /MediaBox [0 0 {PAGE_WIDTH:.0f} {PAGE_HEIGHT:.0f}] "
+            f"/Contents {content_id} 0 R /Resources << /Font << /F1 {self.FONT_ID} 0 R "
+            f"/F2 {self.BOLD_FONT_ID} 0 R >> /ExtGState << {alpha_resources} >> >> >>"
+        ).encode())
+        self._page_ids.append(page_id)
+
+    def close(self, title: str = ""):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode())
+        self._write_object(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode())
+        info_id = self._new_id()
+        self._write_object(info_id, b"<< /Title " + _pdf_string(title) + b" /Producer (Neural Viz) >>")
+
+        xref_offset = self._position
+        self._write(f"xref\n0 {self._next_id}\n".encode())
+        self._write(b"0000000000 65535 f \n")
+        for object_id in range(1, self._next_id):
+            self._write(f"{self._offsets[object_id]:010d} 00000 n \n".encode())
+        self._write(
+            f"trailer\n<< /Size {self._next_id} /Root {self.CATALOG_ID} 0 R /Info {info_id} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode()
+        )
+
+
+def _text(x: float, y: float, text: str, size: float = 10, bold: bool = False) -> bytes:
+    font = "/F2" if bold else "/F1"
+    return f"BT {font} {size:g} Tf {x:.2f} {y:.2f} Td ".encode() + _pdf_string(text) + b" Tj ET\n"
+
+
+def _header(title: str, subtitle: str) -> bytes:
+    top = PAGE_HEIGHT - MARGIN
+    return (b"0.2 0.2 0.2 rg\n" + _text(MARGIN, top - 14, title, 14, bold=True)
+            + b"0.4 0.4 0.4 rg\n" + _text(MARGIN, top - 30, subtitle, 9))
+
+
+def _diagram_tiles(geometry: NetworkGeometry):
+    """
+    Diagram size in points and the grid of page tiles covering it.
+
+    Returns:
+        (diagram_width, diagram_height, rows, columns)
+    """
+    usable_width = PAGE_WIDTH - 2 * MARGIN
+    usable_height = PAGE_HEIGHT - 2 * MARGIN - HEADER_HEIGHT
+    max_neurons = max(geometry.capas)
+
+    diagram_width = max(len(geometry.capas) * PDF_LAYER_SPACING, usable_width)
+    diagram_height = max_neurons * PDF_MIN_NEURON_SPACING
+    if diagram_width <= usable_width and diagram_height <= usable_height:
+        return usable_width, usable_height, 1, 1
+
+    diagram_height = max(diagram_height, usable_height)
+    rows = int(np.ceil(diagram_height / usable_height))
+    columns = int(np.ceil(diagram_width / usable_width))
+    return columns * usable_width, rows * usable_height, rows, columns
+
+
+def _diagram_page(geometry: NetworkGeometry, px, py, tile_x: float, tile_y: float,
+                  tile_width: float, tile_height: float, title: str, subtitle: str):
+    """Content stream chunks of one diagram tile"""
+    yield _header(title, subtitle)
+
+    origin_x, origin_y = MARGIN, MARGIN
+    # Diagram coordinates have y growing downwards, PDF upwards
+    yield (f"q {origin_x:.2f} {origin_y:.2f} {tile_width:.2f} {tile_height:.2f} re W n\n"
+           f"1 0 0 -1 {origin_x - tile_x:.2f} {origin_y + tile_height + tile_y:.2f} cm\n"
+           f"0.5 w 1 J\n").encode()
+
+    x0, y0 = px[geometry.src], py[geometry.src]
+    x1, y1 = px[geometry.dst], py[geometry.dst]
+    visible = np.flatnonzero(
+        (np.maximum(x0, x1) >= tile_x) & (np.minimum(x0, x1) <= tile_x + tile_width)
+        & (np.maximum(y0, y1) >= tile_y) & (np.minimum(y0, y1) <= tile_y + tile_height)
+    )
+
+    alpha_level = np.clip(np.ceil(geometry.colors[visible, 3] * ALPHA_LEVELS).astype(int) - 1, 0, ALPHA_LEVELS - 1)
+    # Group by alpha so the graphics state changes once per level
+    order = np.argsort(alpha_level, kind="stable")
+    visible, alpha_level = visible[order], alpha_level[order]
+    level_bounds = np.searchsorted(alpha_level, np.arange(ALPHA_LEVELS + 1))
+
+    for level in range(ALPHA_LEVELS):
+        edges = visible[level_bounds[level]:level_bounds[level + 1]]
+        if edges.size:
+            yield f"/GA{level} gs\n".encode()
+        for start in range(0, edges.size, EDGES_PER_CHUNK):
+            chunk = edges[start:start + EDGES_PER_CHUNK]
+            rows = np.column_stack([geometry.colors[chunk, :3], x0[chunk], y0[chunk], x1[chunk], y1[chunk]])
+            yield "".join(EDGE_OPERATORS % tuple(row) for row in rows.tolist()).encode()
+
+    # Neurons on top of the connections
+    yield f"/GA{ALPHA_LEVELS - 1} gs 0.2 0.2 0.2 rg\n".encode()
+    radius = min(3.0, PDF_MIN_NEURON_SPACING / 2)
+    in_tile = np.flatnonzero((px >= tile_x - radius) & (px <= tile_x + tile_width + radius)
+                             & (py >= tile_y - radius) & (py <= tile_y + tile_height + radius))
+    for start in range(0, in_tile.size, EDGES_PER_CHUNK):
+        chunk = in_tile[start:start + EDGES_PER_CHUNK]
+        corners = np.column_stack([px[chunk] - radius, py[chunk] - radius])
+        yield "".join(f"{x:.2f} {y:.2f} {2 * radius:.2f} {2 * radius:.2f} re f\n"
+                      for x, y in corners.tolist()).encode()
+    yield b"Q\n"
+
+
+def _layer_statistics(geometry: NetworkGeometry) -> List[List[str]]:
+    """Per layer and file: neurons, outgoing connections, mean |w|, min and max weight"""
+    rows = []
+    boundaries = np.cumsum([0] + list(geometry.capas))
+    for archivo, matrix in zip(geometry.archivos, geometry.matrices):
+        for layer, size in enumerate(geometry.capas):
+            # One layer of rows at a time, paged in from the cached matrix
+            block = matrix[boundaries[layer]:boundaries[layer + 1]]
+            weights = block[block != 0].astype(np.float64)
+            count = int(weights.size)
+            rows.append([
+                archivo.nombre_archivo, f"L{layer}", str(size), str(count),
+                f"{float(np.abs(weights).sum()) / count:.4f}" if count else "-",
+                f"{float(weights.min()):.4f}" if count else "-",
+                f"{float(weights.max()):.4f}" if count else "-",
+            ])
+    return rows
+
+
+def _table_pages(title: str, header: List[str], rows: List[List[str]], column_widths: List[float]):
+    """Split a table over as many pages as needed, yields one content generator per page"""
+    line_height = 14.0
+    per_page = int((PAGE_HEIGHT - 2 * MARGIN - HEADER_HEIGHT - line_height) // line_height)
+    pages = max(1, int(np.ceil(len(rows) / per_page)))
+    for page in range(pages):
+        page_rows = rows[page * per_page:(page + 1) * per_page]
+
+        def content(page=page, page_rows=page_rows):
+            yield _header(title, f"Page {page + 1} of {pages}")
+            y = PAGE_HEIGHT - MARGIN - HEADER_HEIGHT - line_height
+            x = MARGIN
+            for text, width in zip(header, column_widths):
+                yield _text(x, y, text, 9, bold=True)
+                x += width
+            for row in page_rows:
+                y -= line_height
+                x = MARGIN
+                yield b"0.2 0.2 0.2 rg\n"
+                for text, width in zip(row, column_widths):
+                    yield _text(x, y, text[:40], 9)
+                    x += width
+
+        yield content()
+
+
+def _difference_summary(geometry: NetworkGeometry) -> List[List[str]]:
+    values = geometry.values.astype(np.float64)
+    changed = int(np.count_nonzero(values > 1e-9))
+    rows = [
+        ["Compared files", " vs ".join(archivo.nombre_archivo for archivo in geometry.archivos)],
+        ["Connections compared", str(values.size)],
+        ["Connections changed", str(changed)],
+        ["Total difference", f"{values.sum():.6f}"],
+        ["Average difference", f"{values.mean():.6f}" if values.size else "-"],
+        ["Max difference", f"{values.max():.6f}" if values.size else "-"],
+        ["", ""],
+        [f"Top {TOP_DIFFERENCES} connections", "|difference|"],
+    ]
+    top = np.argsort(values)[::-1][:TOP_DIFFERENCES]
+    for edge in top:
+        rows.append([f"{geometry.src[edge]} -> {geometry.dst[edge]}", f"{values[edge]:.6f}"])
+    return rows
+
+
+def write_pdf(geometry: NetworkGeometry, visualizacion: Visualizacion, filepath: Path):
+    """Write the PDF export of a visualization to filepath"""
+    names = " vs ".join(archivo.nombre_archivo for archivo in geometry.archivos)
+    title = f"Neural Network Visualization {visualizacion.id}"
+    created = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+    diagram_width, diagram_height, rows, columns = _diagram_tiles(geometry)
+    tile_width = diagram_width / columns
+    tile_height = diagram_height / rows
+    # Neuron centers in diagram points
+    px = (geometry.x * diagram_width).astype(np.float64)
+    py = (geometry.y * diagram_height).astype(np.float64)
+
+    with open(filepath, "wb") as f:
+        writer = StreamingPdfWriter(f)
+
+        for row in range(rows):
+            for column in range(columns):
+                tile = f", tile {row * columns + column + 1} of {rows * columns}" if rows * columns > 1 else ""
+                subtitle = (f"{names} - {geometry.num_neuronas} neurons, {geometry.num_edges} connections"
+                            f"{' (weight difference)' if geometry.mode == 'difference' else ''}{tile} - {created}")
+                writer.add_page(_diagram_page(geometry, px, py, column * tile_width, row * tile_height,
+                                              tile_width, tile_height, title, subtitle))
+
+        for content in _table_pages(
+            "Per-layer statistics",
+            ["File", "Layer", "Neurons", "Connections", "Mean |w|", "Min w", "Max w"],
+            _layer_statistics(geometry),
+            [220, 60, 70, 90, 90, 90, 90],
+        ):
+            writer.add_page(content)
+
+        if geometry.mode == "difference":
+            for content in _table_pages("Difference summary", ["Metric", "Value"],
+                                        _difference_summary(geometry), [300, 300]):
+                writer.add_page(content)
+
+        writer.close(title)
@@ -0,0 +1,188 @@
+"""
+Raster renderer for PNG exports.
+
+Edges are rasterized in vectorized batches: every line is sampled at one
+point per pixel step and the samples of all lines are accumulated per
+pixel with np.bincount. Overlapping edges are composited order-independently:
+coverage is 1 - prod(1 - alpha) and the pixel takes the palette color of
+the alpha-weighted mean value. Large canvases are split into vertical
+strips rendered in parallel.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+from dotenv import load_dotenv
+
+from app.services.network_layout import NetworkGeometry
+
+# Load environment variables
+load_dotenv()
+
+PNG_MAX_DIMENSION = int(os.getenv("PNG_MAX_DIMENSION", "8192"))
+# Canvases with more pixels than this are rendered in parallel strips
+PNG_TILE_THRESHOLD_PIXELS = int(os.getenv("PNG_TILE_THRESHOLD_PIXELS", str(4096 * 4096)))
+PNG_RENDER_THREADS = int(os.getenv("PNG_RENDER_THREADS", str(os.cpu_count() or 1)))
+# zlib level of the PNG encoder; 1 is several times faster than the default
+# and costs little size on diagrams with large flat areas
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "1"))
+
+BACKGROUND = np.array([245, 245, 245], dtype=np.float32) / 255
+NEURON_COLOR = (51, 51, 51)
+# Vertical distance between neurons, reduced for tall layers so that the
+# canvas stays around TARGET_HEIGHT pixels
+NEURON_SPACING = 24
+MIN_NEURON_SPACING = 4
+TARGET_HEIGHT = 1600
+LAYER_SPACING = 240
+MARGIN = 60
+PALETTE_SIZE = 256
+# Upper bound of line samples held in memory at once
+SAMPLES_PER_BATCH = 4_000_000
+
+
+def canvas_size(geometry: NetworkGeometry) -> tuple[int, int]:
+    width = len(geometry.capas) * LAYER_SPACING + 2 * MARGIN
+    max_neurons = max(geometry.capas)
+    spacing = max(MIN_NEURON_SPACING, min(NEURON_SPACING, TARGET_HEIGHT // max_neurons))
+    height = max_neurons * spacing + 2 * MARGIN
+    return min(max(width, 800), PNG_MAX_DIMENSION), min(max(height, 600), PNG_MAX_DIMENSION)
+
+
+def pixel_positions(geometry: NetworkGeometry, width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+    px = MARGIN + geometry.x * (width - 2 * MARGIN)
+    py = MARGIN + geometry.y * (height - 2 * MARGIN)
+    return px.astype(np.float32), py.astype(np.float32)
+
+
+def _rasterize_edges(x0, y0, x1, y1, values, geometry: NetworkGeometry,
+                     x_start: int, x_end: int, height: int) -> np.ndarray:
+    """
+    Composite the edges into the strip [x_start, x_end) of the canvas.
+
+    Returns:
+        RGB float array of shape (height, x_end - x_start)
+    """
+    strip_width = x_end - x_start
+    num_pixels = strip_width * height
+
+    # Per-edge terms, repeated per sample below (np.repeat is much cheaper
+    # than gathering by edge index): alpha * value, alpha, log(1 - alpha)
+    if geometry.mode == "weights":
+        # The palette saturates at |w| = 1
+        values = np.clip(values, -1, 1)
+    alpha = geometry.colors_for(values)[:, 3].astype(np.float64)
+    edge_terms = (alpha * values, alpha, np.log1p(-np.minimum(alpha, 0.999)))
+    accumulators = [np.zeros(num_pixels, dtype=np.float64) for _ in edge_terms]
+
+    steps = np.maximum(np.abs(x1 - x0), np.abs(y1 - y0)).astype(np.int64) + 1
+    # Split the edges into batches of about SAMPLES_PER_BATCH samples
+    batch_index = (np.cumsum(steps) - 1) // SAMPLES_PER_BATCH
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(batch_index)) + 1, [steps.size]])
+
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        n = steps[first:last]
+        if n.size == 0:
+            continue
+        # Sample k of an edge lies at start + k * (end - start) / (n - 1)
+        offsets = np.arange(int(n.sum()), dtype=np.float32)
+        offsets -= np.repeat((np.cumsum(n) - n).astype(np.float32), n)
+        denominator = np.maximum(n - 1, 1).astype(np.float32)
+        x_step = ((x1[first:last] - x0[first:last]) / denominator).astype(np.float32)
+        y_step = ((y1[first:last] - y0[first:last]) / denominator).astype(np.float32)
+        xs = np.rint(np.repeat(x0[first:last] - x_start, n) + np.repeat(x_step, n) * offsets).astype(np.int64)
+        ys = np.rint(np.repeat(y0[first:last], n) + np.repeat(y_step, n) * offsets).astype(np.int64)
+
+        flat = ys * strip_width + xs
+        inside = (xs >= 0) & (xs < strip_width) & (ys >= 0) & (ys < height)
+        clipped = not inside.all()
+        if clipped:
+            flat = flat[inside]
+        for accumulator, term in zip(accumulators, edge_terms):
+            weights = np.repeat(term[first:last], n)
+            accumulator += np.bincount(flat, weights[inside] if clipped else weights, minlength=num_pixels)
+
+    weighted_values, alpha_sum, transmittance_log = accumulators
+    coverage = 1 - np.exp(transmittance_log)
+    rgb = np.broadcast_to(BACKGROUND.astype(np.float64), (num_pixels, 3)).copy()
+    covered = np.flatnonzero(alpha_sum > 0)
+    if covered.size:
+        mean_values = weighted_values[covered] / alpha_sum[covered]
+        # Palette lookup table instead of evaluating HSL per pixel
+        if geometry.mode == "weights":
+            low, high = -1.0, 1.0
+        else:
+            low, high = 0.0, max(float(values.max()) if values.size else 0.0, 1e-12)
+        palette = geometry.colors_for(np.linspace(low, high, PALETTE_SIZE))[:, :3]
+        index = np.rint((mean_values - low) / (high - low) * (PALETTE_SIZE - 1)).astype(np.intp)
+        edge_rgb = palette[np.clip(index, 0, PALETTE_SIZE - 1)]
+        pixel_coverage = coverage[covered, None]
+        rgb[covered] = rgb[covered] * (1 - pixel_coverage) + edge_rgb * pixel_coverage
+    return rgb.reshape(height, strip_width, 3)
+
+
+def render_network_image(geometry: NetworkGeometry) -> Image.Image:
+    """Render the network diagram as an RGB Pillow image"""
+    width, height = canvas_size(geometry)
+    px, py = pixel_positions(geometry, width, height)
+
+    x0, y0 = px[geometry.src], py[geometry.src]
+    x1, y1 = px[geometry.dst], py[geometry.dst]
+
+    if width * height > PNG_TILE_THRESHOLD_PIXELS and PNG_RENDER_THREADS > 1:
+        strip_width = -(-width // PNG_RENDER_THREADS)
+        strips = [(start, min(start + strip_width, width)) for start in range(0, width, strip_width)]
+
+        def render_strip(bounds):
+            start, end = bounds
+            # Only the edges whose horizontal extent touches the strip
+            touches = (np.maximum(x0, x1) >= start - 1) & (np.minimum(x0, x1) < end + 1)
+            return _rasterize_edges(x0[touches], y0[touches], x1[touches], y1[touches],
+                                    geometry.values[touches], geometry, start, end, height)
+
+        with ThreadPoolExecutor(max_workers=PNG_RENDER_THREADS) as executor:
+            rgb = np.concatenate(list(executor.map(render_strip, strips)), axis=1)
+    else:
+        rgb = _rasterize_edges(x0, y0, x1, y1, geometry.values, geometry, 0, width, height)
+
+    image = Image.fromarray(np.clip(rgb * 255 + 0.5, 0, 255).astype(np.uint8), "RGB")
+    _draw_neurons(image, px, py)
+    _draw_labels(image, geometry, px)
+    return image
+
+
+def _draw_neurons(image: Image.Image, px: np.ndarray, py: np.ndarray):
+    """Stamp a filled disk on every neuron center"""
+    pixels = np.asarray(image).copy()
+    height, width = pixels.shape[:2]
+    radius = 4
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    disk = dx ** 2 + dy ** 2 <= radius ** 2
+    dx, dy = dx[disk], dy[disk]
+
+    xs = (np.rint(px)[:, None] + dx[None, :]).astype(np.int64).ravel()
+    ys = (np.rint(py)[:, None] + dy[None, :]).astype(np.int64).ravel()
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    pixels[ys[inside], xs[inside]] = NEURON_COLOR
+    image.paste(Image.fromarray(pixels, "RGB"))
+
+
+def _draw_labels(image: Image.Image, geometry: NetworkGeometry, px: np.ndarray):
+    draw = ImageDraw.Draw(image)
+    names = " vs ".join(archivo.nombre_archivo for archivo in geometry.archivos)
+    title = f"{names} - {geometry.num_neuronas} neurons, {geometry.num_edges} connections"
+    if geometry.mode == "difference":
+        title += " (weight difference)"
+    draw.text((MARGIN, MARGIN // 3), title, fill=(51, 51, 51))
+
+    layer_of_neurons = geometry.layer_of_neurons()
+    for layer, size in enumerate(geometry.capas):
+        x = float(px[np.argmax(layer_of_neurons == layer)])
+        draw.text((x - 20, image.height - MARGIN // 2), f"L{layer} ({size})", fill=(102, 102, 102))
+
+
+def write_png(geometry: NetworkGeometry, filepath: Path):
+    """Render the network and save it as PNG"""
+    render_network_image(geometry).save(filepath, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
@@ -0,0 +1,109 @@
+import hmac
+import logging
+import os
+import random
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+import anyio
+from jose import JWTError, jwt
+from dotenv import load_dotenv
+
+from app.services.metrics import route_template
+
+# Load environment variables
+load_dotenv()
+
+# PROFILING_TOKEN: secret known only to admins. Requests carrying it in the
+# X-Profile header or the ?profile= query flag are profiled.
+# PROFILING_SAMPLE_RATE: fraction of all requests profiled (0 disables sampling).
+# When neither is set the middleware is not installed at all.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+PROFILES_DIR = Path(os.getenv("PROFILES_DIR", str(Path(__file__).resolve().parents[2] / "profiles"))).resolve()
+
+PROFILING_ENABLED = bool(PROFILING_TOKEN) or PROFILING_SAMPLE_RATE > 0
+
+logger = logging.getLogger(__name__)
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", value).strip("-") or "root"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that wraps selected requests in a sampling profiler and
+    saves a speedscope profile tagged with the route and the user.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # Imported here so that pyinstrument is only loaded when profiling is on
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+        self._profiler_class = Profiler
+        self._renderer_class = SpeedscopeRenderer
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+
+    def _requested_by_admin(self, scope) -> bool:
+        if not PROFILING_TOKEN:
+            return False
+        token = ""
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                token = value.decode("latin-1")
+                break
+        if not token:
+            query = scope.get("query_string", b"").decode("latin-1")
+            match = re.search(r"(?:^|&)profile=([^&]*)", query)
+            token = match.group(1) if match else ""
+        return bool(token) and hmac.compare_digest(token, PROFILING_TOKEN)
+
+    def _user_tag(self, scope) -> str:
+        from app.api.auth import SECRET_KEY, ALGORITHM
+
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                credentials = value.decode("latin-1")
+                if credentials.lower().startswith("bearer "):
+                    try:
+                        payload = jwt.decode(credentials[7:], SECRET_KEY, algorithms=[ALGORITHM])
+                        return f"user-{payload.get('sub')}"
+                    except JWTError:
+                        pass
+                break
+        return "anonymous"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if not (self._requested_by_admin(scope)
+                or (PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE)):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = self._profiler_class(interval=PROFILING_INTERVAL, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            await anyio.to_thread.run_sync(self._save, profiler, scope)
+
+    def _save(self, profiler, scope):
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
+        filename = (
+            f"{timestamp}_{scope['method']}_{_slug(route_template(scope))}"
+            f"_{self._user_tag(scope)}.speedscope.json"
+        )
+        try:
+            output = profiler.output(renderer=self._renderer_class())
+            (PROFILES_DIR / filename).write_text(output, encoding="utf-8")
+            logger.info(f" Request profile saved: {PROFILES_DIR / filename}")
+        except Exception as e:
+            logger.error(f" Failed to save request profile: {str(e)}")
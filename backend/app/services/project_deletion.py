@@ -0,0 +1,135 @@
+"""
+Deletion of projects without loading their content.
+
+The rows are removed by the database: proyectos -> archivos_entrada,
+visualizaciones -> exportaciones, trabajos_exportacion all use
+ON DELETE CASCADE, so a single DELETE of the project row never brings the
+weight matrices into memory. Export files live outside the database;
+their keys are collected before the delete and the files removed after
+the commit, outside the request. Cached weight matrices
+(app.services.matrix_cache) are dropped right after the commit.
+
+In background mode the input files are deleted in batches of
+PROJECT_DELETE_BATCH_SIZE, each in its own short transaction, before the
+project row, so a project with gigabytes of weights never holds one long
+delete transaction. The project is marked (eliminado_en) before the
+response and hidden from then on. Every step can be repeated, so a
+deletion interrupted by a dying worker is simply run again by
+resume_project_deletions, from the export sweeper, once it is older than
+PROJECT_DELETE_RESUME_SECONDS.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.archivo_entrada import ArchivoEntrada
+from app.models.exportacion import Exportacion
+from app.models.project import Proyecto
+from app.models.trabajo_exportacion import ESTADOS_ACTIVOS, TrabajoExportacion
+from app.models.visualizacion import Visualizacion
+from app.services.export_jobs import export_queue
+from app.services.export_storage import get_export_storage
+from app.services.matrix_cache import invalidate_matrices
+
+# Load environment variables
+load_dotenv()
+
+PROJECT_DELETE_BATCH_SIZE = int(os.getenv("PROJECT_DELETE_BATCH_SIZE", "50"))
+# Marked deletions older than this are taken for interrupted and resumed
+PROJECT_DELETE_RESUME_SECONDS = float(os.getenv("PROJECT_DELETE_RESUME_SECONDS", "900"))
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_project_deletion(db: Session, proyecto_id: int) -> List[str]:
+    """Stop the project's running export jobs, returns the storage keys of its exports"""
+    trabajos = db.query(TrabajoExportacion.id).join(Visualizacion).filter(
+        Visualizacion.proyecto_id == proyecto_id,
+        TrabajoExportacion.estado.in_(ESTADOS_ACTIVOS)
+    ).all()
+    for (trabajo_id,) in trabajos:
+        export_queue.cancel(trabajo_id)
+
+    keys = db.query(Exportacion.archivo).join(Visualizacion).filter(
+        Visualizacion.proyecto_id == proyecto_id
+    ).all()
+    return [key for (key,) in keys]
+
+
+def mark_project_deleted(db: Session, proyecto_id: int):
+    """Hide the project until the background deletion removes it"""
+    db.query(Proyecto).filter(Proyecto.id == proyecto_id).update(
+        {"eliminado_en": datetime.now(timezone.utc)}, synchronize_session=False
+    )
+    db.commit()
+
+
+def delete_project_rows(db: Session, proyecto_id: int) -> bool:
+    """Delete the project, the database cascades to its rows. False if it did not exist"""
+    hashes = [hash_contenido for (hash_contenido,) in db.query(ArchivoEntrada.hash_contenido).filter(
+        ArchivoEntrada.proyecto_id == proyecto_id
+    ).all()]
+    deleted = db.query(Proyecto).filter(Proyecto.id == proyecto_id).delete(synchronize_session=False)
+    db.commit()
+    invalidate_matrices(hashes)
+    return deleted == 1
+
+
+def delete_export_files(keys: List[str]):
+    """Remove exported files from storage, runs after the response"""
+    storage = get_export_storage()
+    reclaimed = 0
+    for key in keys:
+        try:
+            reclaimed += storage.delete(key)
+        except Exception as e:
+            logger.warning(f" Could not delete export file {key}: {str(e)}")
+    if keys:
+        logger.info(f" Deleted {len(keys)} export files ({reclaimed} bytes)")
+
+
+def delete_project_in_background(proyecto_id: int, keys: List[str]):
+    """Background mode: input files in short batches, then the project row and the export files"""
+    db = SessionLocal()
+    try:
+        while True:
+            batch = db.query(ArchivoEntrada.id, ArchivoEntrada.hash_contenido).filter(
+                ArchivoEntrada.proyecto_id == proyecto_id
+            ).limit(PROJECT_DELETE_BATCH_SIZE).all()
+            if not batch:
+                break
+            db.query(ArchivoEntrada).filter(
+                ArchivoEntrada.id.in_([archivo_id for archivo_id, _ in batch])
+            ).delete(synchronize_session=False)
+            db.commit()
+            invalidate_matrices([hash_contenido for _, hash_contenido in batch])
+        delete_project_rows(db, proyecto_id)
+    except Exception:
+        # Still marked, resume_project_deletions retries it
+        logger.exception(f" Background deletion of project {proyecto_id} failed")
+        return
+    finally:
+        db.close()
+    delete_export_files(keys)
+
+
+def resume_project_deletions() -> int:
+    """Run again the background deletions left unfinished, returns how many"""
+    limit = datetime.now(timezone.utc) - timedelta(seconds=PROJECT_DELETE_RESUME_SECONDS)
+    db = SessionLocal()
+    try:
+        pending = []
+        for (proyecto_id,) in db.query(Proyecto.id).filter(Proyecto.eliminado_en < limit).all():
+            pending.append((proyecto_id, prepare_project_deletion(db, proyecto_id)))
+    finally:
+        db.close()
+
+    for proyecto_id, keys in pending:
+        logger.warning(f" Resuming interrupted deletion of project {proyecto_id}")
+        delete_project_in_background(proyecto_id, keys)
+    return len(pending)
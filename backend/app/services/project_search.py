@@ -0,0 +1,111 @@
+"""
+Search of a user's projects by name, description and input file names.
+
+Every word of the query is matched as a prefix ("neur" finds "Neuronal"),
+all words must match. A project scores for its own text and, with half
+the weight, for the best matching name of its input files.
+
+- PostgreSQL: full-text search ('simple' configuration, no stemming) over
+  nombre + descripcion, ranked with ts_rank, plus pg_trgm similarity on
+  the names so substrings and small typos still match. File names match
+  with one case-insensitive regular expression per word. All use the GIN
+  indexes of app.schema.SEARCH_DDL.
+- SQLite (local stand-in): FTS5 tables proyectos_fts and
+  archivos_entrada_fts, ranked with bm25.
+"""
+import re
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.project import Proyecto
+
+# Name weighs more than description
+_POSTGRES_SEARCH = text("""
+SELECT id, SUM(score) AS score FROM (
+    SELECT p.id AS id,
+           ts_rank(to_tsvector('simple', p.nombre || ' ' || coalesce(p.descripcion, '')),
+                   to_tsquery('simple', :tsquery)) + similarity(p.nombre, :term) AS score
+    FROM proyectos p
+    WHERE p.usuario_id = :usuario_id AND p.eliminado_en IS NULL
+      AND (to_tsvector('simple', p.nombre || ' ' || coalesce(p.descripcion, '')) @@ to_tsquery('simple', :tsquery)
+           OR p.nombre ILIKE :pattern
+           OR p.nombre % :term)
+    UNION ALL
+    SELECT a.proyecto_id AS id, 0.5 * MAX(similarity(a.nombre_archivo, :term)) AS score
+    FROM archivos_entrada a JOIN proyectos p ON p.id = a.proyecto_id
+    WHERE p.usuario_id = :usuario_id AND p.eliminado_en IS NULL AND a.nombre_archivo ~* ALL (:prefixes)
+    GROUP BY a.proyecto_id
+) matches
+GROUP BY id
+ORDER BY score DESC, id DESC
+LIMIT :limit
+""")
+
+# bm25 is lower for better matches. It cannot be used inside an
+# aggregate, the CTEs are materialized so SQLite does not flatten them.
+# CROSS JOIN keeps the FTS match as the outer loop; otherwise SQLite
+# may run one FTS lookup per project of the user
+_SQLITE_SEARCH = text("""
+WITH proyecto_matches AS MATERIALIZED (
+    SELECT p.id AS id, -bm25(proyectos_fts, 10.0, 1.0) AS score
+    FROM proyectos_fts CROSS JOIN proyectos p ON p.id = proyectos_fts.rowid
+    WHERE proyectos_fts MATCH :match AND p.usuario_id = :usuario_id AND p.eliminado_en IS NULL
+), archivo_matches AS MATERIALIZED (
+    SELECT a.proyecto_id AS id, -bm25(archivos_entrada_fts) AS score
+    FROM archivos_entrada_fts
+    CROSS JOIN archivos_entrada a ON a.id = archivos_entrada_fts.rowid
+    CROSS JOIN proyectos p ON p.id = a.proyecto_id
+    WHERE archivos_entrada_fts MATCH :match AND p.usuario_id = :usuario_id AND p.eliminado_en IS NULL
+)
+SELECT id, SUM(score) AS score FROM (
+    SELECT id, score FROM proyecto_matches
+    UNION ALL
+    SELECT id, 0.5 * MAX(score) AS score FROM archivo_matches GROUP BY id
+)
+GROUP BY id
+ORDER BY score DESC, id DESC
+LIMIT :limit
+""")
+
+
+
+def _words(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_projects(db: Session, usuario_id: int, query: str, limit: int) -> List[Tuple[Proyecto, float]]:
+    """Best matching projects of the user with their score, best first"""
+    words = _words(query)
+    if not words:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        params = {
+            "tsquery": " & ".join(f"{word}:*" for word in words),
+            "term": query.strip(),
+            "pattern": _like_pattern(query.strip()),
+            # Every word at the start of a word of the file name, like FTS5 prefixes
+            "prefixes": [f"(^|[^[:alnum:]]){word}" for word in words],
+        }
+        statement = _POSTGRES_SEARCH
+    else:
+        # Quoted so words are never read as FTS5 operators
+        params = {"match": " AND ".join(f'"{word}"*' for word in words)}
+        statement = _SQLITE_SEARCH
+
+    scores = db.execute(statement, {**params, "usuario_id": usuario_id, "limit": limit}).all()
+    if not scores:
+        return []
+
+    proyectos = {
+        proyecto.id: proyecto
+        for proyecto in db.query(Proyecto).filter(Proyecto.id.in_([row.id for row in scores]))
+    }
+    return [(proyectos[row.id], float(row.score)) for row in scores if row.id in proyectos]
@@ -0,0 +1,125 @@
+"""
+Per-project aggregates of the input files: number of files, adversarial
+files, total neurons and bytes stored.
+
+They are computed with one grouped query over all of a user's projects,
+reading only the small columns of archivos_entrada (never fichero or
+matriz_pesos). With PROJECT_SUMMARY_TABLE the aggregates are also kept in
+resumenes_proyecto, recomputed for one project after every upload or
+delete, and the listing reads that table instead; projects without a row
+yet are computed on the fly and stored.
+"""
+import os
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import Integer, case, func
+from sqlalchemy.orm import Session
+
+from app.database import engine
+from app.models.archivo_entrada import ArchivoEntrada
+from app.models.project import Proyecto
+from app.models.resumen_proyecto import ResumenProyecto
+
+# Load environment variables
+load_dotenv()
+
+PROJECT_SUMMARY_TABLE = os.getenv("PROJECT_SUMMARY_TABLE", "false").lower() == "true"
+
+_AGGREGATES = (
+    func.count(ArchivoEntrada.id).label("num_archivos"),
+    func.coalesce(func.sum(case((ArchivoEntrada.ataque, 1), else_=0)), 0).cast(Integer).label("num_ataques"),
+    func.coalesce(func.sum(ArchivoEntrada.num_neuronas), 0).label("total_neuronas"),
+    func.coalesce(func.sum(ArchivoEntrada.tamaño), 0).label("tamaño_archivos"),
+)
+
+
+def _computed(db: Session, usuario_id: int, proyecto_ids: Optional[List[int]] = None):
+    query = db.query(
+        Proyecto.id.label("proyecto_id"),
+        Proyecto.nombre,
+        Proyecto.estado,
+        Proyecto.fecha_modificacion,
+        *_AGGREGATES,
+    ).outerjoin(ArchivoEntrada, ArchivoEntrada.proyecto_id == Proyecto.id).filter(
+        Proyecto.usuario_id == usuario_id,
+        Proyecto.eliminado_en.is_(None)
+    )
+    if proyecto_ids is not None:
+        query = query.filter(Proyecto.id.in_(proyecto_ids))
+    return query.group_by(Proyecto.id).order_by(Proyecto.fecha_modificacion.desc(), Proyecto.id.desc()).all()
+
+
+def _upsert(db: Session, values: List[dict]):
+    if not values:
+        return
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(ResumenProyecto).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[ResumenProyecto.proyecto_id],
+        set_={
+            "num_archivos": statement.excluded.num_archivos,
+            "num_ataques": statement.excluded.num_ataques,
+            "total_neuronas": statement.excluded.total_neuronas,
+            "tamaño_archivos": statement.excluded["tamaño_archivos"],
+            "fecha_actualizacion": func.now(),
+        },
+    )
+    db.execute(statement)
+
+
+def _stored_values(row) -> dict:
+    return {
+        "proyecto_id": row.proyecto_id,
+        "num_archivos": row.num_archivos,
+        "num_ataques": row.num_ataques,
+        "total_neuronas": row.total_neuronas,
+        "tamaño_archivos": row.tamaño_archivos,
+    }
+
+
+def project_summaries(db: Session, usuario_id: int) -> List[dict]:
+    """Aggregates of every project of the user, most recently modified first"""
+    if not PROJECT_SUMMARY_TABLE:
+        return [row._asdict() for row in _computed(db, usuario_id)]
+
+    rows = db.query(
+        Proyecto.id.label("proyecto_id"),
+        Proyecto.nombre,
+        Proyecto.estado,
+        Proyecto.fecha_modificacion,
+        ResumenProyecto.num_archivos,
+        ResumenProyecto.num_ataques,
+        ResumenProyecto.total_neuronas,
+        ResumenProyecto.tamaño_archivos,
+    ).outerjoin(ResumenProyecto, ResumenProyecto.proyecto_id == Proyecto.id).filter(
+        Proyecto.usuario_id == usuario_id,
+        Proyecto.eliminado_en.is_(None)
+    ).order_by(Proyecto.fecha_modificacion.desc(), Proyecto.id.desc()).all()
+
+    missing = [row.proyecto_id for row in rows if row.num_archivos is None]
+    if not missing:
+        return [row._asdict() for row in rows]
+
+    # Projects created before the table was enabled
+    computed = {row.proyecto_id: row for row in _computed(db, usuario_id, missing)}
+    _upsert(db, [_stored_values(row) for row in computed.values()])
+    db.commit()
+    return [
+        (computed[row.proyecto_id] if row.proyecto_id in computed else row)._asdict()
+        for row in rows
+    ]
+
+
+def refresh_project_summary(db: Session, usuario_id: int, proyecto_id: int):
+    """
+    Recompute the stored aggregates of one project. Called after the
+    upload or delete is committed, so concurrent changes are all seen.
+    """
+    if not PROJECT_SUMMARY_TABLE:
+        return
+    _upsert(db, [_stored_values(row) for row in _computed(db, usuario_id, [proyecto_id])])
+    db.commit()
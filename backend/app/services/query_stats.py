@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# SQL_INSTRUMENTATION: enables the cursor hooks and the Server-Timing header.
+# When disabled nothing is registered on the engine, so there is no overhead.
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "false").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+
+class QueryStats:
+    """Statements executed while serving a single request"""
+
+    __slots__ = ("path", "count", "total_ms", "slowest_ms", "slowest_statement")
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        return (
+            f'db;dur={self.total_ms:.2f};desc="{self.count} queries", '
+            f'db-slowest;dur={self.slowest_ms:.2f}'
+        )
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the request being served, None outside a request"""
+    return _current_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    elapsed_ms = (time.perf_counter() - start_times.pop()) * 1000
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+    if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+        slow_query_logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(elapsed_ms, 2),
+            "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+            "path": stats.path if stats is not None else None,
+            "executemany": executemany,
+            "statement": " ".join(statement.split()),
+        }))
+
+
+def _handle_error(exception_context):
+    # Keep the timing stack balanced when a statement fails
+    start_times = exception_context.connection.info.get("query_start_time") \
+        if exception_context.connection is not None else None
+    if start_times:
+        start_times.pop()
+
+
+def install_query_instrumentation(engine: Engine):
+    """Register the cursor hooks on the engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    logger.info(f" SQL instrumentation enabled (slow query threshold: {SLOW_QUERY_THRESHOLD_MS} ms)")
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware that collects the statements of each request and
+    reports them in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope.get("path", ""))
+        token = _current_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
@@ -0,0 +1,148 @@
+"""
+SVG exporter for visualizations.
+
+The document is produced by a generator of text chunks written straight
+to the export file. To keep dense networks manageable:
+
+- connections below SVG_EDGE_THRESHOLD (|weight|, or |difference| when
+  comparing) are left out,
+- connections are quantized into SVG_COLOR_BUCKETS colors and every
+  bucket of a layer is merged into a single <path>,
+- connections and neurons are grouped by layer so they can be toggled or
+  styled per layer.
+"""
+import os
+from pathlib import Path
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.models.visualizacion import Visualizacion
+from app.services.network_layout import NetworkGeometry
+
+# Load environment variables
+load_dotenv()
+
+SVG_EDGE_THRESHOLD = float(os.getenv("SVG_EDGE_THRESHOLD", "0.05"))
+SVG_COLOR_BUCKETS = int(os.getenv("SVG_COLOR_BUCKETS", "32"))
+
+NEURON_SPACING = 24
+MIN_NEURON_SPACING = 4
+TARGET_HEIGHT = 1600
+LAYER_SPACING = 240
+MARGIN = 60
+NEURON_RADIUS = 4
+# Subpaths formatted per chunk
+SEGMENTS_PER_CHUNK = 5000
+
+
+def canvas_size(geometry: NetworkGeometry) -> tuple[int, int]:
+    width = len(geometry.capas) * LAYER_SPACING + 2 * MARGIN
+    max_neurons = max(geometry.capas)
+    spacing = max(MIN_NEURON_SPACING, min(NEURON_SPACING, TARGET_HEIGHT // max_neurons))
+    height = max_neurons * spacing + 2 * MARGIN
+    return max(width, 800), max(height, 600)
+
+
+def _hex(rgb) -> str:
+    r, g, b = (int(round(float(c) * 255)) for c in rgb)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _color_buckets(geometry: NetworkGeometry, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bucket index of every value and the RGBA of every bucket.
+
+    Weights use the palette range [-1, 1] (it saturates there), differences
+    [0, max difference].
+    """
+    if geometry.mode == "weights":
+        low, high = -1.0, 1.0
+    else:
+        low, high = 0.0, max(float(geometry.values.max()) if geometry.values.size else 0.0, 1e-12)
+    centers = low + (np.arange(SVG_COLOR_BUCKETS) + 0.5) * (high - low) / SVG_COLOR_BUCKETS
+    index = np.floor((np.clip(values, low, high) - low) / (high - low) * SVG_COLOR_BUCKETS).astype(np.intp)
+    return np.clip(index, 0, SVG_COLOR_BUCKETS - 1), geometry.colors_for(centers)
+
+
+def svg_chunks(geometry: NetworkGeometry, visualizacion: Visualizacion) -> Iterator[str]:
+    """Generate the SVG document of a visualization chunk by chunk"""
+    width, height = canvas_size(geometry)
+    px = MARGIN + geometry.x * (width - 2 * MARGIN)
+    py = MARGIN + geometry.y * (height - 2 * MARGIN)
+
+    kept = np.flatnonzero(np.abs(geometry.values) >= SVG_EDGE_THRESHOLD)
+    names = escape(" vs ".join(archivo.nombre_archivo for archivo in geometry.archivos))
+    title = f"{names} - {geometry.num_neuronas} neurons, {geometry.num_edges} connections"
+    if geometry.mode == "difference":
+        title += " (weight difference)"
+    if kept.size < geometry.num_edges:
+        title += f", {kept.size} shown (threshold {SVG_EDGE_THRESHOLD:g})"
+
+    yield (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+        f'xmlns="http://www.w3.org/2000/svg" data-visualizacion-id="{visualizacion.id}">\n'
+        f'<title>Neural Network Visualization {visualizacion.id}</title>\n'
+        f'<rect width="{width}" height="{height}" fill="#f5f5f5"/>\n'
+        f'<text x="{MARGIN}" y="{MARGIN // 2}" font-family="Arial, sans-serif" font-size="14" '
+        f'fill="#333">{title}</text>\n'
+    )
+
+    # Connections, one group per source layer and one path per color bucket
+    yield '<g id="connections" fill="none" stroke-width="1" stroke-linecap="round">\n'
+    src, dst = geometry.src[kept], geometry.dst[kept]
+    buckets, bucket_colors = _color_buckets(geometry, geometry.values[kept])
+    source_layer = geometry.layer_of_neurons()[src]
+    # Sort once by (layer, bucket) so every merged path is a contiguous run
+    order = np.lexsort((buckets, source_layer))
+    src, dst, buckets, source_layer = src[order], dst[order], buckets[order], source_layer[order]
+    groups = np.flatnonzero(np.diff(source_layer * SVG_COLOR_BUCKETS + buckets)) + 1
+    bounds = np.concatenate([[0], groups, [src.size]]).astype(np.intp)
+
+    open_layer = None
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if first == last:
+            continue
+        layer, bucket = int(source_layer[first]), int(buckets[first])
+        if layer != open_layer:
+            if open_layer is not None:
+                yield '</g>\n'
+            yield f'<g id="connections-layer-{layer}" class="layer" data-layer="{layer}">\n'
+            open_layer = layer
+        color = bucket_colors[bucket]
+        yield f'<path stroke="{_hex(color[:3])}" stroke-opacity="{color[3]:.2f}" d="'
+        for start in range(first, last, SEGMENTS_PER_CHUNK):
+            end = min(start + SEGMENTS_PER_CHUNK, last)
+            segments = np.column_stack([px[src[start:end]], py[src[start:end]],
+                                        px[dst[start:end]], py[dst[start:end]]])
+            yield "".join("M%.1f %.1fL%.1f %.1f" % tuple(segment) for segment in segments.tolist())
+        yield '"/>\n'
+    if open_layer is not None:
+        yield '</g>\n'
+    yield '</g>\n'
+
+    # Neurons on top, one merged path of circles per layer
+    yield '<g id="neurons" fill="#333">\n'
+    boundaries = np.cumsum([0] + list(geometry.capas))
+    r = NEURON_RADIUS
+    for layer, size in enumerate(geometry.capas):
+        first, last = boundaries[layer], boundaries[layer + 1]
+        yield f'<g id="neurons-layer-{layer}" class="layer" data-layer="{layer}">\n<path d="'
+        for start in range(first, last, SEGMENTS_PER_CHUNK):
+            end = min(start + SEGMENTS_PER_CHUNK, last)
+            centers = np.column_stack([px[start:end] - r, py[start:end]])
+            yield "".join(f"M{x:.1f} {y:.1f}a{r} {r} 0 1 0 {2 * r} 0a{r} {r} 0 1 0 {-2 * r} 0"
+                          for x, y in centers.tolist())
+        yield (f'"/>\n<text x="{px[first]:.1f}" y="{height - MARGIN // 2}" text-anchor="middle" '
+               f'font-family="Arial, sans-serif" font-size="12" fill="#666">L{layer} ({size})</text>\n</g>\n')
+    yield '</g>\n</svg>\n'
+
+
+def write_svg(geometry: NetworkGeometry, visualizacion: Visualizacion, filepath: Path):
+    """Write the SVG export of a visualization to filepath"""
+    with open(filepath, "w", encoding="utf-8") as f:
+        for chunk in svg_chunks(geometry, visualizacion):
+            f.write(chunk)
@@ -0,0 +1,306 @@
+"""
+Key-value store with expiry for short-lived auth state (reset codes).
+
+AUTH_STATE_BACKEND selects the backend:
+
+- memory: a dict of this process, only valid with a single worker,
+- database: the estados_temporales table, shared by every worker,
+- redis: any server speaking the Redis protocol (REDIS_URL), with native
+  key expiry.
+
+consume() deletes a key only if it still holds the expected value and
+has not expired, in one atomic step, so a code can be used exactly once
+even when two workers receive it at the same time. fail_attempt()
+counts wrong guesses and deletes the entry after too many, so a short
+code cannot be brute-forced within its lifetime. Expired entries are
+never returned; sweep() deletes them and runs every
+AUTH_STATE_SWEEP_SECONDS in the background.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal, engine
+from app.models.estado_temporal import EstadoTemporal
+
+# Load environment variables
+load_dotenv()
+
+AUTH_STATE_BACKEND = os.getenv("AUTH_STATE_BACKEND", "database").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Prefix of the keys in a shared Redis
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "neuralviz:")
+# 0 disables the background sweeper
+AUTH_STATE_SWEEP_SECONDS = float(os.getenv("AUTH_STATE_SWEEP_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class TTLStore(ABC):
+    """Interface of the TTL store backends"""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl_seconds: float):
+        """Store value under key, replacing any previous one"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Value of key, None if missing or expired"""
+
+    @abstractmethod
+    def consume(self, key: str, expected: str) -> bool:
+        """Delete key if it holds expected and has not expired, True if it did"""
+
+    @abstractmethod
+    def fail_attempt(self, key: str, max_attempts: int) -> bool:
+        """Count a failed attempt against key, deleting it at max_attempts. True if it was deleted"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Delete key, whatever it holds"""
+
+    def sweep(self) -> int:
+        """Delete the expired entries, returns how many"""
+        return 0
+
+
+class MemoryTTLStore(TTLStore):
+    def __init__(self):
+        # value, expiry and failed attempts
+        self._entries: Dict[str, Tuple[str, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl_seconds, 0)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def consume(self, key: str, expected: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic() or entry[0] != expected:
+                return False
+            del self._entries[key]
+            return True
+
+    def fail_attempt(self, key: str, max_attempts: int) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return False
+            value, expires, intentos = entry
+            if intentos + 1 >= max_attempts:
+                del self._entries[key]
+                return True
+            self._entries[key] = (value, expires, intentos + 1)
+            return False
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, expires, _) in self._entries.items() if expires <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+
+class DatabaseTTLStore(TTLStore):
+    def __init__(self):
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        expira_en = self._now() + timedelta(seconds=ttl_seconds)
+        statement = self._insert(EstadoTemporal).values(clave=key, valor=value, expira_en=expira_en, intentos=0)
+        statement = statement.on_conflict_do_update(
+            index_elements=[EstadoTemporal.clave],
+            set_={"valor": value, "expira_en": expira_en, "intentos": 0},
+        )
+        db = SessionLocal()
+        try:
+            db.execute(statement)
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, key: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            return db.query(EstadoTemporal.valor).filter(
+                EstadoTemporal.clave == key,
+                EstadoTemporal.expira_en > self._now()
+            ).scalar()
+        finally:
+            db.close()
+
+    def consume(self, key: str, expected: str) -> bool:
+        # A single conditional DELETE: only one worker can match the row
+        db = SessionLocal()
+        try:
+            deleted = db.query(EstadoTemporal).filter(
+                EstadoTemporal.clave == key,
+                EstadoTemporal.valor == expected,
+                EstadoTemporal.expira_en > self._now()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted == 1
+        finally:
+            db.close()
+
+    def fail_attempt(self, key: str, max_attempts: int) -> bool:
+        # The increment locks the row until commit, concurrent failures queue up
+        db = SessionLocal()
+        try:
+            db.query(EstadoTemporal).filter(
+                EstadoTemporal.clave == key,
+                EstadoTemporal.expira_en > self._now()
+            ).update({"intentos": EstadoTemporal.intentos + 1}, synchronize_session=False)
+            deleted = db.query(EstadoTemporal).filter(
+                EstadoTemporal.clave == key,
+                EstadoTemporal.intentos >= max_attempts
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted == 1
+        finally:
+            db.close()
+
+    def delete(self, key: str):
+        db = SessionLocal()
+        try:
+            db.query(EstadoTemporal).filter(EstadoTemporal.clave == key).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def sweep(self) -> int:
+        db = SessionLocal()
+        try:
+            deleted = db.query(EstadoTemporal).filter(
+                EstadoTemporal.expira_en <= self._now()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+
+# Compare-and-delete in one server-side step
+_CONSUME_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1], KEYS[2])
+end
+return 0
+"""
+
+# Failed attempts live in a counter key that expires with the entry
+_FAIL_SCRIPT = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl <= 0 then
+    return 0
+end
+local intentos = redis.call('INCR', KEYS[2])
+redis.call('PEXPIRE', KEYS[2], ttl)
+if intentos >= tonumber(ARGV[1]) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 1
+end
+return 0
+"""
+
+
+class RedisTTLStore(TTLStore):
+    """Expiry is handled by the server, sweep() has nothing to do"""
+
+    def __init__(self, url: str, prefix: str):
+        # Deferred: only needed with AUTH_STATE_BACKEND=redis
+        import redis
+
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._consume = self._client.register_script(_CONSUME_SCRIPT)
+        self._fail = self._client.register_script(_FAIL_SCRIPT)
+
+    def _attempts_key(self, key: str) -> str:
+        return self._prefix + key + ":intentos"
+
+    def set(self, key: str, value: str, ttl_seconds: float):
+        pipeline = self._client.pipeline()
+        pipeline.set(self._prefix + key, value, px=max(int(ttl_seconds * 1000), 1))
+        pipeline.delete(self._attempts_key(key))
+        pipeline.execute()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self._prefix + key)
+
+    def consume(self, key: str, expected: str) -> bool:
+        return self._consume(keys=[self._prefix + key, self._attempts_key(key)], args=[expected]) == 1
+
+    def fail_attempt(self, key: str, max_attempts: int) -> bool:
+        return self._fail(keys=[self._prefix + key, self._attempts_key(key)], args=[max_attempts]) == 1
+
+    def delete(self, key: str):
+        self._client.delete(self._prefix + key, self._attempts_key(key))
+
+
+def _create_store() -> TTLStore:
+    if AUTH_STATE_BACKEND == "redis":
+        logger.info(f" Auth state store: redis ({REDIS_URL})")
+        return RedisTTLStore(REDIS_URL, REDIS_KEY_PREFIX)
+    if AUTH_STATE_BACKEND == "memory":
+        return MemoryTTLStore()
+    if AUTH_STATE_BACKEND != "database":
+        raise ValueError(
+            f"Unknown AUTH_STATE_BACKEND '{AUTH_STATE_BACKEND}', expected 'memory', 'database' or 'redis'"
+        )
+    return DatabaseTTLStore()
+
+
+_store: Optional[TTLStore] = None
+
+
+def get_ttl_store() -> TTLStore:
+    """Configured store backend, created on first use"""
+    global _store
+    if _store is None:
+        _store = _create_store()
+    return _store
+
+
+async def run_ttl_sweeper(interval: float):
+    """Delete expired entries every interval seconds until cancelled"""
+    while True:
+        try:
+            deleted = await run_in_threadpool(get_ttl_store().sweep)
+            if deleted:
+                logger.info(f" Auth state sweep deleted {deleted} expired entries")
+        except Exception:
+            logger.exception(" Auth state sweep failed")
+        await asyncio.sleep(interval)
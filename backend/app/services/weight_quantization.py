@@ -0,0 +1,200 @@
+"""
+Compact storage of weight matrices.
+
+By default the matrix is kept as JSON floats in matriz_pesos. A file can
+instead be stored packed in pesos, as a dense little-endian matrix of
+
+- float32 or float16, or
+- int8 with one scale and zero-point per layer (the rows of each layer
+  of capas), asymmetric over [min(w, 0), max(w, 0)] so that a zero weight
+  (no connection) stays exactly zero.
+
+cuantizacion records the layout needed to decode it: shape, the length of
+every row (rows may be ragged), the first row of each layer, scales,
+zero-points and the decimals the decoded values are rounded to. The
+rounding keeps the JSON of the decoded matrix as short as the precision
+warrants; error_cuantizacion is measured on those rounded values.
+
+load_payloads (app.services.cold_storage) fills matriz_pesos with the
+decoded matrix, so the API and the renderers see the same lists either
+way; packed_weights is what clients that ask for the packed data receive.
+"""
+import base64
+import math
+import os
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.archivo_entrada import ArchivoEntrada, FormatoPesos
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Load environment variables
+load_dotenv()
+
+# Storage of uploads that do not choose one: json, float32, float16 or int8
+WEIGHT_STORAGE_FORMAT = FormatoPesos(os.getenv("WEIGHT_STORAGE_FORMAT", "json"))
+
+# numpy is imported by the functions that encode or decode, so importing
+# this module (the API does) does not load it
+_DTYPES = {
+    FormatoPesos.FLOAT32: "<f4",
+    FormatoPesos.FLOAT16: "<f2",
+    FormatoPesos.INT8: "i1",
+}
+
+# Relative spacing of representable values (2 ** -mantissa bits)
+_EPSILON = {
+    FormatoPesos.FLOAT32: 2.0 ** -24,
+    FormatoPesos.FLOAT16: 2.0 ** -11,
+}
+
+
+def _dense(matriz_pesos: List[List[float]]) -> Tuple["np.ndarray", List[int]]:
+    import numpy as np
+
+    longitudes = [len(row) for row in matriz_pesos]
+    matrix = np.zeros((len(matriz_pesos), max(longitudes, default=0)), dtype=np.float64)
+    for i, row in enumerate(matriz_pesos):
+        matrix[i, :len(row)] = row
+    return matrix, longitudes
+
+
+def _layer_rows(capas: List[int], rows: int) -> List[int]:
+    """First row of each layer; rows past the last layer belong to it"""
+    starts = [0]
+    for size in capas[:-1]:
+        if starts[-1] + size >= rows:
+            break
+        starts.append(starts[-1] + size)
+    return starts
+
+
+def _decimals(step: float) -> int:
+    # Rounding to one more decimal than the step adds at most step / 20
+    if step <= 0:
+        return 0
+    return min(15, max(0, math.ceil(-math.log10(step)) + 1))
+
+
+def _quantize_int8(matrix: "np.ndarray", filas: List[int]) -> Tuple["np.ndarray", List[float], List[int]]:
+    import numpy as np
+
+    packed = np.zeros(matrix.shape, dtype=np.int8)
+    escalas, ceros = [], []
+    for start, end in zip(filas, filas[1:] + [matrix.shape[0]]):
+        block = matrix[start:end]
+        low = min(float(block.min(initial=0.0)), 0.0)
+        high = max(float(block.max(initial=0.0)), 0.0)
+        scale = (high - low) / 255 if high > low else 1.0
+        zero_point = int(np.clip(round(-128 - low / scale), -128, 127))
+        packed[start:end] = np.clip(np.rint(block / scale) + zero_point, -128, 127)
+        escalas.append(scale)
+        ceros.append(zero_point)
+    return packed, escalas, ceros
+
+
+def _unpack(datos: bytes, formato: FormatoPesos, cuantizacion: dict) -> "np.ndarray":
+    import numpy as np
+
+    rows, cols = cuantizacion["forma"]
+    packed = np.frombuffer(datos, dtype=_DTYPES[formato]).reshape(rows, cols)
+    if formato != FormatoPesos.INT8:
+        matrix = packed.astype(np.float64)
+    else:
+        matrix = np.empty((rows, cols), dtype=np.float64)
+        filas = cuantizacion["filas"]
+        for start, end, scale, zero_point in zip(
+            filas, filas[1:] + [rows], cuantizacion["escalas"], cuantizacion["ceros"]
+        ):
+            matrix[start:end] = (packed[start:end].astype(np.float64) - zero_point) * scale
+    return np.round(matrix, cuantizacion["decimales"])
+
+
+def encode(matriz_pesos: List[List[float]], capas: List[int], formato: FormatoPesos) -> Tuple[bytes, dict, float]:
+    """Packed matrix, its cuantizacion and the max absolute error of the decoded values"""
+    import numpy as np
+
+    matrix, longitudes = _dense(matriz_pesos)
+    filas = _layer_rows(list(capas), matrix.shape[0])
+    cuantizacion = {
+        "forma": list(matrix.shape),
+        # Omitted when every row is complete
+        "longitudes": None if len(set(longitudes)) <= 1 else longitudes,
+        "filas": filas,
+    }
+
+    if formato == FormatoPesos.INT8:
+        packed, escalas, ceros = _quantize_int8(matrix, filas)
+        cuantizacion.update(escalas=escalas, ceros=ceros, decimales=_decimals(min(escalas, default=1.0)))
+    else:
+        max_abs = float(np.abs(matrix).max(initial=0.0))
+        if max_abs > np.finfo(_DTYPES[formato]).max:
+            raise ValueError(f"Weights up to {max_abs} do not fit in {formato.value}")
+        packed = matrix.astype(_DTYPES[formato])
+        cuantizacion["decimales"] = _decimals(max_abs * _EPSILON[formato])
+
+    datos = packed.tobytes()
+    decoded = _unpack(datos, formato, cuantizacion)
+    error = float(np.abs(decoded - matrix).max(initial=0.0))
+    return datos, cuantizacion, error
+
+
+def decode_rows(archivo: ArchivoEntrada) -> Iterator[List[float]]:
+    """Rows of a packed file as lists, only one row is converted at a time"""
+    cuantizacion = archivo.cuantizacion
+    matrix = _unpack(archivo.pesos, archivo.formato_pesos, cuantizacion)
+    longitudes = cuantizacion["longitudes"] or [matrix.shape[1]] * matrix.shape[0]
+    for row, length in zip(matrix, longitudes):
+        yield row[:length].tolist()
+
+
+def decode(archivo: ArchivoEntrada) -> List[List[float]]:
+    """Weight matrix of a packed file as lists, like matriz_pesos"""
+    return list(decode_rows(archivo))
+
+
+def store_weights(archivo: ArchivoEntrada, matriz_pesos: List[List[float]], formato: FormatoPesos):
+    """Set the weights of a new file in the given storage format"""
+    archivo.formato_pesos = formato
+    if formato == FormatoPesos.JSON:
+        archivo.matriz_pesos = matriz_pesos
+        return
+    # matriz_pesos is left NULL
+    archivo.pesos, archivo.cuantizacion, archivo.error_cuantizacion = encode(matriz_pesos, archivo.capas, formato)
+
+
+def load_weights(archivos: Iterable[ArchivoEntrada]):
+    """Decode packed weights into matriz_pesos, never written back"""
+    for archivo in archivos:
+        if archivo.formato_pesos != FormatoPesos.JSON and archivo.matriz_pesos is None and archivo.pesos is not None:
+            set_committed_value(archivo, "matriz_pesos", decode(archivo))
+
+
+def packed_weights(archivo: ArchivoEntrada, formato: Optional[FormatoPesos] = None) -> dict:
+    """
+    Packed weights for clients that decode them themselves. The stored
+    encoding is returned as is; other formats are encoded on the fly from
+    the decoded matrix, their error then adds to the stored one.
+    """
+    if formato is None:
+        formato = FormatoPesos.FLOAT32 if archivo.formato_pesos == FormatoPesos.JSON else archivo.formato_pesos
+    if formato == FormatoPesos.JSON:
+        raise ValueError("json is not a packed format")
+
+    if formato == archivo.formato_pesos:
+        datos, cuantizacion, error = archivo.pesos, archivo.cuantizacion, archivo.error_cuantizacion
+    else:
+        datos, cuantizacion, error = encode(archivo.matriz_pesos, archivo.capas, formato)
+        error += archivo.error_cuantizacion or 0.0
+
+    return {
+        "archivo_id": archivo.id,
+        "formato": formato,
+        "error_maximo": error,
+        "datos": base64.b64encode(datos).decode("ascii"),
+        **cuantizacion,
+    }
@@ -0,0 +1,169 @@
+"""
+Load-test and benchmark suite for the API.
+
+Run from backend/:
+
+    python -m benchmarks --spawn-server --database-url sqlite:///bench.db
+    python -m benchmarks --base-url http://localhost:8000 --server-pid 1234
+    python -m benchmarks --spawn-server --compare bench_results/baseline.json
+
+Results are written as JSON (one file per run) so that two commits can be
+compared with --compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.runner import run_scenario
+from benchmarks.scenarios import BenchContext, build_scenarios, setup
+from benchmarks.synthetic import generate_network, layout_for_size, parse_layout
+
+DEFAULT_SCENARIOS = "register_login,login,upload,list,detail,visualization,export"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn-server", action="store_true",
+                        help="start uvicorn (app.main:app) for the duration of the run")
+    parser.add_argument("--database-url", default="sqlite:///bench.db",
+                        help="DATABASE_URL of the spawned server (Postgres or SQLite stand-in)")
+    parser.add_argument("--port", type=int, default=8765, help="port of the spawned server")
+    parser.add_argument("--server-pid", type=int, help="pid of an external server, for RSS sampling")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sizes", default="64,256", help="total neurons of the synthetic networks")
+    parser.add_argument("--num-layers", type=int, default=3)
+    parser.add_argument("--layers", help="explicit layer layout, e.g. 16,32,4 (overrides --sizes)")
+    parser.add_argument("--density", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-files", type=int, default=4, help="input files created before the read scenarios")
+    parser.add_argument("--output", help="results file (default bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    return parser.parse_args(argv)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(args) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": args.database_url}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            if httpx.get(f"{args.base_url}/api/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Benchmark server did not become healthy in 30 s")
+
+
+async def run(args, server_pid: int | None) -> tuple:
+    if args.layers:
+        layouts = [parse_layout(args.layers)]
+    else:
+        layouts = [layout_for_size(int(size), args.num_layers) for size in args.sizes.split(",")]
+    network_files = [generate_network(capas, args.density, args.seed + i) for i, capas in enumerate(layouts)]
+
+    results = []
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        ctx = BenchContext(client=client, network_files=network_files)
+        await setup(ctx, args.seed_files)
+        scenarios = build_scenarios(ctx)
+        for name in args.scenarios.split(","):
+            if name not in scenarios:
+                raise SystemExit(f"Unknown scenario {name!r}, choose from {', '.join(scenarios)}")
+            result = await run_scenario(name, scenarios[name], args.iterations, args.concurrency, server_pid)
+            results.append(result)
+            latency = result["latency_ms"]
+            rss = f"{result['peak_rss_bytes'] / 2**20:.1f} MiB" if result["peak_rss_bytes"] else "n/a"
+            print(f"{name:<16} p50={latency['p50']:>9.2f}ms p95={latency['p95']:>9.2f}ms "
+                  f"p99={latency['p99']:>9.2f}ms {result['throughput_ops']:>8.1f} ops/s "
+                  f"errors={result['errors']} rss={rss}")
+    return results, layouts
+
+
+def compare(current: list, baseline_path: str):
+    baseline = {r["scenario"]: r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nComparison with {baseline_path} (positive = slower):")
+    for result in current:
+        previous = baseline.get(result["scenario"])
+        if not previous:
+            continue
+        deltas = []
+        for key in ("p50", "p95", "p99"):
+            before = previous["latency_ms"][key]
+            after = result["latency_ms"][key]
+            change = (after - before) / before * 100 if before else 0.0
+            deltas.append(f"{key} {change:+.1f}%")
+        print(f"{result['scenario']:<16} " + "  ".join(deltas))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = None
+    server_pid = args.server_pid
+    if args.spawn_server:
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args)
+        server_pid = server.pid
+    try:
+        results, layouts = asyncio.run(run(args, server_pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    started = datetime.now(timezone.utc)
+    output = Path(args.output or f"bench_results/{started.strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": git_commit(),
+        "created_at": started.isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": args.database_url if args.spawn_server else None,
+        "parameters": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "layouts": layouts,
+            "density": args.density,
+            "seed": args.seed,
+            "seed_files": args.seed_files,
+        },
+        "results": results,
+    }, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Concurrency driver, latency statistics and memory sampling.
+"""
+import asyncio
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process (Linux /proc, psutil elsewhere)"""
+    status_file = Path(f"/proc/{pid}/status")
+    if status_file.exists():
+        for line in status_file.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+        return None
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return None
+
+
+class RSSSampler:
+    """Samples the RSS of the server process in a background thread and keeps the peak"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_bytes(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+async def run_scenario(
+    name: str,
+    operation: Callable[[int], Awaitable[None]],
+    iterations: int,
+    concurrency: int,
+    server_pid: Optional[int] = None,
+) -> Dict:
+    """
+    Run operation(i) for i in range(iterations) with at most `concurrency`
+    operations in flight.
+
+    Returns:
+        Dictionary with latency percentiles (ms), throughput (ops/s),
+        error count and peak server RSS (bytes, None if unknown)
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < iterations:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                await operation(index)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    with RSSSampler(server_pid) as sampler:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "duration_s": round(elapsed, 4),
+        "throughput_ops": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "min": round(latencies[0], 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+        "peak_rss_bytes": sampler.peak,
+    }
@@ -0,0 +1,146 @@
+"""
+API flows exercised by the benchmark. Every scenario is an async callable
+taking the iteration index, bound to a shared BenchContext.
+"""
+import asyncio
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+import httpx
+
+PASSWORD = "BenchPass123"
+
+
+@dataclass
+class BenchContext:
+    client: httpx.AsyncClient
+    network_files: List[str]
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    username: str = ""
+    token: str = ""
+    proyecto_id: int = 0
+    archivo_ids: List[int] = field(default_factory=list)
+    visualizacion_id: int = 0
+    export_formats: List[str] = field(default_factory=lambda: ["json", "html", "svg"])
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+def _check(response: httpx.Response, expected: int):
+    if response.status_code != expected:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path} "
+                           f"returned {response.status_code}: {response.text[:200]}")
+
+
+async def register_and_login(ctx: BenchContext, username: str) -> str:
+    response = await ctx.client.post("/api/auth/register", json={
+        "username": username,
+        "email": f"{username}@bench.example.com",
+        "password": PASSWORD,
+        "nombre": "Bench",
+        "gdpr_consent": True,
+    })
+    _check(response, 201)
+    response = await ctx.client.post("/api/auth/login", json={"username": username, "password": PASSWORD})
+    _check(response, 200)
+    return response.json()["access_token"]
+
+
+async def upload_file(ctx: BenchContext, index: int) -> int:
+    content = ctx.network_files[index % len(ctx.network_files)]
+    response = await ctx.client.post(
+        f"/api/projects/{ctx.proyecto_id}/archivos-entrada",
+        params={"ataque": "true" if index % 2 else "false"},
+        files={"file": (f"bench_{index}.txt", content.encode("utf-8"), "text/plain")},
+        headers=ctx.headers,
+    )
+    _check(response, 201)
+    return response.json()["id"]
+
+
+async def setup(ctx: BenchContext, seed_files: int):
+    """Create the user, project, input files and visualization shared by the read scenarios"""
+    ctx.username = f"bench_{ctx.run_id}"
+    ctx.token = await register_and_login(ctx, ctx.username)
+    response = await ctx.client.post("/api/projects", json={
+        "nombre": f"Benchmark {ctx.run_id}",
+        "descripcion": "Synthetic benchmark project",
+    }, headers=ctx.headers)
+    _check(response, 201)
+    ctx.proyecto_id = response.json()["id"]
+
+    for index in range(seed_files):
+        ctx.archivo_ids.append(await upload_file(ctx, index))
+
+    response = await ctx.client.post(f"/api/projects/{ctx.proyecto_id}/visualizaciones", json={
+        "layout_config": {
+            "selectedNetwork": ctx.archivo_ids[0] if ctx.archivo_ids else None,
+            "selectedAdversarial": ctx.archivo_ids[1] if len(ctx.archivo_ids) > 1 else None,
+            "activationMode": "weights",
+            "showComparison": len(ctx.archivo_ids) > 1,
+        }
+    }, headers=ctx.headers)
+    _check(response, 201)
+    ctx.visualizacion_id = response.json()["id"]
+
+
+def build_scenarios(ctx: BenchContext) -> Dict[str, Callable[[int], object]]:
+    async def register_login(index: int):
+        await register_and_login(ctx, f"bench_{ctx.run_id}_{index}")
+
+    async def login(index: int):
+        # Concurrent logins of one user: bcrypt throughput of the hashing pool
+        response = await ctx.client.post("/api/auth/login", json={"username": ctx.username, "password": PASSWORD})
+        _check(response, 200)
+
+    async def upload(index: int):
+        await upload_file(ctx, index)
+
+    async def list_projects(index: int):
+        _check(await ctx.client.get("/api/projects", headers=ctx.headers), 200)
+        _check(await ctx.client.get(f"/api/projects/{ctx.proyecto_id}/archivos-entrada", headers=ctx.headers), 200)
+
+    async def detail(index: int):
+        _check(await ctx.client.get(f"/api/projects/{ctx.proyecto_id}", headers=ctx.headers), 200)
+        if ctx.archivo_ids:
+            archivo_id = ctx.archivo_ids[index % len(ctx.archivo_ids)]
+            _check(await ctx.client.get(
+                f"/api/projects/{ctx.proyecto_id}/archivos-entrada/{archivo_id}", headers=ctx.headers), 200)
+
+    async def visualization(index: int):
+        response = await ctx.client.post(f"/api/projects/{ctx.proyecto_id}/visualizaciones", json={
+            "layout_config": {"selectedNetwork": ctx.archivo_ids[0] if ctx.archivo_ids else None}
+        }, headers=ctx.headers)
+        _check(response, 201)
+
+    async def export(index: int):
+        formato = ctx.export_formats[index % len(ctx.export_formats)]
+        response = await ctx.client.post("/api/exports", json={
+            "visualizacion_id": ctx.visualizacion_id,
+            "formato": formato,
+            # Measure generation, not cache hits
+            "usar_cache": False,
+        }, headers=ctx.headers)
+        _check(response, 202)
+        job = response.json()
+        while job["estado"] in ("pendiente", "en_proceso"):
+            await asyncio.sleep(0.02)
+            response = await ctx.client.get(f"/api/exports/jobs/{job['id']}", headers=ctx.headers)
+            _check(response, 200)
+            job = response.json()
+        if job["estado"] != "completado":
+            raise RuntimeError(f"Export job {job['id']} ended as {job['estado']}: {job['error']}")
+        _check(await ctx.client.get(f"/api/exports/{job['exportacion_id']}/download", headers=ctx.headers), 200)
+
+    return {
+        "register_login": register_login,
+        "login": login,
+        "upload": upload,
+        "list": list_projects,
+        "detail": detail,
+        "visualization": visualization,
+        "export": export,
+    }
@@ -0,0 +1,62 @@
+"""
+Synthetic neural network files in the .txt format accepted by
+NeuralNetworkParser.
+"""
+import random
+from typing import List
+
+
+def parse_layout(layout: str) -> List[int]:
+    """Parse a layer layout such as "16,32,32,4" """
+    capas = [int(part) for part in layout.split(",") if part.strip()]
+    if not capas or any(size <= 0 for size in capas):
+        raise ValueError(f"Invalid layer layout: {layout!r}")
+    return capas
+
+
+def layout_for_size(num_neuronas: int, num_capas: int = 3) -> List[int]:
+    """Split num_neuronas evenly over num_capas layers"""
+    base, extra = divmod(num_neuronas, num_capas)
+    return [base + (1 if i < extra else 0) for i in range(num_capas) if base or i < extra]
+
+
+def generate_network(capas: List[int], density: float = 1.0, seed: int = 0) -> str:
+    """
+    Generate a feed-forward network file.
+
+    Args:
+        capas: Number of neurons per layer
+        density: Fraction of the connections between consecutive layers
+            that get a non-zero weight
+        seed: Random seed, the same arguments always produce the same file
+
+    Returns:
+        File content (total neurons, one line per layer, N x N weight matrix)
+    """
+    rng = random.Random(seed)
+    num_neuronas = sum(capas)
+
+    # Neuron index ranges of each layer
+    starts = []
+    start = 0
+    for size in capas:
+        starts.append(start)
+        start += size
+
+    lines = [f"# Synthetic network {capas} density={density} seed={seed}", str(num_neuronas)]
+    lines.extend(str(size) for size in capas)
+
+    for layer_index, size in enumerate(capas):
+        has_next = layer_index + 1 < len(capas)
+        next_start = starts[layer_index + 1] if has_next else 0
+        next_end = next_start + capas[layer_index + 1] if has_next else 0
+        for _ in range(size):
+            row = []
+            for j in range(num_neuronas):
+                if next_start <= j < next_end and rng.random() < density:
+                    row.append(f"{rng.uniform(-1.0, 1.0):.6f}")
+                else:
+                    row.append("0")
+            lines.append(" ".join(row))
+
+    return "\n".join(lines) + "\n"
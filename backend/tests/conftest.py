@@ -0,0 +1,114 @@
+"""
+Shared fixtures of the API tests.
+
+The app reads its configuration when it is imported, so the database and
+the working directories are pointed at a temporary directory first.
+"""
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+_TMP = Path(tempfile.mkdtemp(prefix="neuralviz-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP / 'test.db'}"
+os.environ["EXPORTS_DIR"] = str(_TMP / "exports")
+os.environ["MATRIX_CACHE_DIR"] = str(_TMP / "matrix_cache")
+os.environ["PROFILES_DIR"] = str(_TMP / "profiles")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from benchmarks.synthetic import generate_network  # noqa: E402
+
+PASSWORD = "Passw0rdX"
+
+_usernames = (f"user{n}" for n in itertools.count())
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TMP, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _register(client):
+    """Register a new user and log it in"""
+    username = next(_usernames)
+    email = f"{username}@example.com"
+    response = client.post("/api/auth/register", json={
+        "username": username,
+        "email": email,
+        "password": PASSWORD,
+        "nombre": "Test",
+        "gdpr_consent": True,
+    })
+    assert response.status_code == 201, response.text
+    response = client.post("/api/auth/login", json={"username": username, "password": PASSWORD})
+    token = response.json()["access_token"]
+    return SimpleNamespace(username=username, email=email, headers={"Authorization": f"Bearer {token}"})
+
+
+@pytest.fixture
+def user(client):
+    """A newly registered user with its Authorization headers"""
+    return _register(client)
+
+
+@pytest.fixture
+def other_user(client):
+    """A second user, to check that one user cannot reach the data of another"""
+    return _register(client)
+
+
+@pytest.fixture
+def project(client, user):
+    """Id of a project of the user"""
+    response = client.post("/api/projects", json={"nombre": "Proyecto", "descripcion": "Test"}, headers=user.headers)
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+@pytest.fixture
+def visualizacion(client, user, project):
+    """Id of a visualization comparing a network of the project with an adversarial one"""
+    ids = []
+    for seed, ataque in ((1, "false"), (2, "true")):
+        response = client.post(
+            f"/api/projects/{project}/archivos-entrada?ataque={ataque}",
+            files={"file": (f"red_{seed}.txt", generate_network([3, 4, 2], 1.0, seed).encode())},
+            headers=user.headers,
+        )
+        assert response.status_code in (200, 201), response.text
+        ids.append(response.json()["id"])
+    response = client.post(f"/api/projects/{project}/visualizaciones", json={
+        "layout_config": {"selectedNetwork": ids[0], "selectedAdversarial": ids[1], "showComparison": True},
+    }, headers=user.headers)
+    assert response.status_code in (200, 201), response.text
+    return response.json()["id"]
+
+
+@pytest.fixture
+def exported(client, user, visualizacion):
+    """Run an export of the visualization and return its finished job"""
+    def run(formato, usar_cache=True):
+        response = client.post("/api/exports", json={
+            "visualizacion_id": visualizacion, "formato": formato, "usar_cache": usar_cache,
+        }, headers=user.headers)
+        assert response.status_code in (200, 202), response.text
+        job = response.json()
+        deadline = time.monotonic() + 30
+        while job["estado"] in ("pendiente", "en_proceso") and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job = client.get(f"/api/exports/jobs/{job['id']}", headers=user.headers).json()
+        assert job["estado"] == "completado", job
+        return job
+    return run
@@ -0,0 +1,73 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.exportacion import Exportacion
+from app.services import export_bundle
+from app.services.export_bundle import BundleEntry, stream_bundle
+from app.services.export_storage import get_export_storage
+
+
+def _open(data: bytes) -> zipfile.ZipFile:
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    assert archive.testzip() is None
+    return archive
+
+
+def _gone():
+    raise FileNotFoundError("gone")
+    yield b""
+
+
+@pytest.mark.parametrize("size", [0, export_bundle.BUNDLE_PREFETCH_MAX_BYTES + 1], ids=["prefetched", "streamed"])
+def test_missing_entry_is_left_out(size):
+    entries = [
+        BundleEntry("a.txt", size, True, lambda: [b"first ", b"chunks"]),
+        BundleEntry("gone.bin", size, False, _gone),
+        BundleEntry("b.txt", size, True, lambda: iter([b"second"])),
+    ]
+    archive = _open(b"".join(stream_bundle(entries, {"proyecto_id": 1})))
+
+    assert archive.namelist() == ["a.txt", "b.txt", "manifest.json"]
+    assert archive.read("a.txt") == b"first chunks"
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest == {"proyecto_id": 1, "archivos": ["a.txt", "b.txt"]}
+
+
+def test_s3_missing_object_raises_file_not_found():
+    from botocore.stub import Stubber
+
+    from app.services.export_storage import S3ExportStorage
+
+    storage = S3ExportStorage("bucket", "exports/", None, "us-east-1")
+    with Stubber(storage.client) as stubber:
+        stubber.add_client_error("get_object", service_error_code="NoSuchKey", http_status_code=404)
+        with pytest.raises(FileNotFoundError):
+            next(storage.open_stream("missing.png"))
+
+
+def test_bundle_of_project_with_a_deleted_export(client, user, project, exported, monkeypatch):
+    kept = exported("svg")["exportacion_id"]
+    deleted = exported("png")["exportacion_id"]
+    db = SessionLocal()
+    try:
+        key = db.query(Exportacion.archivo).filter(Exportacion.id == deleted).scalar()
+    finally:
+        db.close()
+    get_export_storage().delete(key)
+    # Large exports are streamed instead of read ahead
+    monkeypatch.setattr(export_bundle, "BUNDLE_PREFETCH_MAX_BYTES", 0)
+
+    response = client.get(f"/api/projects/{project}/export-bundle", headers=user.headers)
+    assert response.status_code == 200
+    archive = _open(response.content)
+
+    names = archive.namelist()
+    assert any(name.startswith(f"exports/{kept}_") for name in names)
+    assert not any(name.startswith(f"exports/{deleted}_") for name in names)
+    assert sum(name.startswith("archivos_entrada/") for name in names) == 2
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["archivos"] == [name for name in names if name != "manifest.json"]
@@ -0,0 +1,71 @@
+import gzip
+
+import pytest
+
+
+@pytest.fixture
+def png_url(exported):
+    return f"/api/exports/{exported('png')['exportacion_id']}/download"
+
+
+@pytest.fixture
+def svg_url(exported):
+    return f"/api/exports/{exported('svg')['exportacion_id']}/download"
+
+
+def test_full_download_advertises_ranges_and_etag(client, user, png_url):
+    response = client.get(png_url, headers=user.headers)
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"]
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert response.content.startswith(b"\x89PNG")
+
+
+def test_byte_ranges(client, user, png_url):
+    full = client.get(png_url, headers=user.headers).content
+
+    response = client.get(png_url, headers={**user.headers, "Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(full)}"
+    assert response.content == full[10:20]
+
+    response = client.get(png_url, headers={**user.headers, "Range": "bytes=-5"})
+    assert response.status_code == 206
+    assert response.content == full[-5:]
+
+    response = client.get(png_url, headers={**user.headers, "Range": f"bytes={len(full)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(full)}"
+
+
+def test_stale_if_range_sends_the_whole_file(client, user, png_url):
+    full = client.get(png_url, headers=user.headers).content
+    response = client.get(png_url, headers={**user.headers, "Range": "bytes=0-3", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == full
+
+
+def test_if_none_match(client, user, png_url):
+    etag = client.get(png_url, headers=user.headers).headers["etag"]
+
+    response = client.get(png_url, headers={**user.headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(png_url, headers={**user.headers, "If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+
+def test_precompressed_variant(client, user, svg_url):
+    plain = client.get(svg_url, headers={**user.headers, "Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+
+    # The raw stream, without the client decoding it
+    with client.stream("GET", svg_url, headers={**user.headers, "Accept-Encoding": "gzip"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        compressed = b"".join(response.iter_raw())
+    assert gzip.decompress(compressed) == plain.content
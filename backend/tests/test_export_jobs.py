@@ -0,0 +1,51 @@
+import pytest
+
+from app.database import SessionLocal
+from app.models.trabajo_exportacion import EstadoTrabajo, TrabajoExportacion
+from app.services.export_jobs import EXPORT_MAX_JOBS_PER_USER, export_queue
+
+
+@pytest.fixture
+def stalled_queue(monkeypatch):
+    """Jobs are accepted but never picked up, so they stay pending"""
+    monkeypatch.setattr(export_queue, "submit", lambda trabajo_id: None)
+
+
+def _create(client, user, visualizacion):
+    return client.post("/api/exports", json={
+        "visualizacion_id": visualizacion, "formato": "svg", "usar_cache": False,
+    }, headers=user.headers)
+
+
+def test_active_jobs_per_user_are_limited(client, user, visualizacion, stalled_queue):
+    jobs = []
+    for _ in range(EXPORT_MAX_JOBS_PER_USER):
+        response = _create(client, user, visualizacion)
+        assert response.status_code == 202, response.text
+        jobs.append(response.json()["id"])
+
+    response = _create(client, user, visualizacion)
+    assert response.status_code == 429
+
+    # A finished job frees its slot
+    db = SessionLocal()
+    try:
+        db.query(TrabajoExportacion).filter(TrabajoExportacion.id == jobs[0]).update(
+            {TrabajoExportacion.estado: EstadoTrabajo.FALLIDO}
+        )
+        db.commit()
+    finally:
+        db.close()
+    response = _create(client, user, visualizacion)
+    assert response.status_code == 202, response.text
+
+
+def test_jobs_of_other_users_are_not_visible(client, user, other_user, visualizacion, stalled_queue):
+    job = _create(client, user, visualizacion).json()["id"]
+
+    response = client.get(f"/api/exports/jobs/{job}", headers=other_user.headers)
+    assert response.status_code == 404
+
+    # Nor can their visualizations be exported
+    response = _create(client, other_user, visualizacion)
+    assert response.status_code == 403
@@ -0,0 +1,63 @@
+import pytest
+
+import app.api.users as users_api
+from app.api.users import RESET_CODE_MAX_ATTEMPTS
+
+
+@pytest.fixture
+def reset_code(client, user, monkeypatch):
+    """Request a reset code for the user and return the code that was mailed"""
+    sent = []
+    monkeypatch.setattr(users_api, "send_email", lambda to_email, subject, body: sent.append(body))
+    response = client.post("/api/users/request-reset-code", json={"email": user.email})
+    assert response.status_code == 200, response.text
+    return sent[-1].split("code is: ")[1].split()[0]
+
+
+def _reset(client, email, code, new_password="N3wPassw0rd"):
+    return client.post("/api/users/reset-password-with-code", json={
+        "email": email,
+        "code": code,
+        "new_password": new_password,
+    })
+
+
+def _wrong(code):
+    return "000000" if code != "000000" else "111111"
+
+
+def test_code_is_consumed_once(client, user, reset_code):
+    response = _reset(client, user.email, reset_code)
+    assert response.status_code == 200, response.text
+
+    response = _reset(client, user.email, reset_code, "0therPassw0rd")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid or expired reset code"
+
+    login = client.post("/api/auth/login", json={"username": user.username, "password": "N3wPassw0rd"})
+    assert login.status_code == 200
+
+
+def test_wrong_guesses_invalidate_the_code(client, user, reset_code):
+    for _ in range(RESET_CODE_MAX_ATTEMPTS - 1):
+        response = _reset(client, user.email, _wrong(reset_code))
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid reset code"
+
+    response = _reset(client, user.email, _wrong(reset_code))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Too many invalid attempts, request a new reset code"
+
+    # Even the right code is refused now
+    response = _reset(client, user.email, reset_code)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid or expired reset code"
+
+
+def test_non_ascii_code_counts_as_a_wrong_guess(client, user, reset_code):
+    response = _reset(client, user.email, "１２３４５６")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid reset code"
+
+    response = _reset(client, user.email, reset_code)
+    assert response.status_code == 200, response.text
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from app.models.archivo_entrada import ArchivoEntrada, FormatoPesos
+from app.services.weight_quantization import decode, encode, store_weights
+
+CAPAS = [4, 6, 3]
+
+
+def _matrix(seed=0):
+    """Ragged rows per layer with some zero (absent) connections, weights of different scale per layer"""
+    rng = random.Random(seed)
+    rows = []
+    for layer, size in enumerate(CAPAS):
+        scale = 10.0 ** (layer - 1)
+        for _ in range(size):
+            length = rng.randint(1, 7)
+            rows.append([0.0 if rng.random() < 0.2 else rng.uniform(-scale, scale) for _ in range(length)])
+    return rows
+
+
+def _roundtrip(matriz_pesos, formato):
+    archivo = ArchivoEntrada(capas=CAPAS)
+    store_weights(archivo, matriz_pesos, formato)
+    assert archivo.matriz_pesos is None
+    return archivo, decode(archivo)
+
+
+def _max_error(matriz_pesos, decoded):
+    return max(abs(a - b) for row, out in zip(matriz_pesos, decoded) for a, b in zip(row, out))
+
+
+@pytest.mark.parametrize("formato, epsilon", [(FormatoPesos.FLOAT32, 2.0 ** -24), (FormatoPesos.FLOAT16, 2.0 ** -11)])
+def test_float_error_is_relative_to_the_largest_weight(formato, epsilon):
+    matriz_pesos = _matrix()
+    archivo, decoded = _roundtrip(matriz_pesos, formato)
+    max_abs = max(abs(w) for row in matriz_pesos for w in row)
+
+    assert [len(row) for row in decoded] == [len(row) for row in matriz_pesos]
+    assert _max_error(matriz_pesos, decoded) <= archivo.error_cuantizacion + 1e-12
+    # The cast plus the rounding of the decoded values (a twentieth of it)
+    assert archivo.error_cuantizacion <= max_abs * epsilon * 1.05
+
+
+def test_float16_rejects_weights_out_of_range():
+    with pytest.raises(ValueError):
+        encode([[1e6, 0.5]], [1], FormatoPesos.FLOAT16)
+
+
+def test_int8_error_is_bounded_per_layer():
+    matriz_pesos = _matrix()
+    archivo, decoded = _roundtrip(matriz_pesos, FormatoPesos.INT8)
+    escalas = archivo.cuantizacion["escalas"]
+    assert len(escalas) == len(CAPAS)
+
+    start = 0
+    for size, scale in zip(CAPAS, escalas):
+        layer_error = _max_error(matriz_pesos[start:start + size], decoded[start:start + size])
+        # Half a quantization step plus the rounding of the decoded values
+        assert layer_error <= scale * 0.55
+        start += size
+    assert _max_error(matriz_pesos, decoded) <= archivo.error_cuantizacion + 1e-12
+
+    # Absent connections stay exactly zero
+    for row, out in zip(matriz_pesos, decoded):
+        for weight, value in zip(row, out):
+            if weight == 0.0:
+                assert value == 0.0
+
+
+def test_int8_layers_of_one_sign():
+    matriz_pesos = [[0.5, 1.0], [0.25], [-2.0, -0.5], [-1.0, 0.0]]
+    archivo = ArchivoEntrada(capas=[2, 2])
+    store_weights(archivo, matriz_pesos, FormatoPesos.INT8)
+    decoded = decode(archivo)
+
+    assert max(archivo.cuantizacion["escalas"]) == pytest.approx(2.0 / 255)
+    assert _max_error(matriz_pesos, decoded) <= 2.0 / 255 * 0.55
+    assert decoded[3][1] == 0.0
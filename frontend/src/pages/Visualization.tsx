@@ -127,7 +127,7 @@ const Visualization: React.FC = () => {
     }
   };
 
-  const handleExport = async (formato: 'pdf' | 'png' | 'svg' | 'json' | 'html') => {
+  const handleExport = async (formato: 'pdf' | 'png' | 'svg' | 'json' | 'ndjson' | 'html') => {
     if (!projectId) return;
     
     try {
@@ -151,9 +151,16 @@ const Visualization: React.FC = () => {
         throw new Error('Failed to create visualization');
       }
       
-      // Create export
-      const exportResponse = await exportsAPI.create(visId, formato);
-      const exportId = exportResponse.data.id;
+      // Queue export and wait for the job to finish
+      let job = (await exportsAPI.create(visId, formato)).data;
+      while (job.estado === 'pendiente' || job.estado === 'en_proceso') {
+        await new Promise(resolve => setTimeout(resolve, 500));
+        job = (await exportsAPI.getJob(job.id)).data;
+      }
+      if (job.estado !== 'completado') {
+        throw new Error(job.error || t('visualization.exportError'));
+      }
+      const exportId = job.exportacion_id;
       
       // Download the export
       const downloadResponse = await exportsAPI.download(exportId);
@@ -171,7 +178,7 @@ const Visualization: React.FC = () => {
       alert(t('visualization.exportSuccess'));
     } catch (error: any) {
       console.error('Error exporting:', error);
-      alert(error.response?.data?.detail || t('visualization.exportError'));
+      alert(error.response?.data?.detail || error.message || t('visualization.exportError'));
     } finally {
       setExporting(false);
     }
@@ -458,7 +465,7 @@ const Visualization: React.FC = () => {
               {t('visualization.exportTitle')}
             </h3>
             <div className="space-y-3">
-              {(['pdf', 'png', 'svg', 'json', 'html'] as const).map((formato) => (
+              {(['pdf', 'png', 'svg', 'json', 'ndjson', 'html'] as const).map((formato) => (
                 <button
                   key={formato}
                   onClick={() => handleExport(formato)}
@@ -36,23 +36,36 @@ export const modelsAPI = {
 
 export const projectsAPI = {
   create: (data: any) => api.post('/api/projects', data),
-  list: (estado?: string) => {
-    const params = estado ? `?estado=${estado}` : '';
-    return api.get(`/api/projects${params}`);
+  // Next page: pass the X-Next-Cursor header of the previous response
+  list: (estado?: string, cursor?: string) => {
+    const params = new URLSearchParams();
+    if (estado) params.append('estado', estado);
+    if (cursor) params.append('cursor', cursor);
+    const query = params.toString();
+    return api.get(`/api/projects${query ? `?${query}` : ''}`);
   },
   getById: (id: number) => api.get(`/api/projects/${id}`),
   update: (id: number, data: any) => api.put(`/api/projects/${id}`, data),
   delete: (id: number) => api.delete(`/api/projects/${id}`),
-  uploadInputFile: (proyectoId: number, file: File, ataque: boolean = false) => {
+  uploadInputFile: (
+    proyectoId: number,
+    file: File,
+    ataque: boolean = false,
+    formatoPesos?: 'json' | 'float32' | 'float16' | 'int8'
+  ) => {
     const formData = new FormData();
     formData.append('file', file);
-    return api.post(`/api/projects/${proyectoId}/archivos-entrada?ataque=${ataque.toString()}`, formData, {
+    const params = new URLSearchParams({ ataque: ataque.toString() });
+    if (formatoPesos) params.set('formato_pesos', formatoPesos);
+    return api.post(`/api/projects/${proyectoId}/archivos-entrada?${params.toString()}`, formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
   },
   getInputFiles: (proyectoId: number) => api.get(`/api/projects/${proyectoId}/archivos-entrada`),
   getInputFile: (proyectoId: number, archivoId: number) => 
     api.get(`/api/projects/${proyectoId}/archivos-entrada/${archivoId}`),
+  getPackedWeights: (proyectoId: number, archivoId: number, formato?: 'float32' | 'float16' | 'int8') =>
+    api.get(`/api/projects/${proyectoId}/archivos-entrada/${archivoId}/pesos${formato ? `?formato=${formato}` : ''}`),
   deleteInputFile: (proyectoId: number, archivoId: number) => 
     api.delete(`/api/projects/${proyectoId}/archivos-entrada/${archivoId}`),
   createVisualization: (proyectoId: number, layoutConfig?: any) =>
@@ -60,11 +73,16 @@ export const projectsAPI = {
 };
 
 export const exportsAPI = {
-  create: (visualizacionId: number, formato: 'pdf' | 'png' | 'svg' | 'json' | 'html') => 
+  create: (visualizacionId: number, formato: 'pdf' | 'png' | 'svg' | 'json' | 'ndjson' | 'html') => 
     api.post('/api/exports', { visualizacion_id: visualizacionId, formato }),
-  list: (visualizacionId?: number) => {
-    const params = visualizacionId ? `?visualizacion_id=${visualizacionId}` : '';
-    return api.get(`/api/exports${params}`);
+  getJob: (jobId: number) => api.get(`/api/exports/jobs/${jobId}`),
+  cancelJob: (jobId: number) => api.delete(`/api/exports/jobs/${jobId}`),
+  list: (visualizacionId?: number, cursor?: string) => {
+    const params = new URLSearchParams();
+    if (visualizacionId) params.append('visualizacion_id', visualizacionId.toString());
+    if (cursor) params.append('cursor', cursor);
+    const query = params.toString();
+    return api.get(`/api/exports${query ? `?${query}` : ''}`);
   },
   download: (exportId: number) => 
     api.get(`/api/exports/${exportId}/download`, { responseType: 'blob' }),